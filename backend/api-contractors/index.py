@@ -1,39 +1,168 @@
 import json
-import os
-from typing import Dict, Any
-import psycopg2
+from datetime import date
+from typing import Dict, Any, Optional
+import db
+import responses
 from psycopg2.extras import RealDictCursor
 
+INSERT_CONTRACTOR = db.PreparedStatement('insert_contractor', """
+    INSERT INTO contractors (name, specialization, email, phone, hourly_rate)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id
+""")
+
+BALANCE_KEYS = ('earned', 'paid', 'pending')
+
+# Balances from the contractor's snapshot minus the payments dated on or after date_from,
+# so only that tail of the history is read: the monthly partitions from date_from on (V0017),
+# through idx_payments_contractor_date
+STATEMENT_SUMMARY_SQL = """
+    SELECT 
+        c.id,
+        c.name,
+        c.specialization,
+        c.payment_count,
+        c.total_earned,
+        c.total_paid,
+        c.pending_amount,
+        c.pending_payments,
+        COALESCE(SUM(p.amount), 0) as since_earned,
+        COALESCE(SUM(p.amount) FILTER (WHERE p.status = 'completed'), 0) as since_paid,
+        COALESCE(SUM(p.amount) FILTER (WHERE p.status = 'pending'), 0) as since_pending,
+        COUNT(p.id) FILTER (WHERE p.payment_date <= %(date_to)s) as period_count,
+        COALESCE(SUM(p.amount) FILTER (WHERE p.payment_date <= %(date_to)s), 0) as period_earned,
+        COALESCE(SUM(p.amount) FILTER (WHERE p.payment_date <= %(date_to)s AND p.status = 'completed'), 0) as period_paid,
+        COALESCE(SUM(p.amount) FILTER (WHERE p.payment_date <= %(date_to)s AND p.status = 'pending'), 0) as period_pending
+    FROM contractors c
+    LEFT JOIN payments p ON p.contractor_id = c.id AND p.payment_date >= %(date_from)s
+    WHERE c.id = %(contractor_id)s
+    GROUP BY c.id
+"""
+
+STATEMENT_PAYMENTS_SQL = """
+    SELECT 
+        p.id,
+        p.payment_date,
+        p.payment_type,
+        p.status,
+        p.amount,
+        p.description,
+        p.project_id,
+        pr.title as project_title,
+        p.version
+    FROM payments p
+    LEFT JOIN projects pr ON pr.id = p.project_id
+    WHERE p.contractor_id = %(contractor_id)s
+      AND p.payment_date >= %(date_from)s AND p.payment_date <= %(date_to)s
+      {after}
+    ORDER BY p.payment_date, p.id
+    LIMIT %(limit)s
+"""
+
+def statement(cur, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    '''
+    Payout statement of one contractor for [date_from, date_to]: opening and closing balances, period totals
+    and the period's payments in date order (keyset-paginated). Balances count payments by their current status.
+    Returns None for an unknown contractor; raises ValueError on bad input.
+    '''
+    if not params.get('id'):
+        raise ValueError('id is required')
+    today = date.today()
+    args: Dict[str, Any] = {
+        'contractor_id': int(params['id']),
+        'date_from': date.fromisoformat(params['date_from']) if params.get('date_from') else today.replace(day=1),
+        'date_to': date.fromisoformat(params['date_to']) if params.get('date_to') else today,
+        'limit': db.page_limit(params) + 1
+    }
+    if args['date_from'] > args['date_to']:
+        raise ValueError('date_from is after date_to')
+    after = ''
+    if params.get('cursor'):
+        args['after_date'], args['after_id'] = db.decode_cursor(params['cursor'])
+        after = 'AND (p.payment_date, p.id) > (%(after_date)s::date, %(after_id)s)'
+    
+    cur.execute(STATEMENT_SUMMARY_SQL, args)
+    summary = cur.fetchone()
+    if summary is None:
+        return None
+    cur.execute(STATEMENT_PAYMENTS_SQL.format(after=after), args)
+    items = [dict(row) for row in cur.fetchall()]
+    next_cursor = None
+    if len(items) == args['limit']:
+        items.pop()
+        next_cursor = db.encode_cursor(items[-1]['payment_date'], items[-1]['id'])
+    
+    current = {'earned': summary['total_earned'], 'paid': summary['total_paid'], 'pending': summary['pending_amount']}
+    opening = {key: current[key] - summary[f'since_{key}'] for key in BALANCE_KEYS}
+    period: Dict[str, Any] = {key: summary[f'period_{key}'] for key in BALANCE_KEYS}
+    return {
+        'contractor': {key: summary[key] for key in ('id', 'name', 'specialization')},
+        'balance': {key: summary[key] for key in ('payment_count', 'total_earned', 'total_paid', 'pending_amount', 'pending_payments')},
+        'date_from': args['date_from'].isoformat(),
+        'date_to': args['date_to'].isoformat(),
+        'opening': opening,
+        'period': {'payment_count': summary['period_count'], **period},
+        'closing': {key: opening[key] + period[key] for key in BALANCE_KEYS},
+        'items': items,
+        'next_cursor': next_cursor
+    }
+
+@db.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Manage contractors - get all contractors with payment history, create new contractors
-    Args: event - dict with httpMethod, body, queryStringParameters
+    Business: Manage contractors - get contractors with ledger balances (optionally paginated), payout statements, create new contractors
+    Args: event - dict with httpMethod, body, queryStringParameters (specialization, date_from, date_to, limit, cursor;
+          action=contractor-statement with id, date_from, date_to, limit, cursor)
           context - object with request_id attribute
     Returns: HTTP response with contractors list or creation result
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return responses.build(event, 200, '', {
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-DB-Session',
+            'Access-Control-Max-Age': '86400'
+        })
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = db.connect_read(event) if method == 'GET' else db.connect()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     params = event.get('queryStringParameters', {}) or {}
     action = params.get('action', '')
     
+    if method == 'GET' and action == 'contractor-statement':
+        try:
+            result = statement(cur, params)
+        except ValueError as e:
+            cur.close()
+            conn.close()
+            return responses.error(event, 400, str(e))
+        cur.close()
+        conn.close()
+        if result is None:
+            return responses.error(event, 404, 'Contractor not found')
+        return responses.json_response(event, 200, result)
+    
     if method == 'GET':
-        cur.execute("""
+        try:
+            conditions, args = db.listing_filters(params, 'c', ('specialization',))
+            limit = db.page_limit(params)
+        except ValueError as e:
+            cur.close()
+            conn.close()
+            return responses.error(event, 400, str(e))
+        paginated = db.is_paginated(params)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        if paginated:
+            order_sql = 'ORDER BY c.created_at DESC, c.id DESC LIMIT %s'
+            args.append(limit + 1)
+        else:
+            order_sql = 'ORDER BY c.total_earned DESC, c.id DESC'
+        
+        listing = conn.cursor(name='contractors_listing')
+        listing.itersize = responses.ITERSIZE
+        listing.execute(f"""
             SELECT 
                 c.id,
                 c.name,
@@ -41,25 +170,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 c.email,
                 c.phone,
                 c.hourly_rate,
-                COUNT(p.id) as total_projects,
-                COALESCE(SUM(p.amount), 0) as total_earned,
-                COUNT(p.id) FILTER (WHERE p.status = 'pending') as pending_payments
+                c.created_at,
+                c.payment_count as total_projects,
+                c.total_earned,
+                c.pending_payments,
+                c.total_paid,
+                c.pending_amount
             FROM contractors c
-            LEFT JOIN payments p ON p.contractor_id = c.id
-            GROUP BY c.id
-            ORDER BY total_earned DESC
-        """)
-        contractors = cur.fetchall()
+            {where}
+            {order_sql}
+        """, args)
+        contractors, last = responses.encode_rows(listing, limit if paginated else None)
+        listing.close()
         
         cur.close()
         conn.close()
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps([dict(row) for row in contractors], default=str)
-        }
+        return responses.build(event, 200, db.page_json(contractors, last) if paginated else contractors)
     
     if method == 'POST' and action == 'create-contractor':
         body = json.loads(event.get('body', '{}'))
@@ -72,36 +199,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if not name or not specialization or not email or not hourly_rate:
             cur.close()
             conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Missing required fields'}),
-                'isBase64Encoded': False
-            }
+            return responses.error(event, 400, 'Missing required fields')
         
-        cur.execute(
-            "INSERT INTO contractors (name, specialization, email, phone, hourly_rate) VALUES (%s, %s, %s, %s, %s) RETURNING id",
-            (name, specialization, email, phone, hourly_rate)
-        )
+        INSERT_CONTRACTOR.execute(cur, (name, specialization, email, phone, hourly_rate))
         contractor_id = cur.fetchone()['id']
         conn.commit()
         
         cur.close()
         conn.close()
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'id': contractor_id, 'message': 'Contractor created'}),
-            'isBase64Encoded': False
-        }
+        return responses.json_response(event, 200, {'id': contractor_id, 'message': 'Contractor created'})
     
     cur.close()
     conn.close()
     
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
\ No newline at end of file
+    return responses.error(event, 405, 'Method not allowed')
\ No newline at end of file
@@ -1,43 +1,133 @@
 import json
-import os
-from typing import Dict, Any
-import psycopg2
+from datetime import date
+from typing import Dict, Any, List
+import db
+import responses
 from psycopg2.extras import RealDictCursor
 
+CONVERT_BATCH_MAX = 100
+
+# Row locks on the estimates serialize concurrent conversions of the same estimate; the conversion
+# itself runs as the next statement, so its NOT EXISTS sees a project committed while we waited.
+LOCK_ESTIMATES_SQL = 'SELECT id FROM estimates WHERE id = ANY(%s) ORDER BY id FOR UPDATE'
+
+# Projects and their items in one statement: estimate_items are copied with INSERT ... SELECT
+# and the project rollup triggers bring items_total/actual_cost along.
+CONVERT_SQL = """
+    WITH created AS (
+        INSERT INTO projects (company_id, estimate_id, title, description, budget, status, start_date)
+        SELECT e.company_id, e.id, e.title, e.description, e.estimated_cost, 'planning', %(start_date)s
+        FROM estimates e
+        WHERE e.id = ANY(%(ids)s)
+          AND NOT EXISTS (SELECT 1 FROM projects p WHERE p.estimate_id = e.id)
+        ORDER BY e.id
+        RETURNING id, estimate_id
+    ), copied AS (
+        INSERT INTO project_items (project_id, item_id, quantity, unit_price)
+        SELECT c.id, ei.item_id, ei.quantity, ei.unit_price
+        FROM created c
+        JOIN estimate_items ei ON ei.estimate_id = c.estimate_id
+        ORDER BY ei.id
+        RETURNING project_id
+    )
+    SELECT 
+        c.estimate_id,
+        c.id as project_id,
+        (SELECT COUNT(*) FROM copied WHERE copied.project_id = c.id) as items_copied
+    FROM created c
+    ORDER BY c.estimate_id
+"""
+
+def parse_estimate_ids(body: Dict[str, Any], action: str) -> List[int]:
+    """estimate_id for convert-estimate, estimate_ids for convert-estimates; raises ValueError"""
+    try:
+        if action == 'convert-estimate':
+            ids = [int(body['estimate_id'])]
+        else:
+            ids = list(dict.fromkeys(int(value) for value in body.get('estimate_ids') or []))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid estimate id: {e!r}') from e
+    if not ids:
+        raise ValueError('estimate_ids is required')
+    if len(ids) > CONVERT_BATCH_MAX:
+        raise ValueError(f'At most {CONVERT_BATCH_MAX} estimates per request')
+    return ids
+
+def convert_estimates(cur, ids: List[int], start_date: date) -> Dict[str, Any]:
+    """Create a project per estimate with the estimate's items, inside the caller's transaction"""
+    cur.execute(LOCK_ESTIMATES_SQL, (ids,))
+    found = {row['id'] for row in cur.fetchall()}
+    cur.execute(CONVERT_SQL, {'ids': ids, 'start_date': start_date})
+    projects = [dict(row) for row in cur.fetchall()]
+    converted = {project['estimate_id'] for project in projects}
+    return {
+        'converted': len(projects),
+        'projects': projects,
+        'conflicts': [
+            {'estimate_id': estimate_id, 'conflict': 'already_converted' if estimate_id in found else 'not_found'}
+            for estimate_id in ids if estimate_id not in converted
+        ]
+    }
+
+@db.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Manage project estimates - get all estimates with company info
-    Args: event - dict with httpMethod
+    Business: Manage project estimates - get estimates with company info, optionally paginated and filtered;
+              convert estimates into projects with their items
+    Args: event - dict with httpMethod, body, queryStringParameters (status, company_id, date_from, date_to, limit, cursor;
+          action=convert-estimate|convert-estimates for POST)
           context - object with request_id attribute
     Returns: HTTP response with estimates list
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return responses.build(event, 200, '', {
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-DB-Session',
+            'Access-Control-Max-Age': '86400'
+        })
     
-    if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+    params = event.get('queryStringParameters', {}) or {}
+    action = params.get('action', '')
+    
+    if method == 'POST' and action in ('convert-estimate', 'convert-estimates'):
+        body = json.loads(event.get('body') or '{}')
+        try:
+            ids = parse_estimate_ids(body, action)
+            start_date = date.fromisoformat(body['start_date']) if body.get('start_date') else date.today()
+        except ValueError as e:
+            return responses.error(event, 400, str(e))
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        result = convert_estimates(cur, ids, start_date)
+        conn.commit()
+        cur.close()
+        conn.close()
+        if action == 'convert-estimate' and result['conflicts']:
+            conflict = result['conflicts'][0]
+            return responses.json_response(event, 404 if conflict['conflict'] == 'not_found' else 409,
+                                           {'error': conflict['conflict'], **conflict})
+        return responses.json_response(event, 200, result['projects'][0] if action == 'convert-estimate' else result)
     
-    dsn = os.environ.get('DATABASE_URL')
+    if method != 'GET':
+        return responses.error(event, 405, 'Method not allowed')
     
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        conditions, args = db.listing_filters(params, 'e', ('status', 'company_id'))
+        limit = db.page_limit(params)
+    except ValueError as e:
+        return responses.error(event, 400, str(e))
+    paginated = db.is_paginated(params)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    limit_sql = 'LIMIT %s' if paginated else ''
+    if paginated:
+        args.append(limit + 1)
     
-    cur.execute("""
+    conn = db.connect_read(event)
+    cur = conn.cursor(name='estimates_listing')
+    cur.itersize = responses.ITERSIZE
+    cur.execute(f"""
         SELECT 
             e.id,
             e.title,
@@ -47,23 +137,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             e.status,
             e.created_at,
             c.name as company_name,
-            CASE 
-                WHEN EXISTS (SELECT 1 FROM projects WHERE estimate_id = e.id) 
-                THEN true 
-                ELSE false 
-            END as converted_to_project
+            EXISTS (SELECT 1 FROM projects WHERE estimate_id = e.id) as converted_to_project
         FROM estimates e
         LEFT JOIN companies c ON e.company_id = c.id
-        ORDER BY e.created_at DESC
-    """)
-    estimates = cur.fetchall()
+        {where}
+        ORDER BY e.created_at DESC, e.id DESC
+        {limit_sql}
+    """, args)
+    estimates, last = responses.encode_rows(cur, limit if paginated else None)
     
     cur.close()
     conn.close()
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'isBase64Encoded': False,
-        'body': json.dumps([dict(row) for row in estimates], default=str)
-    }
+    return responses.build(event, 200, db.page_json(estimates, last) if paginated else estimates)
@@ -0,0 +1,150 @@
+'''
+Response building and JSON encoding shared by the backend functions.
+Every function directory is deployed on its own, so each one carries an identical copy of this module.
+Bodies of COMPRESS_MIN_BYTES or more are compressed for clients that accept it (brotli when the
+optional brotli package is installed, else gzip) and returned base64-encoded with Content-Encoding and Vary.
+'''
+import base64
+import gzip
+import io
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ITERSIZE = 2000
+COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', '5'))
+# Server preference when the client weighs encodings equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def accepted_encoding(event: Dict[str, Any]) -> Optional[str]:
+    """The encoding to use for this request's Accept-Encoding, or None for identity"""
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'accept-encoding'), None)
+    if not value:
+        return None
+    weights: Dict[str, float] = {}
+    for part in value.split(','):
+        name, _, params = part.partition(';')
+        weight = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best = max(ENCODINGS, key=lambda encoding: weights.get(encoding, weights.get('*', 0.0)))
+    return best if weights.get(best, weights.get('*', 0.0)) > 0 else None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def precompress(body: str) -> Dict[str, str]:
+    """Base64 bodies in every supported encoding, for responses that are cached and served many times"""
+    data = body.encode('utf-8')
+    if len(data) < COMPRESS_MIN_BYTES:
+        return {}
+    return {encoding: base64.b64encode(compress(data, encoding)).decode('ascii') for encoding in ENCODINGS}
+
+
+def build(event: Dict[str, Any], status: int, body: str = '', headers: Optional[Dict[str, str]] = None,
+          content_type: str = 'application/json', precompressed: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''
+    Function response with the CORS header; extra headers override the defaults.
+    A body of COMPRESS_MIN_BYTES or more varies by Accept-Encoding and is compressed when the client accepts it,
+    taken from precompressed (encoding -> base64 body) when given.
+    '''
+    response_headers = {'Access-Control-Allow-Origin': '*'}
+    if body:
+        response_headers['Content-Type'] = content_type
+    response_headers.update(headers or {})
+    data = body.encode('utf-8')
+    if len(data) < COMPRESS_MIN_BYTES:
+        return {'statusCode': status, 'headers': response_headers, 'body': body, 'isBase64Encoded': False}
+    response_headers['Vary'] = 'Accept-Encoding'
+    encoding = accepted_encoding(event)
+    if encoding is None:
+        return {'statusCode': status, 'headers': response_headers, 'body': body, 'isBase64Encoded': False}
+    response_headers['Content-Encoding'] = encoding
+    encoded = (precompressed or {}).get(encoding)
+    if encoded is None:
+        encoded = base64.b64encode(compress(data, encoding)).decode('ascii')
+    return {'statusCode': status, 'headers': response_headers, 'body': encoded, 'isBase64Encoded': True}
+
+
+def json_response(event: Dict[str, Any], status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return build(event, status, json.dumps(payload, default=str), headers)
+
+
+def error(event: Dict[str, Any], status: int, message: str) -> Dict[str, Any]:
+    return json_response(event, status, {'error': message})
+
+
+def _quoted(value: Any) -> str:
+    """Decimal and date/time values render as their str() form, matching json.dumps(..., default=str)"""
+    return '"' + str(value) + '"'
+
+
+ENCODERS: Dict[type, Callable[[Any], str]] = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    float: float.__repr__,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+    Decimal: _quoted,
+    date: _quoted,
+    datetime: _quoted,
+    time: _quoted,
+}
+
+
+def encode_value(value: Any) -> str:
+    encoder = ENCODERS.get(value.__class__)
+    return encoder(value) if encoder else json.dumps(value, default=str)
+
+
+def encode_rows(cur, limit: Optional[int] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    '''
+    Serialize an executed tuple cursor (ideally a named server-side cursor) as a JSON array of objects,
+    writing straight into one buffer without building per-row dicts.
+    Stops after limit rows; if more rows remain, also returns the last emitted row as a dict for the page cursor.
+    '''
+    buf = io.StringIO()
+    write = buf.write
+    write('[')
+    prefixes = None
+    last = None
+    count = 0
+    for row in cur:
+        if prefixes is None:
+            keys = [encode_basestring_ascii(column.name) + ':' for column in cur.description]
+            prefixes = ['{' + keys[0]] + [',' + key for key in keys[1:]]
+        if limit is not None and count == limit:
+            write(']')
+            return buf.getvalue(), dict(zip((column.name for column in cur.description), last))
+        if count:
+            write(',')
+        for prefix, value in zip(prefixes, row):
+            write(prefix)
+            encoder = ENCODERS.get(value.__class__)
+            write(encoder(value) if encoder else json.dumps(value, default=str))
+        write('}')
+        last = row
+        count += 1
+    write(']')
+    return buf.getvalue(), None
@@ -0,0 +1,93 @@
+'''
+Asyncio read path: independent queries fan out over separate pooled connections with asyncio.gather.
+Used by api-stats and api-projects, so each carries an identical copy of this module.
+Enabled with DB_ASYNC=1 when psycopg 3 and psycopg-pool are installed; handlers keep their
+synchronous handler(event, context) signature and call run() as the shim.
+The pool only reaches DATABASE_URL, so it stays off when read replicas are configured: those reads keep
+to db.connect_read(), which picks the replica and honours the request's session token.
+The event loop and its connection pool live in a daemon thread, so both survive warm invocations.
+'''
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Awaitable, Dict, List, Optional, Sequence
+import db
+
+# psycopg 3 is only imported when the async path is switched on, so cold starts without it skip the import
+AsyncConnectionPool = None
+if os.environ.get('DB_ASYNC', '0') == '1' and not db.READ_URLS:
+    try:
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+    except ImportError:
+        AsyncConnectionPool = None
+
+ENABLED = AsyncConnectionPool is not None
+ASYNC_POOL_MIN_SIZE = int(os.environ.get('DB_ASYNC_POOL_MIN_SIZE', '1'))
+ASYNC_POOL_MAX_SIZE = int(os.environ.get('DB_ASYNC_POOL_MAX_SIZE', '8'))
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_pool: Optional['AsyncConnectionPool'] = None
+_start_lock = threading.Lock()
+
+
+async def _open_pool() -> None:
+    global _pool
+    _pool = AsyncConnectionPool(
+        os.environ.get('DATABASE_URL'), min_size=ASYNC_POOL_MIN_SIZE, max_size=ASYNC_POOL_MAX_SIZE,
+        kwargs={'autocommit': True}, open=False,
+    )
+    await _pool.open()
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _start_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='aio-loop', daemon=True).start()
+                asyncio.run_coroutine_threadsafe(_open_pool(), loop).result()
+                _loop = loop
+    return _loop
+
+
+def run(coro: Awaitable[Any]) -> Any:
+    '''Run a coroutine on the shared loop from synchronous code, carrying the caller's db trace along'''
+    loop = _event_loop()
+    context = contextvars.copy_context()
+    done: concurrent.futures.Future = concurrent.futures.Future()
+
+    def finished(task: asyncio.Task) -> None:
+        if task.cancelled():
+            done.cancel()
+        elif task.exception() is not None:
+            done.set_exception(task.exception())
+        else:
+            done.set_result(task.result())
+
+    loop.call_soon_threadsafe(lambda: loop.create_task(coro, context=context).add_done_callback(finished))
+    return done.result()
+
+
+async def fetch(sql: str, args: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    '''Run one query on its own pooled connection and return the rows as dicts'''
+    trace = db.current_trace()
+    started = time.perf_counter()
+    async with _pool.connection() as conn:
+        acquired = time.perf_counter()
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(sql, args)
+            rows = await cur.fetchall()
+    if trace is not None:
+        trace.acquired((acquired - started) * 1000)
+        trace.add_statement(sql, (time.perf_counter() - acquired) * 1000, len(rows))
+    return rows
+
+
+async def fetch_all(*queries: Any) -> List[List[Dict[str, Any]]]:
+    '''fetch() every (sql, args) pair concurrently; results come back in the order given'''
+    return list(await asyncio.gather(*(fetch(sql, args) for sql, args in queries)))
@@ -1,43 +1,177 @@
-import json
-import os
-from typing import Dict, Any
-import psycopg2
+from datetime import date
+from typing import Dict, Any, List, Tuple
+import aio
+import db
+import responses
 from psycopg2.extras import RealDictCursor
 
+PROJECTS_BATCH_MAX = 100
+
+# Selectable project fields for project-detail / projects-batch; id is always returned
+PROJECT_FIELDS: Dict[str, str] = {
+    'title': 'p.title',
+    'description': 'p.description',
+    'budget': 'p.budget',
+    'actual_cost': 'p.actual_cost',
+    'profit': '(p.budget - p.actual_cost)',
+    'status': 'p.status',
+    'start_date': 'p.start_date',
+    'end_date': 'p.end_date',
+    'created_at': 'p.created_at',
+    'company_id': 'p.company_id',
+    'company_name': 'c.name',
+    'estimate_id': 'p.estimate_id',
+    'estimate_title': 'e.title',
+    'payment_count': 'p.payment_count',
+    'total_paid': 'p.total_paid',
+}
+
+# One set-based query per child collection, whatever the number of projects
+CHILD_QUERIES: Dict[str, str] = {
+    'items': """
+        SELECT pi.project_id, pi.id, pi.item_id, i.name, i.type, i.unit, pi.quantity, pi.unit_price, pi.total_price
+        FROM project_items pi
+        LEFT JOIN items i ON i.id = pi.item_id
+        WHERE pi.project_id = ANY(%s)
+        ORDER BY pi.project_id, pi.id
+    """,
+    'contractors': """
+        SELECT pc.project_id, pc.contractor_id, k.name, k.specialization, pc.role, pc.hourly_rate
+        FROM project_contractors pc
+        JOIN contractors k ON k.id = pc.contractor_id
+        WHERE pc.project_id = ANY(%s)
+        ORDER BY pc.project_id, pc.id
+    """,
+    'payments': """
+        SELECT project_id, id, contractor_id, amount, payment_type, description, payment_date, status, version
+        FROM payments
+        WHERE project_id = ANY(%s) AND payment_date BETWEEN %s AND %s
+        ORDER BY project_id, payment_date DESC, id DESC
+    """,
+}
+
+def parse_ids(params: Dict[str, Any], action: str) -> List[int]:
+    """id for project-detail, comma-separated ids for projects-batch; raises ValueError"""
+    raw = params.get('id', '') if action == 'project-detail' else params.get('ids', '')
+    ids = list(dict.fromkeys(int(value) for value in raw.split(',') if value.strip()))
+    if not ids:
+        raise ValueError('id is required' if action == 'project-detail' else 'ids is required')
+    if len(ids) > PROJECTS_BATCH_MAX:
+        raise ValueError(f'At most {PROJECTS_BATCH_MAX} ids per request')
+    return ids
+
+def parse_fields(params: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Split ?fields= into project columns and child collections; everything when omitted"""
+    if not params.get('fields'):
+        return list(PROJECT_FIELDS), list(CHILD_QUERIES)
+    fields = [field.strip() for field in params['fields'].split(',') if field.strip()]
+    unknown = [field for field in fields if field != 'id' and field not in PROJECT_FIELDS and field not in CHILD_QUERIES]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return [f for f in fields if f in PROJECT_FIELDS], [f for f in fields if f in CHILD_QUERIES]
+
+def load_projects(cur, ids: List[int], columns: List[str], children: List[str]) -> List[Dict[str, Any]]:
+    """Projects in the order of ids with the requested children attached: 1 + len(children) queries in total"""
+    select = ', '.join(['p.id', 'p.payments_from', 'p.payments_to', 'p.payment_count > 0 as has_payments'] + [f'{PROJECT_FIELDS[column]} as {column}' for column in columns])
+    cur.execute(f"""
+        SELECT {select}
+        FROM projects p
+        LEFT JOIN companies c ON p.company_id = c.id
+        LEFT JOIN estimates e ON p.estimate_id = e.id
+        WHERE p.id = ANY(%s)
+    """, (ids,))
+    by_id = {row['id']: dict(row) for row in cur.fetchall()}
+    bounds = [(project.pop('payments_from'), project.pop('payments_to'), project.pop('has_payments'))
+              for project in by_id.values()]
+    found = [project_id for project_id in ids if project_id in by_id]
+    if not found or not children:
+        return [by_id[project_id] for project_id in found]
+    
+    args = {name: (found,) for name in children}
+    if 'payments' in args:
+        # The projects' payment date bounds (V0016) confine the scan to the payment partitions that can hold them.
+        # They are only a pruning hint: projects without payments have none and need no query, but a project
+        # that has payments and lost its bounds is read across every partition (reconcile reports the drift)
+        paying = [(low, high) for low, high, has_payments in bounds if has_payments or low is not None]
+        if not paying:
+            del args['payments']
+        elif any(low is None or high is None for low, high in paying):
+            args['payments'] = (found, date.min, date.max)
+        else:
+            args['payments'] = (found, min(low for low, _ in paying), max(high for _, high in paying))
+    
+    if aio.ENABLED:
+        results = aio.run(aio.fetch_all(*((CHILD_QUERIES[name], args[name]) for name in args)))
+    else:
+        results = []
+        for name in args:
+            cur.execute(CHILD_QUERIES[name], args[name])
+            results.append(cur.fetchall())
+    fetched = dict(zip(args, results))
+    
+    for name in children:
+        for project in by_id.values():
+            project[name] = []
+        for row in fetched.get(name, []):
+            row = dict(row)
+            by_id[row.pop('project_id')][name].append(row)
+    return [by_id[project_id] for project_id in found]
+
+@db.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Manage projects - get all projects with company and financial details
-    Args: event - dict with httpMethod
+    Business: Manage projects - get projects with company and financial details, optionally paginated and filtered;
+              project-detail / projects-batch return projects with items, contractors and payments
+    Args: event - dict with httpMethod, queryStringParameters (status, company_id, date_from, date_to, limit, cursor;
+                  action=project-detail&id= | action=projects-batch&ids=, fields)
           context - object with request_id attribute
-    Returns: HTTP response with projects list
+    Returns: HTTP response with projects list, one project or a batch of projects
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return responses.build(event, 200, '', {
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-DB-Session',
+            'Access-Control-Max-Age': '86400'
+        })
     
     if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return responses.error(event, 405, 'Method not allowed')
+    
+    params = event.get('queryStringParameters', {}) or {}
+    action = params.get('action', '')
     
-    dsn = os.environ.get('DATABASE_URL')
+    if action in ('project-detail', 'projects-batch'):
+        try:
+            ids = parse_ids(params, action)
+            columns, children = parse_fields(params)
+        except ValueError as e:
+            return responses.error(event, 400, str(e))
+        conn = db.connect_read(event)
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        projects = load_projects(cur, ids, columns, children)
+        cur.close()
+        conn.close()
+        if action == 'project-detail' and not projects:
+            return responses.error(event, 404, 'Project not found')
+        return responses.json_response(event, 200, projects[0] if action == 'project-detail' else projects)
     
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        conditions, args = db.listing_filters(params, 'p', ('status', 'company_id'))
+        limit = db.page_limit(params)
+    except ValueError as e:
+        return responses.error(event, 400, str(e))
+    paginated = db.is_paginated(params)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    limit_sql = 'LIMIT %s' if paginated else ''
+    if paginated:
+        args.append(limit + 1)
     
-    cur.execute("""
+    conn = db.connect_read(event)
+    cur = conn.cursor(name='projects_listing')
+    cur.itersize = responses.ITERSIZE
+    cur.execute(f"""
         SELECT 
             p.id,
             p.title,
@@ -48,25 +182,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             p.status,
             p.start_date,
             p.end_date,
+            p.created_at,
             c.name as company_name,
             e.title as estimate_title,
-            COUNT(pay.id) as payment_count,
-            COALESCE(SUM(pay.amount), 0) as total_paid
+            p.payment_count,
+            p.total_paid
         FROM projects p
         LEFT JOIN companies c ON p.company_id = c.id
         LEFT JOIN estimates e ON p.estimate_id = e.id
-        LEFT JOIN payments pay ON pay.project_id = p.id
-        GROUP BY p.id, c.name, e.title
-        ORDER BY p.created_at DESC
-    """)
-    projects = cur.fetchall()
+        {where}
+        ORDER BY p.created_at DESC, p.id DESC
+        {limit_sql}
+    """, args)
+    projects, last = responses.encode_rows(cur, limit if paginated else None)
     
     cur.close()
     conn.close()
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'isBase64Encoded': False,
-        'body': json.dumps([dict(row) for row in projects], default=str)
-    }
+    return responses.build(event, 200, db.page_json(projects, last) if paginated else projects)
@@ -1,173 +1,244 @@
 import json
-import os
-from typing import Dict, Any
-import psycopg2
+import re
+from typing import Dict, Any, List, Tuple
+import db
+import responses
+import reference_cache
 from psycopg2.extras import RealDictCursor
 
+COMPANY_OPTIONAL_FIELDS = (
+    'kpp', 'ogrn', 'legal_address', 'actual_address', 'bank_name', 'bik',
+    'correspondent_account', 'account_number', 'contact_person', 'phone', 'email'
+)
+
+INSERT_COMPANY = db.PreparedStatement('insert_company', """
+    INSERT INTO companies 
+    (name, inn, kpp, ogrn, legal_address, actual_address, bank_name, bik, 
+     correspondent_account, account_number, contact_person, phone, email)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+    RETURNING id
+""")
+
+SEARCH_LIMIT_DEFAULT = 20
+SEARCH_LIMIT_MAX = 100
+SEARCH_MAX_OFFSET = 1000
+SEARCH_MAX_TERMS = 8
+TRIGRAM_MIN_CHARS = 3
+
+# type -> (table, title column, subtitle column, columns for substring matching)
+SEARCH_SOURCES: Dict[str, tuple] = {
+    'project': ('projects', 'title', 'status', ('title',)),
+    'estimate': ('estimates', 'title', 'status', ('title',)),
+    'company': ('companies', 'name', 'inn', ('name', 'inn')),
+    'contractor': ('contractors', 'name', 'specialization', ('name', 'specialization')),
+}
+
+SEARCH_TSQUERY = "(to_tsquery('simple', %(prefix)s) || to_tsquery('russian', %(prefix)s))"
+
+def search_sql(types: List[str], substring: bool) -> str:
+    """
+    One ranked branch per type, each capped at offset + limit + 1 so it stays on its GIN indexes,
+    merged and paged by rank. Substring (trigram) matching only kicks in from TRIGRAM_MIN_CHARS,
+    below that pg_trgm cannot use its index.
+    """
+    branches = []
+    for type_name in types:
+        table, title, subtitle, like_columns = SEARCH_SOURCES[type_name]
+        match = f't.search_vector @@ {SEARCH_TSQUERY}'
+        if substring:
+            match += ''.join(f' OR t.{column} ILIKE %(like)s' for column in like_columns)
+        branches.append(f"""(
+            SELECT '{type_name}' as type, t.id, t.{title} as title, t.{subtitle} as subtitle,
+                   ts_rank(t.search_vector, {SEARCH_TSQUERY}) + similarity(t.{title}, %(text)s) as rank
+            FROM {table} t
+            WHERE {match}
+            ORDER BY rank DESC, t.id DESC
+            LIMIT %(window)s
+        )""")
+    return f"""
+        SELECT type, id, title, subtitle, rank
+        FROM ({' UNION ALL '.join(branches)}) found
+        ORDER BY rank DESC, type, id DESC
+        LIMIT %(limit)s OFFSET %(offset)s
+    """
+
+def search_query(params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Validate search parameters into (sql, args); raises ValueError on bad input"""
+    text = (params.get('q') or '').strip()
+    terms = re.findall(r'[^\W_]+', text.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        raise ValueError('q is required')
+    types = [t for t in (params.get('types') or ','.join(SEARCH_SOURCES)).split(',') if t]
+    if any(t not in SEARCH_SOURCES for t in types):
+        raise ValueError(f"types must be a subset of {', '.join(SEARCH_SOURCES)}")
+    limit = min(int(params.get('limit') or SEARCH_LIMIT_DEFAULT), SEARCH_LIMIT_MAX)
+    offset = int(params.get('offset') or 0)
+    if limit < 1 or not 0 <= offset <= SEARCH_MAX_OFFSET:
+        raise ValueError(f'limit must be positive and offset between 0 and {SEARCH_MAX_OFFSET}')
+    
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return search_sql(types, len(text) >= TRIGRAM_MIN_CHARS), {
+        'prefix': ' & '.join(f'{term}:*' for term in terms),
+        'text': text,
+        'like': f'%{escaped}%',
+        'window': offset + limit + 1,
+        'limit': limit + 1,
+        'offset': offset,
+    }
+
+def search(cur, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Ranked search over projects, estimates, companies and contractors; raises ValueError on bad input"""
+    sql, args = search_query(params)
+    cur.execute(sql, args)
+    rows = [dict(row) for row in cur.fetchall()]
+    limit, offset = args['limit'] - 1, args['offset']
+    return {
+        'items': rows[:limit],
+        'next_offset': offset + limit if len(rows) > limit and offset + limit <= SEARCH_MAX_OFFSET else None
+    }
+
+@db.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Get reference data (companies, items) for forms and manage companies
-    Args: event - dict with httpMethod, queryStringParameters, body
+    Business: Get reference data (companies, items) for forms, search across entities and manage companies
+    Args: event - dict with httpMethod, queryStringParameters (action; q, types, limit, offset for search), body
           context - object with request_id attribute
     Returns: HTTP response with reference data or creation result
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute("SELECT current_schema()")
-    schema = cur.fetchone()['current_schema']
+        return responses.build(event, 200, '', {
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, X-DB-Session',
+            'Access-Control-Max-Age': '86400'
+        })
     
     params = event.get('queryStringParameters', {}) or {}
     action = params.get('action', '')
     
+    if method == 'GET' and action == 'companies':
+        try:
+            return reference_cache.response(event, 'companies')
+        except Exception as e:
+            result = [
+                {"id": 1, "name": "ТехноСтрой", "contact_person": "Петров И.И.", "email": "info@tehnostroy.ru", "phone": "+7 495 123-45-67"},
+                {"id": 2, "name": "ИнноТех", "contact_person": "Смирнова А.А.", "email": "contact@innotech.ru", "phone": "+7 495 987-65-43"},
+                {"id": 3, "name": "СтройПроект", "contact_person": "Иванов В.В.", "email": "office@stroyproject.ru", "phone": "+7 495 555-66-77"}
+            ]
+            return responses.json_response(event, 200, result)
+    
+    if method == 'GET' and action == 'items':
+        return reference_cache.response(event, 'items')
+    
+    conn = db.connect_read(event) if method == 'GET' else db.connect()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    
     if method == 'GET':
-        if action == 'companies':
+        if action == 'companies-with-stats':
+            cur.execute("""
+                SELECT 
+                    c.id,
+                    c.name,
+                    COALESCE(c.inn, '') as inn,
+                    COALESCE(c.kpp, '') as kpp,
+                    COALESCE(c.ogrn, '') as ogrn,
+                    COALESCE(c.legal_address, '') as legal_address,
+                    COALESCE(c.actual_address, '') as actual_address,
+                    COALESCE(c.bank_name, '') as bank_name,
+                    COALESCE(c.bik, '') as bik,
+                    COALESCE(c.correspondent_account, '') as correspondent_account,
+                    COALESCE(c.account_number, '') as account_number,
+                    COALESCE(c.contact_person, '') as contact_person,
+                    COALESCE(c.email, '') as email,
+                    COALESCE(c.phone, '') as phone,
+                    COALESCE(p.total_projects, 0) as total_projects,
+                    COALESCE(p.active_projects, 0) as active_projects,
+                    COALESCE(p.total_budget, 0) as total_budget,
+                    COALESCE(p.total_profit, 0) as total_profit,
+                    COALESCE(pp.pending_payments, 0) as pending_payments
+                FROM companies c
+                LEFT JOIN (
+                    SELECT 
+                        company_id,
+                        COUNT(*) as total_projects,
+                        COUNT(*) FILTER (WHERE status = 'in_progress') as active_projects,
+                        SUM(budget) as total_budget,
+                        SUM(budget - actual_cost) as total_profit
+                    FROM projects
+                    GROUP BY company_id
+                ) p ON p.company_id = c.id
+                LEFT JOIN (
+                    SELECT pr.company_id, COUNT(*) as pending_payments
+                    FROM payments pay
+                    JOIN projects pr ON pr.id = pay.project_id
+                    WHERE pay.status = 'pending'
+                    GROUP BY pr.company_id
+                ) pp ON pp.company_id = c.id
+                ORDER BY c.name
+            """)
+            result = [dict(row) for row in cur.fetchall()]
+        elif action == 'search':
             try:
-                cur.execute('SELECT id, name, COALESCE(contact_person, \'\') as contact_person, COALESCE(email, \'\') as email, COALESCE(phone, \'\') as phone FROM companies ORDER BY name')
-                result = [dict(row) for row in cur.fetchall()]
-            except Exception as e:
-                result = [
-                    {"id": 1, "name": "ТехноСтрой", "contact_person": "Петров И.И.", "email": "info@tehnostroy.ru", "phone": "+7 495 123-45-67"},
-                    {"id": 2, "name": "ИнноТех", "contact_person": "Смирнова А.А.", "email": "contact@innotech.ru", "phone": "+7 495 987-65-43"},
-                    {"id": 3, "name": "СтройПроект", "contact_person": "Иванов В.В.", "email": "office@stroyproject.ru", "phone": "+7 495 555-66-77"}
-                ]
-        elif action == 'companies-with-stats':
-            cur.execute('SELECT id, name, COALESCE(inn, \'\') as inn, COALESCE(kpp, \'\') as kpp, COALESCE(ogrn, \'\') as ogrn, COALESCE(legal_address, \'\') as legal_address, COALESCE(actual_address, \'\') as actual_address, COALESCE(bank_name, \'\') as bank_name, COALESCE(bik, \'\') as bik, COALESCE(correspondent_account, \'\') as correspondent_account, COALESCE(account_number, \'\') as account_number, COALESCE(contact_person, \'\') as contact_person, COALESCE(email, \'\') as email, COALESCE(phone, \'\') as phone FROM companies ORDER BY name')
-            companies = [dict(row) for row in cur.fetchall()]
-            result = []
-            for company in companies:
-                result.append({
-                    'id': company['id'],
-                    'name': company['name'],
-                    'inn': company['inn'],
-                    'kpp': company['kpp'],
-                    'ogrn': company['ogrn'],
-                    'legal_address': company['legal_address'],
-                    'actual_address': company['actual_address'],
-                    'bank_name': company['bank_name'],
-                    'bik': company['bik'],
-                    'correspondent_account': company['correspondent_account'],
-                    'account_number': company['account_number'],
-                    'contact_person': company['contact_person'],
-                    'email': company['email'],
-                    'phone': company['phone'],
-                    'total_projects': 0,
-                    'active_projects': 0,
-                    'total_budget': 0,
-                    'total_profit': 0,
-                    'pending_payments': 0
-                })
+                result = search(cur, params)
+            except ValueError as e:
+                cur.close()
+                conn.close()
+                return responses.error(event, 400, str(e))
         elif action == 'company-projects':
             company_id = params.get('company_id', '')
-            if not company_id:
+            if not company_id.isdigit():
                 cur.close()
                 conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'company_id required'}),
-                    'isBase64Encoded': False
-                }
-            result = []
-        elif action == 'items':
-            cur.execute('SELECT id, name, description, type, unit, COALESCE(default_price, 0) as default_price FROM items ORDER BY type, name')
-            rows = cur.fetchall()
-            result = []
-            for row in rows:
-                row_dict = dict(row)
-                row_dict['default_price'] = str(row_dict['default_price'])
-                result.append(row_dict)
+                return responses.error(event, 400, 'company_id required')
+            cur.execute("""
+                SELECT 
+                    p.id,
+                    p.title as name,
+                    p.description,
+                    p.budget,
+                    p.actual_cost,
+                    (p.budget - p.actual_cost) as profit,
+                    p.status,
+                    p.start_date,
+                    p.end_date,
+                    p.created_at
+                FROM projects p
+                WHERE p.company_id = %s
+                ORDER BY p.created_at DESC, p.id DESC
+            """, (int(company_id),))
+            result = [dict(row) for row in cur.fetchall()]
         else:
             cur.close()
             conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid action'}),
-                'isBase64Encoded': False
-            }
+            return responses.error(event, 400, 'Invalid action')
         
         cur.close()
         conn.close()
         
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps(result, default=str),
-            'isBase64Encoded': False
-        }
+        return responses.json_response(event, 200, result)
     
     if method == 'POST' and action == 'create-company':
         body = json.loads(event.get('body', '{}'))
-        name = body.get('name', '').replace("'", "''")
-        inn = body.get('inn', '').replace("'", "''")
+        name = body.get('name', '')
+        inn = body.get('inn', '')
         
         if not name or not inn:
             cur.close()
             conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Missing required fields: name, inn'}),
-                'isBase64Encoded': False
-            }
+            return responses.error(event, 400, 'Missing required fields: name, inn')
         
-        kpp = body.get('kpp', '').replace("'", "''")
-        ogrn = body.get('ogrn', '').replace("'", "''")
-        legal_address = body.get('legal_address', '').replace("'", "''")
-        actual_address = body.get('actual_address', '').replace("'", "''")
-        bank_name = body.get('bank_name', '').replace("'", "''")
-        bik = body.get('bik', '').replace("'", "''")
-        correspondent_account = body.get('correspondent_account', '').replace("'", "''")
-        account_number = body.get('account_number', '').replace("'", "''")
-        contact_person = body.get('contact_person', '').replace("'", "''")
-        phone = body.get('phone', '').replace("'", "''")
-        email = body.get('email', '').replace("'", "''")
-        
-        cur.execute(f"""
-            INSERT INTO companies 
-            (name, inn, kpp, ogrn, legal_address, actual_address, bank_name, bik, 
-             correspondent_account, account_number, contact_person, phone, email)
-            VALUES ('{name}', '{inn}', '{kpp}', '{ogrn}', '{legal_address}', '{actual_address}', 
-                    '{bank_name}', '{bik}', '{correspondent_account}', '{account_number}', 
-                    '{contact_person}', '{phone}', '{email}')
-            RETURNING id
-        """)
+        INSERT_COMPANY.execute(cur, (name, inn) + tuple(body.get(field, '') for field in COMPANY_OPTIONAL_FIELDS))
         company_id = cur.fetchone()['id']
         conn.commit()
+        reference_cache.invalidate('companies')
         
         cur.close()
         conn.close()
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'id': company_id, 'message': 'Company created'}),
-            'isBase64Encoded': False
-        }
+        return responses.json_response(event, 200, {'id': company_id, 'message': 'Company created'})
     
     cur.close()
     conn.close()
     
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
\ No newline at end of file
+    return responses.error(event, 405, 'Method not allowed')
\ No newline at end of file
@@ -0,0 +1,163 @@
+'''
+Cached reference data (companies, items) for the form dropdowns.
+Served by both api-reference and project-management, so each carries an identical copy of this module.
+Entries are pre-encoded JSON bodies with an ETag and their compressed variants, tagged with the list's
+reference_versions counter (bumped by a trigger on every write to the table, V0019). Each read checks that
+counter, so a write made through the other function is seen at once; local writes also invalidate by name.
+The default backend lives in process memory; REFERENCE_CACHE_BACKEND=file with a shared
+REFERENCE_CACHE_DIR makes invalidations visible to every instance mounting that directory.
+'''
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import db
+import responses
+from psycopg2.extras import RealDictCursor
+
+CACHE_TTL_SECONDS = float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', '300'))
+CACHE_MAX_ENTRIES = int(os.environ.get('REFERENCE_CACHE_MAX_ENTRIES', '32'))
+CACHE_MAX_ENTRY_BYTES = int(os.environ.get('REFERENCE_CACHE_MAX_ENTRY_BYTES', str(1024 * 1024)))
+
+VERSION_SQL = "SELECT version FROM reference_versions WHERE name = %s"
+
+REFERENCE_QUERIES: Dict[str, str] = {
+    'companies': """
+        SELECT id, name, COALESCE(contact_person, '') as contact_person, COALESCE(email, '') as email, COALESCE(phone, '') as phone
+        FROM companies
+        ORDER BY name
+    """,
+    'items': """
+        SELECT id, name, description, type, unit, COALESCE(default_price, 0) as default_price
+        FROM items
+        ORDER BY type, name
+    """,
+}
+
+
+class MemoryBackend:
+    """Per-process LRU with TTL; also stands in for a shared cache when several handlers share one process"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, str]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, str], ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileBackend:
+    """One JSON file per key in a directory that several instances may share"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                item = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if item.get('expires_at', 0) < time.time():
+            return None
+        return item['value']
+
+    def set(self, key: str, value: Dict[str, str], ttl: float) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'expires_at': time.time() + ttl, 'value': value}, f)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+def _make_backend() -> Any:
+    if os.environ.get('REFERENCE_CACHE_BACKEND') == 'file':
+        return FileBackend(os.environ.get('REFERENCE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'reference-cache'))
+    return MemoryBackend()
+
+
+backend = _make_backend()
+
+
+def load(name: str) -> Dict[str, str]:
+    """
+    Return the entry (body, etag and encoding -> base64 body) for a reference list.
+    Every call reads the list's version row; the list itself is queried only on a miss or a newer version.
+    The version is read before the list, so a concurrent write can only make the entry newer than its tag.
+    """
+    conn = db.connect()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(VERSION_SQL, (name,))
+        row = cur.fetchone()
+        version = str(row['version']) if row else ''
+        entry = backend.get(name)
+        if entry is None or entry.get('version') != version:
+            cur.execute(REFERENCE_QUERIES[name])
+            body = json.dumps([dict(row) for row in cur.fetchall()], default=str)
+            entry = {'body': body, 'etag': '"' + hashlib.sha1(body.encode()).hexdigest()[:20] + '"',
+                     'version': version, **responses.precompress(body)}
+            if len(body) <= CACHE_MAX_ENTRY_BYTES:
+                backend.set(name, entry, CACHE_TTL_SECONDS)
+        cur.close()
+    finally:
+        conn.close()
+    return entry
+
+
+def invalidate(*names: str) -> None:
+    for name in names:
+        backend.delete(name)
+
+
+def not_modified(event: Dict[str, Any], etag: str) -> bool:
+    """True when the request's If-None-Match already names the current ETag"""
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), None)
+    if not value:
+        return False
+    candidates = [candidate.strip() for candidate in value.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def response(event: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """200 with the cached body, or 304 when the client already has this version"""
+    entry = load(name)
+    headers = {'ETag': entry['etag'], 'Cache-Control': 'no-cache'}
+    if not_modified(event, entry['etag']):
+        return responses.build(event, 304, '', headers)
+    return responses.build(event, 200, entry['body'], headers, precompressed=entry)
@@ -0,0 +1,239 @@
+'''
+Accounting export: payments, projects and company requisites for a date range as CSV or XLSX.
+CSV is produced by COPY ... TO STDOUT and XLSX row by row from a server-side cursor; both write into a
+spooled temporary file (CSV through the gzip or brotli stream the request's Accept-Encoding picks, XLSX is a zip).
+The function response carries one chunk of at most EXPORT_CHUNK_ROWS rows as a base64 body; a chunk that
+would encode to more than EXPORT_MAX_BODY_BYTES is written again with half the rows, so a body never exceeds
+the function's response limit. A client follows X-Export-Next (passed back as after=) until the header is absent.
+CSV chunks concatenate into one file (only the first carries the BOM and header row);
+every XLSX chunk is a workbook of its own.
+'''
+import base64
+import codecs
+import contextlib
+import gzip
+import os
+import tempfile
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import db
+import responses
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '20000'))
+# Uncompressed CSV rows are several times larger, so identity responses start from a quarter of the rows
+EXPORT_PLAIN_CHUNK_ROWS = max(1, EXPORT_CHUNK_ROWS // 4)
+# Function responses are limited to 3.5 MB; the base64 body stays under this
+EXPORT_MAX_BODY_BYTES = int(os.environ.get('EXPORT_MAX_BODY_BYTES', str(3 * 1024 * 1024)))
+EXPORT_SPOOL_BYTES = int(os.environ.get('EXPORT_SPOOL_BYTES', str(8 * 1024 * 1024)))
+EXPORT_ITERSIZE = 5000
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# type -> (base table aliased p, keyset column and its SQL type, the exported SELECT with {where})
+# Chunks are keyset ranges over (key, id), so each source needs an index on (key, id):
+# idx_payments_date (V0012), idx_projects_created (V0005); companies is small enough to sort.
+EXPORT_SOURCES: Dict[str, Tuple[str, str, str, str]] = {
+    'payments': ('payments p', 'p.payment_date', 'date', """
+        SELECT p.id, p.payment_date, p.payment_type, p.status, p.amount, p.description,
+               p.project_id, pr.title as project_title,
+               c.name as company_name, c.inn as company_inn, c.kpp as company_kpp,
+               p.contractor_id, ct.name as contractor_name
+        FROM payments p
+        LEFT JOIN projects pr ON pr.id = p.project_id
+        LEFT JOIN companies c ON c.id = pr.company_id
+        LEFT JOIN contractors ct ON ct.id = p.contractor_id
+        {where}
+        ORDER BY p.payment_date, p.id
+    """),
+    'projects': ('projects p', 'p.created_at', 'timestamp', """
+        SELECT p.id, p.created_at, p.title, p.status, p.start_date, p.end_date,
+               c.name as company_name, c.inn as company_inn, c.kpp as company_kpp,
+               p.budget, p.actual_cost, p.items_total, p.paid_cost, p.total_paid, p.payment_count
+        FROM projects p
+        LEFT JOIN companies c ON c.id = p.company_id
+        {where}
+        ORDER BY p.created_at, p.id
+    """),
+    'companies': ('companies p', 'p.created_at', 'timestamp', """
+        SELECT p.id, p.created_at, p.name, p.inn, p.kpp, p.ogrn, p.legal_address, p.actual_address,
+               p.bank_name, p.bik, p.correspondent_account, p.account_number,
+               p.contact_person, p.phone, p.email
+        FROM companies p
+        {where}
+        ORDER BY p.created_at, p.id
+    """),
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def parse_params(params: Dict[str, Any]) -> Tuple[str, str, List[str], Dict[str, Any]]:
+    """Validate export parameters into (type, format, conditions, args); raises ValueError on bad input"""
+    kind = params.get('type') or 'payments'
+    fmt = params.get('format') or 'csv'
+    if kind not in EXPORT_SOURCES or fmt not in EXPORT_FORMATS:
+        raise ValueError(f"type must be one of {', '.join(EXPORT_SOURCES)} and format one of {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'xlsx' and xlsxwriter is None:
+        raise ValueError('XLSX export needs XlsxWriter installed')
+    _, key, key_type, _ = EXPORT_SOURCES[kind]
+
+    conditions: List[str] = []
+    args: Dict[str, Any] = {}
+    date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else None
+    date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else None
+    if date_from and date_to and date_from > date_to:
+        raise ValueError('date_from is after date_to')
+    if date_from:
+        conditions.append(f'{key} >= %(date_from)s')
+        args['date_from'] = date_from
+    if date_to:
+        conditions.append(f'{key} < %(date_end)s')
+        args['date_end'] = date_to + timedelta(days=1)
+    if params.get('after'):
+        after_key, after_id = db.decode_cursor(params['after'])
+        conditions.append(f'({key}, p.id) > (%(after_key)s::{key_type}, %(after_id)s)')
+        args.update(after_key=after_key, after_id=after_id)
+    return kind, fmt, conditions, args
+
+
+def chunk_bound(cur, kind: str, conditions: List[str], args: Dict[str, Any], chunk_rows: int) -> Tuple[Optional[tuple], bool]:
+    '''
+    The (key, id) of the chunk's last row and whether rows remain after it, read from the (key, id) index
+    without the joins. (None, False) when the rest of the range fits in one chunk.
+    '''
+    table, key, _, _ = EXPORT_SOURCES[kind]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cur.execute(f"""
+        SELECT {key}, p.id FROM {table}
+        {where}
+        ORDER BY {key}, p.id
+        OFFSET %(chunk_offset)s LIMIT 2
+    """, {**args, 'chunk_offset': chunk_rows - 1})
+    rows = cur.fetchall()
+    if not rows:
+        return None, False
+    return tuple(rows[0]), len(rows) > 1
+
+
+class BrotliWriter:
+    """Minimal writable file over a brotli stream, for copy_expert"""
+
+    def __init__(self, out: Any) -> None:
+        self.out = out
+        self.compressor = responses.brotli.Compressor(mode=responses.brotli.MODE_TEXT, quality=responses.BROTLI_QUALITY)
+
+    def write(self, data: bytes) -> int:
+        self.out.write(self.compressor.process(data))
+        return len(data)
+
+    def finish(self) -> None:
+        self.out.write(self.compressor.finish())
+
+
+@contextlib.contextmanager
+def content_stream(spool: Any, encoding: Optional[str]) -> Iterator[Any]:
+    """Writable stream into spool in the negotiated Content-Encoding (None: as is)"""
+    if encoding == 'gzip':
+        with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=responses.GZIP_LEVEL, mtime=0) as out:
+            yield out
+    elif encoding == 'br':
+        out = BrotliWriter(spool)
+        yield out
+        out.finish()
+    else:
+        yield spool
+
+
+def write_csv(cur, sql: str, args: Dict[str, Any], out: Any, first: bool) -> int:
+    # Excel in the ru locale opens ';'-separated UTF-8 with a BOM without an import dialog
+    if first:
+        out.write(codecs.BOM_UTF8)
+    header = ', HEADER' if first else ''
+    cur.copy_expert(cur.mogrify(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, DELIMITER ';'{header})", args), out)
+    return cur.rowcount
+
+
+def write_xlsx(conn, sql: str, args: Dict[str, Any], out: Any, sheet: str) -> int:
+    workbook = xlsxwriter.Workbook(out, {
+        'constant_memory': True,
+        'default_date_format': 'dd.mm.yyyy',
+        'tmpdir': tempfile.gettempdir(),
+    })
+    worksheet = workbook.add_worksheet(sheet)
+    cur = conn.cursor(name='export_rows')
+    cur.itersize = EXPORT_ITERSIZE
+    cur.execute(sql, args)
+    rows = 0
+    for row in cur:
+        if rows == 0:
+            worksheet.write_row(0, 0, [column.name for column in cur.description])
+        rows += 1
+        worksheet.write_row(rows, 0, row)
+    cur.close()
+    workbook.close()
+    return rows
+
+
+def write_chunk(conn, kind: str, fmt: str, encoding: Optional[str], conditions: List[str], args: Dict[str, Any],
+                chunk_rows: int, first: bool) -> Tuple[Any, int, Optional[tuple], bool]:
+    """Write one chunk of at most chunk_rows rows into a new spool as (spool, rows, bound, more); the caller closes it"""
+    cur = conn.cursor()
+    bound, more = chunk_bound(cur, kind, conditions, args, chunk_rows)
+    if bound is not None:
+        _, key, key_type, _ = EXPORT_SOURCES[kind]
+        conditions = conditions + [f'({key}, p.id) <= (%(bound_key)s::{key_type}, %(bound_id)s)']
+        args = {**args, 'bound_key': bound[0], 'bound_id': bound[1]}
+    sql = EXPORT_SOURCES[kind][3].format(where=f"WHERE {' AND '.join(conditions)}" if conditions else '')
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    if fmt == 'csv':
+        with content_stream(spool, encoding) as out:
+            rows = write_csv(cur, sql, args, out, first)
+    else:
+        rows = write_xlsx(conn, sql, args, spool, kind)
+    cur.close()
+    return spool, rows, bound, more
+
+
+def export(conn, params: Dict[str, Any], encoding: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    One chunk of an export as (base64 body, headers); raises ValueError on bad input.
+    encoding is the request's accepted Content-Encoding (responses.accepted_encoding); it applies to CSV only.
+    """
+    kind, fmt, conditions, args = parse_params(params)
+    if fmt != 'csv':
+        encoding = None
+    chunk_rows = EXPORT_CHUNK_ROWS if encoding or fmt != 'csv' else EXPORT_PLAIN_CHUNK_ROWS
+    while True:
+        spool, rows, bound, more = write_chunk(conn, kind, fmt, encoding, conditions, args, chunk_rows,
+                                               not params.get('after'))
+        with spool:
+            size = spool.seek(0, os.SEEK_END)
+            if (size + 2) // 3 * 4 > EXPORT_MAX_BODY_BYTES and chunk_rows > 1:
+                chunk_rows //= 2
+                continue
+            spool.seek(0)
+            body = base64.b64encode(spool.read()).decode('ascii')
+        break
+
+    period = '_'.join(params[name] for name in ('date_from', 'date_to') if params.get(name)) or 'all'
+    headers = {
+        'Content-Type': CONTENT_TYPES[fmt],
+        'Content-Disposition': f'attachment; filename="{kind}_{period}.{fmt}"',
+        'X-Export-Rows': str(rows),
+        'Access-Control-Expose-Headers': 'Content-Disposition, X-Export-Rows, X-Export-Next',
+    }
+    if fmt == 'csv':
+        headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if more:
+        headers['X-Export-Next'] = db.encode_cursor(bound[0], bound[1])
+    return body, headers
@@ -0,0 +1,235 @@
+'''
+Budget burn and completion cost forecast for every project at once.
+One query returns the projects and their monthly expense (cash_flow_monthly plus unfolded deltas) as packed
+binary columns - one row whatever the project count - which load straight into NumPy arrays; the burn
+rate, projected completion cost and overrun are then computed over all projects in a single vectorized pass.
+Burn rate is the decay-weighted mean of completed monthly expense over the last FORECAST_HISTORY_MONTHS
+full months the project was running; the projection runs it on to end_date. Projects without an end_date
+get no projection, closed ones are projected at their actual cost.
+'''
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import db
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FORECAST_HISTORY_MONTHS = int(os.environ.get('FORECAST_HISTORY_MONTHS', '6'))
+FORECAST_DECAY = float(os.environ.get('FORECAST_DECAY', '0.8'))
+FORECAST_CLOSED_STATUSES = ('completed', 'cancelled')
+FORECAST_FILTERS = ('company_id',)
+FORECAST_ORDERS = ('overrun', 'burn_rate')
+DAYS_PER_MONTH = 365.25 / 12
+EPOCH = date(1970, 1, 1)
+
+# Columns arrive as bytea in network byte order (int4send/float8send), NULL dates as NaN
+FORECAST_SQL = """
+    WITH scope AS (
+        SELECT p.id, p.budget, p.actual_cost, p.start_date, p.end_date, p.status
+        FROM projects p
+        {where}
+    ), spend AS (
+        SELECT b.project_id, b.month, SUM(b.completed_total) as amount
+        FROM (
+            SELECT project_id, month, completed_total
+            FROM cash_flow_monthly
+            WHERE flow = 'o' AND month >= %(history_from)s AND month < %(history_to)s
+            UNION ALL
+            SELECT project_id, DATE_TRUNC('month', day)::date, completed_total
+            FROM cash_flow_deltas
+            WHERE flow = 'o' AND day >= %(history_from)s AND day < %(history_to)s
+        ) b
+        JOIN scope s ON s.id = b.project_id
+        GROUP BY 1, 2
+        HAVING SUM(b.completed_total) <> 0
+    )
+    SELECT projects.*, spend.*
+    FROM (
+        SELECT
+            string_agg(int4send(id), ''::bytea ORDER BY id) as id,
+            string_agg(float8send(budget::float8), ''::bytea ORDER BY id) as budget,
+            string_agg(float8send(COALESCE(actual_cost, 0)::float8), ''::bytea ORDER BY id) as actual_cost,
+            string_agg(float8send(COALESCE((start_date - DATE '1970-01-01')::float8, 'NaN')), ''::bytea ORDER BY id) as start_day,
+            string_agg(float8send(COALESCE((end_date - DATE '1970-01-01')::float8, 'NaN')), ''::bytea ORDER BY id) as end_day,
+            string_agg(int4send(COALESCE(status = ANY(%(closed)s), false)::int), ''::bytea ORDER BY id) as closed
+        FROM scope
+    ) projects, (
+        SELECT
+            string_agg(int4send(project_id), ''::bytea ORDER BY project_id, month) as spend_project,
+            string_agg(int4send(((DATE_PART('year', month) * 12 + DATE_PART('month', month))::int - %(history_base)s)),
+                       ''::bytea ORDER BY project_id, month) as spend_month,
+            string_agg(float8send(amount::float8), ''::bytea ORDER BY project_id, month) as spend_amount
+        FROM spend
+    ) spend
+"""
+
+COLUMN_TYPES = {
+    'id': '>i4', 'budget': '>f8', 'actual_cost': '>f8', 'start_day': '>f8', 'end_day': '>f8', 'closed': '>i4',
+    'spend_project': '>i4', 'spend_month': '>i4', 'spend_amount': '>f8',
+}
+
+
+def parse_params(params: Dict[str, Any]) -> Tuple[date, int, str, List[str], Dict[str, Any]]:
+    """Validate forecast parameters into (today, limit, order, conditions, args); raises ValueError on bad input"""
+    if np is None:
+        raise ValueError('Forecasting needs NumPy installed')
+    today = date.fromisoformat(params['date']) if params.get('date') else date.today()
+    order = params.get('order') or 'overrun'
+    if order not in FORECAST_ORDERS:
+        raise ValueError(f"order must be one of {', '.join(FORECAST_ORDERS)}")
+    limit = db.page_limit(params)
+
+    conditions: List[str] = []
+    args: Dict[str, Any] = {}
+    for column in FORECAST_FILTERS:
+        if params.get(column):
+            conditions.append(f'p.{column} = %({column})s')
+            args[column] = int(params[column])
+    return today, limit, order, conditions, args
+
+
+def history_window(today: date, months: int) -> Tuple[date, date]:
+    """The last `months` full months before today's month as [start, end)"""
+    end = today.replace(day=1)
+    total = end.year * 12 + end.month - 1 - months
+    return date(total // 12, total % 12 + 1, 1), end
+
+
+def load(cur, today: date, conditions: List[str], args: Dict[str, Any]) -> Dict[str, Any]:
+    """Run FORECAST_SQL and unpack its columns into native-endian arrays"""
+    history_from, history_to = history_window(today, FORECAST_HISTORY_MONTHS)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cur.execute(FORECAST_SQL.format(where=where), {
+        **args,
+        'history_from': history_from,
+        'history_to': history_to,
+        'history_base': history_from.year * 12 + history_from.month,
+        'closed': list(FORECAST_CLOSED_STATUSES),
+    })
+    row = cur.fetchone()
+    return {
+        name: np.frombuffer(row[name], dtype=dtype).astype(dtype[1:]) if row[name] is not None else np.empty(0, dtype[1:])
+        for name, dtype in COLUMN_TYPES.items()
+    }
+
+
+def compute(columns: Dict[str, Any], today: date, months: int = FORECAST_HISTORY_MONTHS,
+            decay: float = FORECAST_DECAY) -> Dict[str, Any]:
+    """
+    Forecast arrays for every project from the load() columns; NaN where there is no projection.
+    Spend rows are (project id, month index in the history window, amount) sorted by project id.
+    """
+    ids = columns['id']
+    count = len(ids)
+    today_day = float((today - EPOCH).days)
+    history_from, _ = history_window(today, months)
+
+    # Dense project x month spend matrix; project ids map to rows through the sorted id array
+    rows = np.searchsorted(ids, columns['spend_project'])
+    spend = np.bincount(rows * months + columns['spend_month'], weights=columns['spend_amount'],
+                        minlength=count * months).reshape(count, months)
+
+    # A history month counts once the project had started by its last day (no start_date: every month)
+    month_starts = [history_from]
+    for _ in range(months):
+        month_starts.append((month_starts[-1] + timedelta(days=32)).replace(day=1))
+    month_last_days = np.array([(start - EPOCH).days - 1 for start in month_starts[1:]], dtype='f8')
+    start_day = columns['start_day']
+    running = (start_day[:, None] <= month_last_days[None, :]) | np.isnan(start_day)[:, None]
+    weights = running * decay ** np.arange(months - 1, -1, -1, dtype='f8')
+    weight_sums = weights.sum(axis=1)
+    burn_rate = np.divide((spend * weights).sum(axis=1), weight_sums,
+                          out=np.zeros(count), where=weight_sums > 0)
+
+    closed = columns['closed'].astype(bool)
+    budget = columns['budget']
+    actual = columns['actual_cost']
+    remaining_months = np.maximum(columns['end_day'] - today_day, 0) / DAYS_PER_MONTH
+    remaining_months[closed] = 0
+    projected = actual + burn_rate * remaining_months
+    overrun = projected - budget
+    overrun_pct = np.divide(overrun * 100, budget, out=np.full(count, np.nan), where=budget > 0)
+    overrun_pct[np.isnan(overrun)] = np.nan
+
+    # Day the remaining budget runs out at the current burn rate
+    budget_left = np.maximum(budget - actual, 0)
+    exhausted_day = np.full(count, np.nan)
+    burning = (burn_rate > 0) & ~closed
+    exhausted_day[burning] = today_day + budget_left[burning] / burn_rate[burning] * DAYS_PER_MONTH
+
+    return {
+        'id': ids,
+        'budget': budget,
+        'actual_cost': actual,
+        'burn_rate': burn_rate,
+        'remaining_months': remaining_months,
+        'projected_cost': projected,
+        'projected_overrun': overrun,
+        'projected_overrun_pct': overrun_pct,
+        'budget_exhausted_day': exhausted_day,
+        'closed': closed,
+    }
+
+
+def top(values: Any, limit: int) -> Any:
+    """Indexes of the `limit` largest values in descending order, NaN last"""
+    keys = np.where(np.isnan(values), -np.inf, values)
+    if limit < len(keys):
+        keys_part = np.argpartition(-keys, limit - 1)[:limit]
+        return keys_part[np.argsort(-keys[keys_part], kind='stable')]
+    return np.argsort(-keys, kind='stable')
+
+
+def money(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def summarize(result: Dict[str, Any], today: date, limit: int, order: str) -> Dict[str, Any]:
+    """Portfolio totals plus the `limit` projects ranked by `order`"""
+    projected = result['projected_cost']
+    overrun = result['projected_overrun']
+    has_projection = ~np.isnan(projected)
+    items = []
+    for index in top(result['projected_overrun' if order == 'overrun' else 'burn_rate'], limit):
+        exhausted = result['budget_exhausted_day'][index]
+        pct = result['projected_overrun_pct'][index]
+        items.append({
+            'project_id': int(result['id'][index]),
+            'budget': money(result['budget'][index]),
+            'actual_cost': money(result['actual_cost'][index]),
+            'burn_rate': money(result['burn_rate'][index]),
+            'remaining_months': None if np.isnan(result['remaining_months'][index]) else round(float(result['remaining_months'][index]), 1),
+            'projected_cost': money(projected[index]),
+            'projected_overrun': money(overrun[index]),
+            'projected_overrun_pct': None if np.isnan(pct) else round(float(pct), 1),
+            'budget_exhausted_on': None if np.isnan(exhausted) else (EPOCH + timedelta(days=int(exhausted))).isoformat(),
+            'closed': bool(result['closed'][index]),
+        })
+    return {
+        'date': today.isoformat(),
+        'history_months': FORECAST_HISTORY_MONTHS,
+        'order': order,
+        'totals': {
+            'projects': int(len(projected)),
+            'projected': int(has_projection.sum()),
+            'unscheduled': int((~has_projection).sum()),
+            'overrunning': int((overrun > 0).sum()),
+            'budget': money(result['budget'].sum()),
+            'actual_cost': money(result['actual_cost'].sum()),
+            'burn_rate': money(result['burn_rate'].sum()),
+            'projected_cost': money(projected[has_projection].sum()),
+            'projected_overrun': money(overrun[overrun > 0].sum()),
+            'projected_profit': money((result['budget'][has_projection] - projected[has_projection]).sum()),
+        },
+        'items': items,
+    }
+
+
+def forecast(cur, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Forecast every project in scope; raises ValueError on bad input"""
+    today, limit, order, conditions, args = parse_params(params)
+    columns = load(cur, today, conditions, args)
+    return summarize(compute(columns, today), today, limit, order)
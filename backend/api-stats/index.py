@@ -1,118 +1,344 @@
-import json
+import hmac
 import os
-from typing import Dict, Any
-import psycopg2
+from datetime import date, timedelta
+from typing import Dict, Any, List, Tuple
+import aio
+import db
+import responses
 from psycopg2.extras import RealDictCursor
 
+PROJECT_KEYS = ('total_projects', 'active_projects', 'completed_projects', 'total_budget', 'total_spent', 'total_profit')
+CONTRACTOR_KEYS = ('total_contractors',)
+ESTIMATE_KEYS = ('total_estimates', 'draft_estimates', 'approved_estimates', 'total_estimated')
+PAYMENT_KEYS = ('total_payments', 'payment_count', 'pending_payments')
+TOTAL_KEYS = PROJECT_KEYS[:-1] + CONTRACTOR_KEYS + ESTIMATE_KEYS + PAYMENT_KEYS
+DRIFT_REPORT_LIMIT = 100
+# rebuild locks every source table for its full recompute and reconcile scans them all, so both need this
+# token in the X-Admin-Token header; with STATS_ADMIN_TOKEN unset they are switched off
+ADMIN_TOKEN = os.environ.get('STATS_ADMIN_TOKEN', '')
+ADMIN_HEADER = 'X-Admin-Token'
+ADMIN_ACTIONS = ('rebuild', 'reconcile')
+
+CASH_FLOW_GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+CASH_FLOW_GROUPS = {'none': 'NULL::integer', 'project': 'project_id', 'contractor': 'contractor_id', 'company': 'company_id'}
+CASH_FLOW_FILTERS = ('project_id', 'contractor_id', 'company_id')
+
+# The whole dashboard as one JSON document built by Postgres in a single round trip.
+# Money columns are cast to text to keep the response shape of the per-query version.
+DASHBOARD_SQL = """
+    WITH totals AS (
+        SELECT * FROM dashboard_totals WHERE id = 1
+    ), recent AS (
+        SELECT created_at, id, title, budget, actual_cost, status
+        FROM projects
+        ORDER BY created_at DESC, id DESC
+        LIMIT 5
+    ), monthly AS (
+        SELECT month, total
+        FROM monthly_payment_totals
+        WHERE month >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '6 months')
+          AND payment_count > 0
+    )
+    SELECT json_build_object(
+        'projects', (SELECT json_build_object(
+            'total_projects', total_projects,
+            'active_projects', active_projects,
+            'completed_projects', completed_projects,
+            'total_budget', total_budget::text,
+            'total_spent', total_spent::text,
+            'total_profit', (total_budget - total_spent)::text
+        ) FROM totals),
+        'contractors', (SELECT json_build_object(
+            'total_contractors', total_contractors
+        ) FROM totals),
+        'estimates', (SELECT json_build_object(
+            'total_estimates', total_estimates,
+            'draft_estimates', draft_estimates,
+            'approved_estimates', approved_estimates,
+            'total_estimated', total_estimated::text
+        ) FROM totals),
+        'payments', (SELECT json_build_object(
+            'total_payments', total_payments::text,
+            'payment_count', payment_count,
+            'pending_payments', pending_payments
+        ) FROM totals),
+        'recent_projects', (SELECT COALESCE(json_agg(json_build_object(
+            'title', title,
+            'budget', budget::text,
+            'actual_cost', actual_cost::text,
+            'profit', (budget - actual_cost)::text,
+            'status', status
+        ) ORDER BY created_at DESC, id DESC), '[]') FROM recent),
+        'monthly_payments', (SELECT COALESCE(json_agg(json_build_object(
+            'month', to_char(month, 'YYYY-MM-DD"T"HH24:MI:SS'),
+            'total', total::float8
+        ) ORDER BY month), '[]') FROM monthly)
+    )::text as dashboard
+"""
+
+RECONCILE_QUERIES = (
+    ('SELECT * FROM dashboard_totals WHERE id = 1', None),
+    ('SELECT * FROM dashboard_totals_recomputed', None),
+    ("""
+        SELECT 
+            COALESCE(s.month, r.month) as month,
+            s.total as stored_total,
+            r.total as expected_total,
+            s.payment_count as stored_count,
+            r.payment_count as expected_count
+        FROM (SELECT * FROM monthly_payment_totals WHERE payment_count > 0) s
+        FULL OUTER JOIN monthly_payment_totals_recomputed r ON r.month = s.month
+        WHERE s.total IS DISTINCT FROM r.total OR s.payment_count IS DISTINCT FROM r.payment_count
+        ORDER BY 1
+    """, None),
+    ("""
+        SELECT 
+            p.id,
+            p.payment_count as stored_payment_count,
+            r.payment_count as expected_payment_count,
+            p.total_paid as stored_total_paid,
+            r.total_paid as expected_total_paid,
+            p.actual_cost as stored_actual_cost,
+            r.actual_cost as expected_actual_cost,
+            p.payments_from as stored_payments_from,
+            r.payments_from as expected_payments_from,
+            p.payments_to as stored_payments_to,
+            r.payments_to as expected_payments_to
+        FROM projects p
+        JOIN project_rollups_recomputed r ON r.id = p.id
+        WHERE (p.payment_count, p.total_paid, p.paid_cost, p.items_total, p.actual_cost)
+              IS DISTINCT FROM (r.payment_count, r.total_paid, r.paid_cost, r.items_total, r.actual_cost)
+           -- Payment date bounds only widen between rebuilds, so they drift when they no longer cover the payments
+           OR (r.payments_from IS NOT NULL
+               AND NOT COALESCE(p.payments_from <= r.payments_from AND p.payments_to >= r.payments_to, false))
+        ORDER BY p.id
+        LIMIT %s
+    """, (DRIFT_REPORT_LIMIT,)),
+    ("""
+        SELECT 
+            c.id,
+            c.payment_count as stored_payment_count,
+            r.payment_count as expected_payment_count,
+            c.total_earned as stored_total_earned,
+            r.total_earned as expected_total_earned,
+            c.total_paid as stored_total_paid,
+            r.total_paid as expected_total_paid,
+            c.pending_amount as stored_pending_amount,
+            r.pending_amount as expected_pending_amount
+        FROM contractors c
+        JOIN contractor_balances_recomputed r ON r.id = c.id
+        WHERE (c.payment_count, c.total_earned, c.total_paid, c.pending_amount, c.pending_payments)
+              IS DISTINCT FROM (r.payment_count, r.total_earned, r.total_paid, r.pending_amount, r.pending_payments)
+        ORDER BY c.id
+        LIMIT %s
+    """, (DRIFT_REPORT_LIMIT,)),
+)
+
+def drift_report(stored_rows: List[Dict[str, Any]], expected_rows: List[Dict[str, Any]],
+                 monthly_drift: List[Dict[str, Any]], project_drift: List[Dict[str, Any]],
+                 contractor_drift: List[Dict[str, Any]]) -> Dict[str, Any]:
+    stored = stored_rows[0] if stored_rows else {}
+    expected = expected_rows[0]
+    totals_drift = {
+        key: {'stored': stored.get(key), 'expected': expected[key]}
+        for key in TOTAL_KEYS if stored.get(key) != expected[key]
+    }
+    return {
+        'consistent': not totals_drift and not monthly_drift and not project_drift and not contractor_drift,
+        'totals_drift': totals_drift,
+        'monthly_drift': monthly_drift,
+        'project_drift': project_drift,
+        'contractor_drift': contractor_drift
+    }
+
+def reconcile(cur) -> Dict[str, Any]:
+    """Compare maintained aggregates, project rollups and contractor balances with a full recompute and report drifted values"""
+    results = []
+    for sql, args in RECONCILE_QUERIES:
+        cur.execute(sql, args)
+        results.append([dict(row) for row in cur.fetchall()])
+    return drift_report(*results)
+
+async def reconcile_async() -> Dict[str, Any]:
+    """reconcile() with the full recomputes running concurrently on separate connections"""
+    return drift_report(*await aio.fetch_all(*RECONCILE_QUERIES))
+
+def month_split(date_from: date, date_to: date, granularity: str) -> Tuple[date, date]:
+    """
+    Months fully inside [date_from, date_to] as [full_start, full_end); they are read from monthly buckets,
+    the partial edges from daily ones. Day and week granularity cannot use monthly buckets at all.
+    """
+    full_start = date_from.replace(day=1)
+    if full_start < date_from:
+        full_start = (full_start + timedelta(days=32)).replace(day=1)
+    full_end = (date_to + timedelta(days=1)).replace(day=1)
+    if granularity in ('day', 'week') or full_start >= full_end:
+        return date_from, date_from
+    return full_start, full_end
+
+def cash_flow(cur, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Income/expense series over an arbitrary range read from the cash-flow buckets; raises ValueError on bad input"""
+    granularity = params.get('granularity') or 'month'
+    group_by = params.get('group_by') or 'none'
+    if granularity not in CASH_FLOW_GRANULARITIES or group_by not in CASH_FLOW_GROUPS:
+        raise ValueError('Unsupported granularity or group_by')
+    today = date.today()
+    date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else today
+    date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else (today.replace(day=1) - timedelta(days=335)).replace(day=1)
+    if date_from > date_to:
+        raise ValueError('date_from is after date_to')
+    full_start, full_end = month_split(date_from, date_to, granularity)
+    
+    conditions: List[str] = []
+    args: Dict[str, Any] = {
+        'granularity': granularity,
+        'date_from': date_from,
+        'date_to': date_to,
+        'full_start': full_start,
+        'full_end': full_end
+    }
+    for column in CASH_FLOW_FILTERS:
+        if params.get(column):
+            conditions.append(f'{column} = %({column})s')
+            args[column] = int(params[column])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    
+    cur.execute(f"""
+        SELECT 
+            DATE_TRUNC(%(granularity)s, day)::date as bucket,
+            {CASH_FLOW_GROUPS[group_by]} as key,
+            COALESCE(SUM(total) FILTER (WHERE flow = 'i'), 0) as income,
+            COALESCE(SUM(total) FILTER (WHERE flow = 'o'), 0) as expense,
+            COALESCE(SUM(completed_total) FILTER (WHERE flow = 'i'), 0) as completed_income,
+            COALESCE(SUM(completed_total) FILTER (WHERE flow = 'o'), 0) as completed_expense,
+            SUM(payment_count) as payment_count
+        FROM (
+            SELECT month as day, project_id, contractor_id, company_id, flow, total, completed_total, payment_count
+            FROM cash_flow_monthly
+            WHERE month >= %(full_start)s AND month < %(full_end)s
+            UNION ALL
+            SELECT day, project_id, contractor_id, company_id, flow, total, completed_total, payment_count
+            FROM cash_flow_daily
+            WHERE (day >= %(date_from)s AND day < %(full_start)s) OR (day >= %(full_end)s AND day <= %(date_to)s)
+            UNION ALL
+            SELECT d.day, d.project_id, d.contractor_id, COALESCE(p.company_id, 0), d.flow, d.total, d.completed_total, d.payment_count
+            FROM cash_flow_deltas d
+            LEFT JOIN projects p ON p.id = d.project_id
+            WHERE d.day >= %(date_from)s AND d.day <= %(date_to)s
+        ) buckets
+        {where}
+        GROUP BY 1, 2
+        HAVING SUM(payment_count) <> 0
+        ORDER BY 1, 2
+    """, args)
+    
+    return {
+        'granularity': granularity,
+        'group_by': group_by,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'series': [dict(row) for row in cur.fetchall()]
+    }
+
+def authorized(event: Dict[str, Any]) -> bool:
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == ADMIN_HEADER.lower()), None)
+    return bool(ADMIN_TOKEN) and value is not None and hmac.compare_digest(value.encode(), ADMIN_TOKEN.encode())
+
+@db.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Get dashboard statistics for projects, finances, and contractors
-    Args: event - dict with httpMethod
+    Business: Get dashboard statistics from maintained aggregates; reconcile or rebuild them
+    Args: event - dict with httpMethod, queryStringParameters (action=reconcile|rebuild|cash-flow|export|forecast)
           context - object with request_id attribute
     Returns: HTTP response with dashboard stats
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return responses.build(event, 200, '', {
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-DB-Session, X-Admin-Token',
+            'Access-Control-Max-Age': '86400'
+        })
+    
+    params = event.get('queryStringParameters', {}) or {}
+    action = params.get('action', '')
+    
+    if action in ADMIN_ACTIONS and not authorized(event):
+        return responses.error(event, 403, 'Forbidden')
+    
+    if method == 'POST' and action == 'rebuild':
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute('SELECT rebuild_project_rollups()')
+        cur.execute('SELECT rebuild_contractor_balances()')
+        cur.execute('SELECT rebuild_dashboard_aggregates()')
+        cur.execute('SELECT rebuild_cash_flow()')
+        conn.commit()
+        result = reconcile(cur)
+        cur.close()
+        conn.close()
+        return responses.json_response(event, 200, result)
     
     if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return responses.error(event, 405, 'Method not allowed')
     
-    dsn = os.environ.get('DATABASE_URL')
+    if action == 'reconcile' and aio.ENABLED:
+        return responses.json_response(event, 200, aio.run(reconcile_async()))
     
-    conn = psycopg2.connect(dsn)
+    conn = db.connect_read(event)
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
-    cur.execute("""
-        SELECT 
-            COUNT(*) as total_projects,
-            COUNT(*) FILTER (WHERE status = 'in_progress') as active_projects,
-            COUNT(*) FILTER (WHERE status = 'completed') as completed_projects,
-            COALESCE(SUM(budget), 0) as total_budget,
-            COALESCE(SUM(actual_cost), 0) as total_spent,
-            COALESCE(SUM(budget - actual_cost), 0) as total_profit
-        FROM projects
-    """)
-    project_stats = cur.fetchone()
+    if action == 'cash-flow':
+        try:
+            result = cash_flow(cur, params)
+        except ValueError as e:
+            cur.close()
+            conn.close()
+            return responses.error(event, 400, str(e))
+        cur.close()
+        conn.close()
+        return responses.json_response(event, 200, result)
     
-    cur.execute("""
-        SELECT COUNT(*) as total_contractors
-        FROM contractors
-    """)
-    contractor_stats = cur.fetchone()
+    if action == 'forecast':
+        import forecast
+        try:
+            result = forecast.forecast(cur, params)
+        except ValueError as e:
+            cur.close()
+            conn.close()
+            return responses.error(event, 400, str(e))
+        cur.close()
+        conn.close()
+        return responses.json_response(event, 200, result)
     
-    cur.execute("""
-        SELECT 
-            COUNT(*) as total_estimates,
-            COUNT(*) FILTER (WHERE status = 'draft') as draft_estimates,
-            COUNT(*) FILTER (WHERE status = 'approved') as approved_estimates,
-            COALESCE(SUM(estimated_cost), 0) as total_estimated
-        FROM estimates
-    """)
-    estimate_stats = cur.fetchone()
-    
-    cur.execute("""
-        SELECT 
-            COALESCE(SUM(amount), 0) as total_payments,
-            COUNT(*) as payment_count,
-            COUNT(*) FILTER (WHERE status = 'pending') as pending_payments
-        FROM payments
-    """)
-    payment_stats = cur.fetchone()
-    
-    cur.execute("""
-        SELECT 
-            p.title,
-            p.budget,
-            p.actual_cost,
-            (p.budget - p.actual_cost) as profit,
-            p.status
-        FROM projects p
-        ORDER BY p.created_at DESC
-        LIMIT 5
-    """)
-    recent_projects = cur.fetchall()
+    if action == 'export':
+        import export
+        try:
+            body, headers = export.export(conn, params, responses.accepted_encoding(event))
+        except ValueError as e:
+            cur.close()
+            conn.close()
+            return responses.error(event, 400, str(e))
+        cur.close()
+        conn.close()
+        return {
+            'statusCode': 200,
+            'headers': {**headers, 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': True,
+            'body': body
+        }
     
-    cur.execute("""
-        SELECT 
-            DATE_TRUNC('month', payment_date) as month,
-            SUM(amount) as total
-        FROM payments
-        WHERE payment_date >= CURRENT_DATE - INTERVAL '6 months'
-        GROUP BY DATE_TRUNC('month', payment_date)
-        ORDER BY month
-    """)
-    monthly_payments = cur.fetchall()
+    if action == 'reconcile':
+        result = reconcile(cur)
+        cur.close()
+        conn.close()
+        return responses.json_response(event, 200, result)
     
+    cur.execute(DASHBOARD_SQL)
+    body = cur.fetchone()['dashboard']
     cur.close()
     conn.close()
     
-    stats = {
-        'projects': dict(project_stats),
-        'contractors': dict(contractor_stats),
-        'estimates': dict(estimate_stats),
-        'payments': dict(payment_stats),
-        'recent_projects': [dict(row) for row in recent_projects],
-        'monthly_payments': [{'month': row['month'].isoformat() if row['month'] else None, 'total': float(row['total'])} for row in monthly_payments]
-    }
-    
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'isBase64Encoded': False,
-        'body': json.dumps(stats, default=str)
-    }
+    return responses.build(event, 200, body)
@@ -0,0 +1,648 @@
+'''
+Database access shared by the backend functions.
+Every function directory is deployed on its own, so each one carries an identical copy of this module.
+'''
+import base64
+import contextvars
+import functools
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+import psycopg2
+import psycopg2.extensions
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+# Connections checked out at once per pool (per DSN); acquire() waits up to the timeout for one to come back
+POOL_MAX_OPEN = int(os.environ.get('DB_POOL_MAX_OPEN', '10'))
+POOL_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT_SECONDS', '10'))
+POOL_MAX_IDLE_SECONDS = float(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', '300'))
+POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+CONNECT_RETRIES = int(os.environ.get('DB_CONNECT_RETRIES', '2'))
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+TRACE_LOG = os.environ.get('DB_TRACE_LOG', 'slow')
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', '200'))
+SLOW_QUERY_EXPLAIN = os.environ.get('DB_SLOW_QUERY_EXPLAIN', '1') == '1'
+SERVER_TIMING = os.environ.get('DB_SERVER_TIMING', '0') == '1'
+TRACE_SQL_CHARS = 300
+TRACE_MAX_STATEMENTS = 200
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'EXECUTE')
+READ_URLS = [url.strip() for url in os.environ.get('DATABASE_READ_URLS', os.environ.get('DATABASE_READ_URL', '')).split(',')
+             if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('DB_REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_CHECK_SECONDS = float(os.environ.get('DB_REPLICA_CHECK_SECONDS', '2'))
+# Tokens only help when reads can go to a replica; without one they would cost every commit a round trip
+SESSION_TOKENS = os.environ.get('DB_SESSION_TOKENS', '1' if READ_URLS else '0') == '1'
+SESSION_HEADER = 'X-DB-Session'
+
+
+class RequestTrace:
+    """Statements, round trips and connection-acquire time of one handler invocation"""
+
+    def __init__(self, request_id: Optional[str]):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.acquire_ms = 0.0
+        self.round_trips = 0
+        self.statements: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.slow: List[Dict[str, Any]] = []
+        self.node = 'primary'
+        self.session: Optional[str] = None
+        self.connections: List['PooledConnection'] = []
+
+    def _record(self, record: Dict[str, Any], trips: int, ms: float) -> None:
+        if len(self.statements) < TRACE_MAX_STATEMENTS:
+            self.statements.append(record)
+        else:
+            self.dropped += 1
+        self.round_trips += trips
+        self.db_ms += ms
+
+    def statement(self, cur: Any, query: Any, args: Any, ms: float, trips: int = 1, error: bool = False) -> None:
+        sql = ' '.join((query.decode() if isinstance(query, bytes) else str(query)).split())
+        record: Dict[str, Any] = {'sql': sql[:TRACE_SQL_CHARS], 'ms': round(ms, 3), 'rows': cur.rowcount}
+        if error:
+            record['error'] = True
+        self._record(record, trips, ms)
+        if ms >= SLOW_QUERY_MS and not error:
+            slow = dict(record)
+            if SLOW_QUERY_EXPLAIN and sql.upper().startswith(EXPLAINABLE):
+                slow['plan'] = explain(cur, query, args)
+            self.slow.append(slow)
+
+    def fetched(self, rows: int, trips: int, close_ms: float, open_ms: float) -> None:
+        """
+        Server-side cursor traffic (FETCH batches and CLOSE), reported when the cursor closes.
+        FETCHes interleave with row processing, so only the CLOSE counts towards db_ms;
+        open_ms is the whole DECLARE-to-CLOSE span.
+        """
+        self._record({'sql': 'FETCH/CLOSE', 'ms': round(close_ms, 3), 'open_ms': round(open_ms, 3), 'rows': rows},
+                     trips, close_ms)
+
+    def add_statement(self, sql: str, ms: float, rows: int) -> None:
+        """Statement run outside execute() (COPY, the asyncio read path); no EXPLAIN capture there"""
+        sql = ' '.join(sql.split())
+        record = {'sql': sql[:TRACE_SQL_CHARS], 'ms': round(ms, 3), 'rows': rows}
+        self._record(record, 1, ms)
+        if ms >= SLOW_QUERY_MS:
+            self.slow.append(dict(record))
+
+    def transaction(self, command: str, ms: float) -> None:
+        self._record({'sql': command, 'ms': round(ms, 3), 'rows': -1}, 1, ms)
+
+    def acquired(self, ms: float) -> None:
+        self.acquire_ms += ms
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'event': 'db_trace',
+            'request_id': self.request_id,
+            'total_ms': round(self.total_ms, 3),
+            'db_ms': round(self.db_ms, 3),
+            'acquire_ms': round(self.acquire_ms, 3),
+            'node': self.node,
+            'round_trips': self.round_trips,
+            'statements': self.statements,
+            'statements_dropped': self.dropped,
+            'slow': self.slow,
+        }
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.db_ms:.1f};desc="{self.round_trips} round trips", '
+                f'db-acquire;dur={self.acquire_ms:.1f}, handler;dur={self.total_ms:.1f}')
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('db_trace', default=None)
+trace_listeners: List[Callable[[RequestTrace], None]] = []
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def explain(cur: Any, query: Any, args: Any) -> Optional[str]:
+    """
+    EXPLAIN (without ANALYZE, so nothing runs twice) a statement that was just slow.
+    Uses a plain cursor so the lookup is not traced itself, inside a savepoint so
+    a failing EXPLAIN cannot abort the caller's transaction.
+    """
+    conn = cur.connection
+    in_transaction = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    plain = psycopg2.extensions.cursor(conn)
+    try:
+        sql = plain.mogrify(query, args).decode()
+        if in_transaction:
+            plain.execute('SAVEPOINT db_explain')
+        try:
+            plain.execute('EXPLAIN ' + sql)
+            plan = '\n'.join(row[0] for row in plain.fetchall())
+        except psycopg2.Error as e:
+            plan = f'EXPLAIN failed: {e}'.strip()
+            if in_transaction:
+                plain.execute('ROLLBACK TO SAVEPOINT db_explain')
+        if in_transaction:
+            plain.execute('RELEASE SAVEPOINT db_explain')
+        return plan
+    except psycopg2.Error as e:
+        return f'EXPLAIN failed: {e}'.strip()
+    finally:
+        plain.close()
+
+
+class TracedCursor:
+    """Mixed into every cursor class handed out by PooledConnection; records into the active RequestTrace"""
+
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        trace = _current_trace.get()
+        if trace is None:
+            return super().execute(query, vars)
+        self._opened_at = started = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            trace.statement(self, query, vars, (time.perf_counter() - started) * 1000, error=True)
+            raise
+        trace.statement(self, query, vars, (time.perf_counter() - started) * 1000)
+        return result
+
+    def executemany(self, query: Any, vars_list: Any) -> Any:
+        trace = _current_trace.get()
+        if trace is None:
+            return super().executemany(query, vars_list)
+        vars_list = list(vars_list)
+        started = time.perf_counter()
+        result = super().executemany(query, vars_list)
+        trace.statement(self, query, None, (time.perf_counter() - started) * 1000, trips=len(vars_list))
+        return result
+
+    def copy_expert(self, sql: Any, file: Any, size: int = 8192) -> Any:
+        trace = _current_trace.get()
+        if trace is None:
+            return super().copy_expert(sql, file, size)
+        started = time.perf_counter()
+        result = super().copy_expert(sql, file, size)
+        trace.add_statement(sql.decode() if isinstance(sql, bytes) else sql, (time.perf_counter() - started) * 1000,
+                            self.rowcount)
+        return result
+
+    def close(self) -> None:
+        trace = _current_trace.get()
+        opened_at = getattr(self, '_opened_at', None)
+        if trace is None or opened_at is None or not self.name or self.closed or self.connection.closed:
+            return super().close()
+        started = time.perf_counter()
+        super().close()
+        finished = time.perf_counter()
+        # One FETCH per itersize rows (the last one comes back short) plus the CLOSE
+        trace.fetched(self.rownumber, self.rownumber // self.itersize + 2,
+                      (finished - started) * 1000, (finished - opened_at) * 1000)
+
+
+_traced_cursor_classes: Dict[type, type] = {}
+
+
+def _traced_cursor_class(factory: type) -> type:
+    traced = _traced_cursor_classes.get(factory)
+    if traced is None:
+        traced = type('Traced' + factory.__name__, (TracedCursor, factory), {})
+        _traced_cursor_classes[factory] = traced
+    return traced
+
+
+def traced(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    """
+    Wrap a cloud-function handler so its database work is traced under context.request_id.
+    DB_TRACE_LOG=all logs every request as one JSON line, =slow (default) only requests with
+    statements over DB_SLOW_QUERY_MS, =off never; DB_SERVER_TIMING=1 adds a Server-Timing header.
+    """
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        trace = RequestTrace(getattr(context, 'request_id', None))
+        token = _current_trace.set(trace)
+        response = None
+        try:
+            response = handler(event, context)
+            return response
+        finally:
+            # Connections the handler left open (it raised before conn.close()) go back to the pool
+            for conn in trace.connections:
+                if conn.owner is trace:
+                    conn.close()
+            _current_trace.reset(token)
+            trace.total_ms = (time.perf_counter() - trace.started) * 1000
+            if TRACE_LOG == 'all' or (TRACE_LOG == 'slow' and trace.slow):
+                summary = trace.summary()
+                summary['function'] = getattr(context, 'function_name', None)
+                summary['status'] = response.get('statusCode') if response else None
+                print(json.dumps(summary, ensure_ascii=False, default=str), flush=True)
+            if SERVER_TIMING and response and trace.round_trips:
+                headers = response.setdefault('headers', {})
+                headers['Server-Timing'] = trace.server_timing()
+                headers['Timing-Allow-Origin'] = '*'
+            if trace.session and response:
+                headers = response.setdefault('headers', {})
+                headers[SESSION_HEADER] = trace.session
+                exposed = headers.get('Access-Control-Expose-Headers')
+                headers['Access-Control-Expose-Headers'] = f'{exposed}, {SESSION_HEADER}' if exposed else SESSION_HEADER
+            for listener in trace_listeners:
+                listener(trace)
+    return wrapper
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose close() hands it back to the pool instead of closing the socket"""
+
+    pool: Optional['ConnectionPool'] = None
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.prepared: Set[str] = set()
+        self.checked_out = False
+        # RequestTrace of the request holding the connection, so its wrapper can return it
+        self.owner: Optional[RequestTrace] = None
+
+    def close(self) -> None:
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def close_socket(self) -> None:
+        super().close()
+
+    def cursor(self, *args: Any, **kwargs: Any) -> Any:
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _traced_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self) -> None:
+        trace = _current_trace.get()
+        if trace is None:
+            return super().commit()
+        started = time.perf_counter()
+        super().commit()
+        trace.transaction('COMMIT', (time.perf_counter() - started) * 1000)
+        if SESSION_TOKENS:
+            trace.session = self.wal_position()
+
+    def wal_position(self) -> Optional[str]:
+        """
+        The primary's WAL position right after a commit: the X-DB-Session token a client sends back so its
+        next reads only go to replicas that have replayed this far. Runs in autocommit, so no transaction is left open.
+        """
+        self.autocommit = True
+        try:
+            with self.cursor() as cur:
+                cur.execute('SELECT pg_current_wal_lsn()::text')
+                return cur.fetchone()[0]
+        except psycopg2.Error:
+            return None
+        finally:
+            self.autocommit = False
+
+    def rollback(self) -> None:
+        trace = _current_trace.get()
+        if trace is None:
+            return super().rollback()
+        started = time.perf_counter()
+        super().rollback()
+        trace.transaction('ROLLBACK', (time.perf_counter() - started) * 1000)
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Every connection of the pool stayed checked out for DB_POOL_ACQUIRE_TIMEOUT_SECONDS"""
+
+
+class ConnectionPool:
+    """
+    Keeps connections alive across warm invocations of the same container.
+    At most max_open connections are checked out at a time (threads of the router share one pool);
+    max_size of them are kept idle between requests.
+    """
+
+    def __init__(self, dsn: str, max_size: int = POOL_MAX_SIZE,
+                 max_idle: float = POOL_MAX_IDLE_SECONDS,
+                 healthcheck_after: float = POOL_HEALTHCHECK_SECONDS,
+                 max_open: int = POOL_MAX_OPEN,
+                 acquire_timeout: float = POOL_ACQUIRE_TIMEOUT_SECONDS):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.max_open = max_open
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_open)
+        self.max_idle = max_idle
+        self.healthcheck_after = healthcheck_after
+        self._idle: List[Tuple[PooledConnection, float]] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+        self.in_use = 0
+
+    def _connect(self) -> PooledConnection:
+        last_error: Optional[Exception] = None
+        for attempt in range(CONNECT_RETRIES + 1):
+            try:
+                conn = psycopg2.connect(self.dsn, connection_factory=PooledConnection)
+                conn.pool = self
+                self.opened += 1
+                return conn
+            except psycopg2.OperationalError as e:
+                last_error = e
+                time.sleep(0.05 * (attempt + 1))
+        raise last_error
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolTimeout(f'all {self.max_open} connections stayed in use for {self.acquire_timeout:g}s')
+        try:
+            conn = self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+        conn.checked_out = True
+        conn.owner = _current_trace.get()
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def _checkout(self) -> PooledConnection:
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, released_at = self._idle.pop()
+            idle_for = now - released_at
+            if conn.closed or idle_for > self.max_idle:
+                self._discard(conn)
+                continue
+            if idle_for > self.healthcheck_after and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            self.reused += 1
+            return conn
+        return self._connect()
+
+    def release(self, conn: PooledConnection) -> None:
+        """Return a checked-out connection; closing it a second time is a no-op"""
+        if not conn.checked_out:
+            return
+        conn.checked_out = False
+        conn.owner = None
+        with self._lock:
+            self.in_use -= 1
+        try:
+            self._keep(conn)
+        finally:
+            self._slots.release()
+
+    def _keep(self, conn: PooledConnection) -> None:
+        if conn.closed:
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._discard(conn)
+
+    def _discard(self, conn: PooledConnection) -> None:
+        try:
+            conn.close_socket()
+        except psycopg2.Error:
+            pass
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'idle': len(self._idle), 'opened': self.opened, 'reused': self.reused,
+                'in_use': self.in_use}
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: Optional[str] = None) -> ConnectionPool:
+    """Return the module-level pool for dsn (DATABASE_URL by default)"""
+    dsn = dsn or os.environ.get('DATABASE_URL')
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(dsn, ConnectionPool(dsn))
+    return pool
+
+
+def connect(dsn: Optional[str] = None) -> PooledConnection:
+    """Drop-in replacement for psycopg2.connect(DATABASE_URL); conn.close() returns the connection to the pool"""
+    trace = _current_trace.get()
+    if trace is None:
+        return get_pool(dsn).acquire()
+    started = time.perf_counter()
+    conn = get_pool(dsn).acquire()
+    trace.acquired((time.perf_counter() - started) * 1000)
+    trace.connections.append(conn)
+    return conn
+
+
+# Lag in seconds (0 once everything received is replayed) and the replayed WAL position.
+# A server that is not in recovery (a promoted replica, or a plain second instance) counts as current.
+REPLICA_STATUS_SQL = """
+    SELECT
+        CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END as lag,
+        (CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END)::text as lsn
+"""
+
+# dsn -> (checked at, lag seconds, replayed position); an unreachable replica is stored with infinite lag
+_replica_status: Dict[str, Tuple[float, float, int]] = {}
+_read_turn = itertools.count()
+
+
+def lsn_value(lsn: str) -> int:
+    """'16/B374D848' -> comparable integer; raises ValueError on anything else"""
+    high, low = lsn.strip().split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def session_token(event: Dict[str, Any]) -> Optional[int]:
+    """The request's X-DB-Session token as a WAL position, None when absent or malformed"""
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == SESSION_HEADER.lower()), None)
+    if not value:
+        return None
+    try:
+        return lsn_value(value)
+    except ValueError:
+        return None
+
+
+def _fresh_replica(dsn: str, token: Optional[int]) -> Optional[PooledConnection]:
+    """
+    A connection to the replica at dsn if it is within REPLICA_MAX_LAG_SECONDS and has replayed token, else None.
+    The status is re-read at most every REPLICA_CHECK_SECONDS, or sooner when the token is ahead of it.
+    """
+    now = time.monotonic()
+    status = _replica_status.get(dsn)
+    recent = status is not None and now - status[0] < REPLICA_CHECK_SECONDS
+    if recent and status[1] > REPLICA_MAX_LAG_SECONDS:
+        return None
+    try:
+        conn = connect(dsn)
+    except psycopg2.OperationalError:
+        _replica_status[dsn] = (now, float('inf'), 0)
+        return None
+    if recent and (token is None or status[2] >= token):
+        return conn
+    try:
+        with conn.cursor() as cur:
+            cur.execute(REPLICA_STATUS_SQL)
+            lag, lsn = cur.fetchone()
+    except psycopg2.Error:
+        conn.close()
+        _replica_status[dsn] = (now, float('inf'), 0)
+        return None
+    status = _replica_status[dsn] = (now, float(lag), lsn_value(lsn))
+    if status[1] > REPLICA_MAX_LAG_SECONDS or (token is not None and status[2] < token):
+        conn.close()
+        return None
+    return conn
+
+
+def connect_read(event: Optional[Dict[str, Any]] = None) -> PooledConnection:
+    """
+    Connection for a read-only request. Replicas from DATABASE_READ_URLS (comma-separated) or DATABASE_READ_URL
+    take turns; one is skipped while it is unreachable, lags more than DB_REPLICA_MAX_LAG_SECONDS or has not yet
+    replayed the event's X-DB-Session token (read-your-writes after a POST). Falls back to the primary.
+    """
+    if READ_URLS:
+        token = session_token(event) if event else None
+        turn = next(_read_turn)
+        for offset in range(len(READ_URLS)):
+            index = (turn + offset) % len(READ_URLS)
+            conn = _fresh_replica(READ_URLS[index], token)
+            if conn is not None:
+                trace = _current_trace.get()
+                if trace is not None:
+                    trace.node = f'replica{index}'
+                return conn
+    return connect()
+
+
+def replica_status() -> List[Dict[str, Any]]:
+    """Last known lag and replayed position of every configured replica, for benchmarks and debugging"""
+    result = []
+    for index, dsn in enumerate(READ_URLS):
+        status = _replica_status.get(dsn)
+        result.append({'node': f'replica{index}', 'checked': status is not None,
+                       'lag': status[1] if status else None, 'lsn': status[2] if status else None})
+    return result
+
+
+class PreparedStatement:
+    """
+    Named server-side prepared statement.
+    PREPARE runs once per pooled connection and survives across warm invocations;
+    later calls only send EXECUTE with the parameters, skipping parse and plan.
+    """
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        param_count = max((int(n) for n in re.findall(r'\$(\d+)', sql)), default=0)
+        placeholders = ', '.join(['%s'] * param_count)
+        self.execute_sql = f'EXECUTE {name} ({placeholders})' if param_count else f'EXECUTE {name}'
+
+    def execute(self, cur, args: Sequence[Any] = ()) -> None:
+        conn = cur.connection
+        if self.name not in conn.prepared:
+            cur.execute(f'PREPARE {self.name} AS {self.sql}')
+            conn.prepared.add(self.name)
+        cur.execute(self.execute_sql, args)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of the last row on a page"""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def is_paginated(params: Dict[str, Any]) -> bool:
+    return bool(params.get('limit') or params.get('cursor'))
+
+
+def listing_filters(params: Dict[str, Any], alias: str, columns: Tuple[str, ...]) -> Tuple[List[str], List[Any]]:
+    """
+    Translate query parameters into SQL conditions for a listing.
+    columns lists the equality filters the table supports (status, company_id);
+    date_from/date_to always filter on created_at, cursor adds the keyset condition.
+    Raises ValueError on malformed input.
+    """
+    conditions: List[str] = []
+    args: List[Any] = []
+    for column in columns:
+        value = params.get(column)
+        if not value:
+            continue
+        if column.endswith('_id'):
+            value = int(value)
+        conditions.append(f'{alias}.{column} = %s')
+        args.append(value)
+    if params.get('date_from'):
+        conditions.append(f'{alias}.created_at >= %s')
+        args.append(date.fromisoformat(params['date_from']))
+    if params.get('date_to'):
+        conditions.append(f'{alias}.created_at < %s')
+        args.append(date.fromisoformat(params['date_to']) + timedelta(days=1))
+    if params.get('cursor'):
+        conditions.append(f'({alias}.created_at, {alias}.id) < (%s, %s)')
+        args.extend(decode_cursor(params['cursor']))
+    return conditions, args
+
+
+def page_limit(params: Dict[str, Any]) -> int:
+    limit = int(params.get('limit') or PAGE_SIZE_DEFAULT)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, PAGE_SIZE_MAX)
+
+
+def page_json(items_json: str, last: Optional[Dict[str, Any]]) -> str:
+    """Wrap an encoded page of rows; last is the final row on the page when another page exists"""
+    next_cursor = encode_cursor(last['created_at'], last['id']) if last else None
+    return '{"items":' + items_json + ',"next_cursor":' + json.dumps(next_cursor) + '}'
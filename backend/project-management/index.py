@@ -1,21 +1,265 @@
 import json
 import os
+from datetime import date
+import db
+import responses
+import reference_cache
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import Dict, Any
+from typing import Dict, Any, Callable, List, Optional, Tuple
 
-def escape_sql(value):
-    """Escape value for SQL query (simple query protocol)"""
-    if value is None:
-        return 'NULL'
-    if isinstance(value, (int, float)):
-        return str(value)
-    # Escape single quotes by doubling them
-    return f"'{str(value).replace(chr(39), chr(39)+chr(39))}'"
+BULK_CHUNK_SIZE = 500
+PAYMENT_STATUS_BATCH_MAX = 5000
 
+# target status -> statuses a payment may move from
+PAYMENT_TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    'completed': ('pending',),
+    'cancelled': ('pending',),
+    'pending': ('cancelled',),
+}
+
+INSERT_PROJECTS = db.PreparedStatement('insert_projects', """
+    INSERT INTO projects (company_id, title, description, budget, status, start_date)
+    SELECT company_id, title, description, budget, status, start_date::date
+    FROM unnest($1::int[], $2::text[], $3::text[], $4::numeric[], $5::text[], $6::text[])
+        WITH ORDINALITY AS r(company_id, title, description, budget, status, start_date, ord)
+    ORDER BY ord
+    RETURNING id
+""")
+INSERT_PROJECT_ITEMS = db.PreparedStatement('insert_project_items', """
+    INSERT INTO project_items (project_id, item_id, quantity, unit_price)
+    SELECT * FROM unnest($1::int[], $2::int[], $3::numeric[], $4::numeric[])
+""")
+INSERT_PROJECT_CONTRACTORS = db.PreparedStatement('insert_project_contractors', """
+    INSERT INTO project_contractors (project_id, contractor_id, role, hourly_rate)
+    SELECT * FROM unnest($1::int[], $2::int[], $3::text[], $4::numeric[])
+""")
+INSERT_ESTIMATES = db.PreparedStatement('insert_estimates', """
+    INSERT INTO estimates (company_id, title, description, status, estimated_hours, estimated_cost)
+    SELECT company_id, title, description, status, estimated_hours, estimated_cost
+    FROM unnest($1::int[], $2::text[], $3::text[], $4::text[], $5::numeric[], $6::numeric[])
+        WITH ORDINALITY AS r(company_id, title, description, status, estimated_hours, estimated_cost, ord)
+    ORDER BY ord
+    RETURNING id
+""")
+INSERT_ESTIMATE_ITEMS = db.PreparedStatement('insert_estimate_items', """
+    INSERT INTO estimate_items (estimate_id, item_id, quantity, unit_price)
+    SELECT * FROM unnest($1::int[], $2::int[], $3::numeric[], $4::numeric[])
+""")
+INSERT_PAYMENT = db.PreparedStatement('insert_payment', """
+    INSERT INTO payments (project_id, contractor_id, payment_type, amount, description, payment_date, status)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+    RETURNING id
+""")
+# One set-based UPDATE for any number of (id, version) pairs. The final SELECT reads payments from the
+# statement's snapshot, i.e. the pre-update state, which is what a conflict is reported against;
+# a row that matched in the snapshot but was not updated lost a race with a concurrent writer.
+# Project rollups, contractor balances, dashboard counters and cash-flow deltas follow through their triggers.
+UPDATE_PAYMENT_STATUS = db.PreparedStatement('update_payment_status', """
+    WITH requested AS (
+        SELECT * FROM unnest($1::int[], $2::int[]) AS r(id, version)
+    ), updated AS (
+        UPDATE payments p SET status = $3
+        FROM requested r
+        WHERE p.id = r.id AND p.version = r.version AND p.status = ANY($4::text[])
+        RETURNING p.id, p.status, p.version, p.updated_at
+    )
+    SELECT 
+        r.id,
+        u.id IS NOT NULL as updated,
+        COALESCE(u.status, cur.status) as status,
+        COALESCE(u.version, cur.version) as version,
+        u.updated_at,
+        CASE
+            WHEN u.id IS NOT NULL THEN NULL
+            WHEN cur.id IS NULL THEN 'not_found'
+            WHEN cur.version <> r.version OR cur.status = ANY($4::text[]) THEN 'version_conflict'
+            ELSE 'invalid_transition'
+        END as conflict
+    FROM requested r
+    LEFT JOIN updated u ON u.id = r.id
+    LEFT JOIN payments cur ON cur.id = r.id
+    ORDER BY r.id
+""")
+INSERT_ITEM = db.PreparedStatement('insert_item', """
+    INSERT INTO items (name, description, type, unit, default_price)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id
+""")
+
+# Month this container last topped up the payment partitions for (ensure_future_payment_partitions, V0016)
+_partitions_month = None
+
+def ensure_payment_partitions(cur) -> Optional[date]:
+    """
+    On the first payment write of a month, create any missing future monthly partitions of payments.
+    Returns the month for partitions_committed() once the transaction commits, None if already done this month.
+    The top-up runs in a savepoint: if it fails, the payment is still written and the next write retries it.
+    """
+    month = date.today().replace(day=1)
+    if _partitions_month == month:
+        return None
+    cur.execute('SAVEPOINT partitions_top_up')
+    try:
+        cur.execute('SELECT ensure_future_payment_partitions()')
+    except psycopg2.Error:
+        cur.execute('ROLLBACK TO SAVEPOINT partitions_top_up')
+        return None
+    cur.execute('RELEASE SAVEPOINT partitions_top_up')
+    return month
+
+def partitions_committed(month: Optional[date]) -> None:
+    """Record the top-up only after its commit, so a rolled-back one is retried on the next payment write"""
+    global _partitions_month
+    if month is not None:
+        _partitions_month = month
+
+def columns(rows: List[tuple], width: int) -> List[list]:
+    """Transpose row tuples into per-column lists for the unnest() array parameters"""
+    if not rows:
+        return [[] for _ in range(width)]
+    return [list(column) for column in zip(*rows)]
+
+def parse_items(data: Dict[str, Any]) -> List[Tuple[int, float, float]]:
+    return [(int(item['item_id']), float(item['quantity']), float(item['unit_price'])) for item in data.get('items') or []]
+
+def parse_project(data: Dict[str, Any]) -> Tuple[tuple, list, list]:
+    """Validate a create-project body into (project values, item rows, contractor rows)"""
+    project = (
+        int(data['company_id']),
+        str(data['title']),
+        data.get('description', ''),
+        float(data.get('budget', 0)),
+        data.get('status', 'planning'),
+        data.get('start_date') or None
+    )
+    contractors = [
+        (int(contractor['contractor_id']), str(contractor['role']), float(contractor['hourly_rate']))
+        for contractor in data.get('contractors') or []
+    ]
+    return project, parse_items(data), contractors
+
+def parse_estimate(data: Dict[str, Any]) -> Tuple[tuple, list]:
+    """Validate a create-estimate body into (estimate values, item rows); estimated_cost defaults to the items total"""
+    items = parse_items(data)
+    estimated_hours = data.get('estimated_hours', '0')
+    estimated_cost = data.get('estimated_cost')
+    estimate = (
+        int(data['company_id']),
+        str(data['title']),
+        data.get('description', ''),
+        data.get('status', 'draft'),
+        float(estimated_hours) if estimated_hours else 0,
+        float(estimated_cost) if estimated_cost else sum(quantity * unit_price for _, quantity, unit_price in items)
+    )
+    return estimate, items
+
+def insert_projects(cur, parsed: List[Tuple[tuple, list, list]]) -> List[int]:
+    """Insert projects with their items and contractors using one array-parameter INSERT per table"""
+    INSERT_PROJECTS.execute(cur, columns([project for project, _, _ in parsed], 6))
+    ids = [row['id'] for row in cur.fetchall()]
+    items = [(project_id,) + item for project_id, (_, project_items, _) in zip(ids, parsed) for item in project_items]
+    if items:
+        INSERT_PROJECT_ITEMS.execute(cur, columns(items, 4))
+    contractors = [(project_id,) + contractor for project_id, (_, _, project_contractors) in zip(ids, parsed) for contractor in project_contractors]
+    if contractors:
+        INSERT_PROJECT_CONTRACTORS.execute(cur, columns(contractors, 4))
+    return ids
+
+def insert_estimates(cur, parsed: List[Tuple[tuple, list]]) -> List[int]:
+    """Insert estimates with their items using one array-parameter INSERT per table"""
+    INSERT_ESTIMATES.execute(cur, columns([estimate for estimate, _ in parsed], 6))
+    ids = [row['id'] for row in cur.fetchall()]
+    items = [(estimate_id,) + item for estimate_id, (_, estimate_items) in zip(ids, parsed) for item in estimate_items]
+    if items:
+        INSERT_ESTIMATE_ITEMS.execute(cur, columns(items, 4))
+    return ids
+
+def parse_versions(rows: Any) -> List[Tuple[int, int]]:
+    """[{id, version}, ...] into unique (id, version) pairs; raises ValueError"""
+    if not isinstance(rows, list) or not rows:
+        raise ValueError('Expected a non-empty payments list of {id, version}')
+    if len(rows) > PAYMENT_STATUS_BATCH_MAX:
+        raise ValueError(f'At most {PAYMENT_STATUS_BATCH_MAX} payments per request')
+    try:
+        pairs = {int(row['id']): int(row['version']) for row in rows}
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid payment: {e!r}') from e
+    return list(pairs.items())
+
+def update_payment_status(cur, pairs: List[Tuple[int, int]], status: str) -> Dict[str, Any]:
+    """
+    Move payments to status in one statement inside the caller's transaction.
+    A payment whose version moved on, or whose current status cannot transition, is left alone and reported.
+    """
+    if status not in PAYMENT_TRANSITIONS:
+        raise ValueError(f"status must be one of {', '.join(PAYMENT_TRANSITIONS)}")
+    UPDATE_PAYMENT_STATUS.execute(cur, columns(pairs, 2) + [status, list(PAYMENT_TRANSITIONS[status])])
+    rows = [dict(row) for row in cur.fetchall()]
+    payments = [row for row in rows if row['updated']]
+    if payments:
+        cur.execute('SELECT refresh_cash_flow()')
+    return {
+        'updated': len(payments),
+        'payments': [{key: row[key] for key in ('id', 'status', 'version', 'updated_at')} for row in payments],
+        'conflicts': [
+            {key: row[key] for key in ('id', 'conflict', 'status', 'version')}
+            for row in rows if not row['updated']
+        ]
+    }
+
+BULK_IMPORTERS: Dict[str, Tuple[Callable, Callable]] = {
+    'projects': (parse_project, insert_projects),
+    'estimates': (parse_estimate, insert_estimates),
+}
+
+def bulk_import(cur, parse: Callable, insert: Callable, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Insert many rows in chunks inside the caller's transaction.
+    A failing chunk is rolled back to its savepoint and retried row by row, so one bad row
+    only costs its own insert and is reported by its index in the request.
+    """
+    errors = []
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, parse(row)))
+        except (KeyError, ValueError, TypeError) as e:
+            errors.append({'index': index, 'error': f'Invalid row: {e!r}'})
+    
+    ids: List[Any] = [None] * len(rows)
+    for start in range(0, len(valid), BULK_CHUNK_SIZE):
+        chunk = valid[start:start + BULK_CHUNK_SIZE]
+        cur.execute('SAVEPOINT bulk_chunk')
+        try:
+            for (index, _), new_id in zip(chunk, insert(cur, [parsed for _, parsed in chunk])):
+                ids[index] = new_id
+            cur.execute('RELEASE SAVEPOINT bulk_chunk')
+            continue
+        except psycopg2.Error:
+            cur.execute('ROLLBACK TO SAVEPOINT bulk_chunk')
+        for index, parsed in chunk:
+            cur.execute('SAVEPOINT bulk_row')
+            try:
+                ids[index] = insert(cur, [parsed])[0]
+                cur.execute('RELEASE SAVEPOINT bulk_row')
+            except psycopg2.Error as e:
+                cur.execute('ROLLBACK TO SAVEPOINT bulk_row')
+                errors.append({'index': index, 'error': (e.pgerror or str(e)).strip()})
+        cur.execute('RELEASE SAVEPOINT bulk_chunk')
+    
+    errors.sort(key=lambda error: error['index'])
+    return {
+        'inserted': sum(1 for new_id in ids if new_id is not None),
+        'failed': len(errors),
+        'ids': ids,
+        'errors': errors
+    }
+
+@db.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Unified API for project management (create projects, estimates, payments, get companies, items)
+    Business: Unified API for project management (create projects, estimates, payments, bulk import, payment status changes, get companies, items)
     Args: event - dict with httpMethod, queryStringParameters for action
           context - object with attributes: request_id, function_name
     Returns: HTTP response dict
@@ -23,25 +267,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+        return responses.build(event, 200, '', {
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, X-DB-Session',
+            'Access-Control-Max-Age': '86400'
+        })
     
     params = event.get('queryStringParameters', {}) or {}
     action = params.get('action', '')
     
+    if method == 'GET' and action in reference_cache.REFERENCE_QUERIES:
+        return reference_cache.response(event, action)
+    
+    dsn = os.environ.get('DATABASE_URL')
+    conn = db.connect(dsn)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    
     if method == 'GET':
         if action == 'debug':
             cur.execute('SELECT current_user, session_user')
@@ -49,170 +290,98 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             result = {'current_user': user_info[0], 'session_user': user_info[1], 'dsn': dsn}
             cur.close()
             conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps(result),
-                'isBase64Encoded': False
-            }
-        
-        if action == 'companies':
-            cur.execute('SELECT id, name, contact_person, email, phone FROM companies ORDER BY name')
-            result = [dict(row) for row in cur.fetchall()]
-        
-        elif action == 'items':
-            cur.execute('SELECT id, name, description, type, unit, COALESCE(default_price, 0) as default_price FROM items ORDER BY type, name')
-            rows = cur.fetchall()
-            result = []
-            for row in rows:
-                row_dict = dict(row)
-                row_dict['default_price'] = str(row_dict['default_price'])
-                result.append(row_dict)
-        
-        else:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid action'}),
-                'isBase64Encoded': False
-            }
+            return responses.json_response(event, 200, result)
         
         cur.close()
         conn.close()
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps(result),
-            'isBase64Encoded': False
-        }
+        return responses.error(event, 400, 'Invalid action')
     
     elif method == 'POST':
         body_data = json.loads(event.get('body', '{}'))
         
         if action == 'create-project':
-            company_id = int(body_data['company_id'])
-            title = escape_sql(body_data['title'])
-            description = escape_sql(body_data.get('description', ''))
-            budget = float(body_data.get('budget', 0))
-            status = escape_sql(body_data.get('status', 'planning'))
-            start_date = escape_sql(body_data.get('start_date')) if body_data.get('start_date') else 'NULL'
-            
-            cur.execute(
-                f'''INSERT INTO projects (company_id, title, description, budget, status, start_date)
-                   VALUES ({company_id}, {title}, {description}, {budget}, {status}, {start_date}) RETURNING id'''
-            )
-            project_id = cur.fetchone()['id']
-            
-            if body_data.get('items'):
-                for item in body_data['items']:
-                    item_id = int(item['item_id'])
-                    quantity = float(item['quantity'])
-                    unit_price = float(item['unit_price'])
-                    cur.execute(
-                        f'''INSERT INTO project_items (project_id, item_id, quantity, unit_price)
-                           VALUES ({project_id}, {item_id}, {quantity}, {unit_price})'''
-                    )
-            
-            if body_data.get('contractors'):
-                for contractor in body_data['contractors']:
-                    contractor_id = int(contractor['contractor_id'])
-                    role = escape_sql(contractor['role'])
-                    hourly_rate = float(contractor['hourly_rate'])
-                    cur.execute(
-                        f'''INSERT INTO project_contractors (project_id, contractor_id, role, hourly_rate)
-                           VALUES ({project_id}, {contractor_id}, {role}, {hourly_rate})'''
-                    )
-            
+            project_id = insert_projects(cur, [parse_project(body_data)])[0]
             conn.commit()
             result = {'id': project_id, 'message': 'Project created successfully'}
         
         elif action == 'create-estimate':
-            company_id = int(body_data['company_id'])
-            title = escape_sql(body_data['title'])
-            description = escape_sql(body_data.get('description', ''))
-            status = escape_sql(body_data.get('status', 'draft'))
-            estimated_hours_str = body_data.get('estimated_hours', '0')
-            estimated_hours = float(estimated_hours_str) if estimated_hours_str else 0
-            
-            cur.execute(
-                f'''INSERT INTO estimates (company_id, title, description, status, estimated_hours)
-                   VALUES ({company_id}, {title}, {description}, {status}, {estimated_hours}) RETURNING id'''
-            )
-            estimate_id = cur.fetchone()['id']
-            
-            if body_data.get('items'):
-                for item in body_data['items']:
-                    item_id = int(item['item_id'])
-                    quantity = float(item['quantity'])
-                    unit_price = float(item['unit_price'])
-                    cur.execute(
-                        f'''INSERT INTO estimate_items (estimate_id, item_id, quantity, unit_price)
-                           VALUES ({estimate_id}, {item_id}, {quantity}, {unit_price})'''
-                    )
-            
+            estimate_id = insert_estimates(cur, [parse_estimate(body_data)])[0]
             conn.commit()
             result = {'id': estimate_id, 'message': 'Estimate created successfully'}
         
+        elif action == 'bulk-import':
+            importer = BULK_IMPORTERS.get(body_data.get('type', ''))
+            rows = body_data.get('rows')
+            if not importer or not isinstance(rows, list):
+                cur.close()
+                conn.close()
+                return responses.error(event, 400, 'Expected type (projects|estimates) and rows list')
+            result = bulk_import(cur, importer[0], importer[1], rows)
+            conn.commit()
+        
         elif action == 'create-payment':
-            project_id = int(body_data['project_id'])
-            contractor_id = int(body_data['contractor_id']) if body_data.get('contractor_id') else 'NULL'
-            payment_type = escape_sql(body_data['type'])
-            amount = float(body_data['amount'])
-            description = escape_sql(body_data.get('description', ''))
-            payment_date = escape_sql(body_data['payment_date'])
-            status = escape_sql(body_data.get('status', 'pending'))
-            
-            cur.execute(
-                f'''INSERT INTO payments (project_id, contractor_id, type, amount, description, payment_date, status)
-                   VALUES ({project_id}, {contractor_id}, {payment_type}, {amount}, {description}, {payment_date}, {status}) RETURNING id'''
-            )
+            partitions_month = ensure_payment_partitions(cur)
+            INSERT_PAYMENT.execute(cur, (
+                int(body_data['project_id']),
+                int(body_data['contractor_id']) if body_data.get('contractor_id') else None,
+                body_data['type'],
+                float(body_data['amount']),
+                body_data.get('description', ''),
+                body_data['payment_date'],
+                body_data.get('status', 'pending')
+            ))
             payment_id = cur.fetchone()['id']
+            cur.execute('SELECT refresh_cash_flow()')
             
             conn.commit()
+            partitions_committed(partitions_month)
             result = {'id': payment_id, 'message': 'Payment created successfully'}
         
+        elif action in ('update-payment-status', 'bulk-approve-payments'):
+            try:
+                if action == 'update-payment-status':
+                    pairs = parse_versions([body_data])
+                    status = body_data.get('status', '')
+                else:
+                    pairs = parse_versions(body_data.get('payments'))
+                    status = 'completed'
+                result = update_payment_status(cur, pairs, status)
+            except ValueError as e:
+                conn.rollback()
+                cur.close()
+                conn.close()
+                return responses.error(event, 400, str(e))
+            conn.commit()
+            if action == 'update-payment-status' and result['conflicts']:
+                cur.close()
+                conn.close()
+                conflict = result['conflicts'][0]
+                return responses.json_response(event, 404 if conflict['conflict'] == 'not_found' else 409,
+                                               {'error': conflict['conflict'], **conflict})
+        
         elif action == 'create-item':
-            name = escape_sql(body_data['name'])
-            description = escape_sql(body_data.get('description', ''))
-            item_type = escape_sql(body_data['type'])
-            unit = escape_sql(body_data['unit'])
-            default_price = float(body_data['default_price']) if body_data.get('default_price') else 'NULL'
-            
-            cur.execute(
-                f'''INSERT INTO items (name, description, type, unit, default_price)
-                   VALUES ({name}, {description}, {item_type}, {unit}, {default_price}) RETURNING id'''
-            )
+            INSERT_ITEM.execute(cur, (
+                body_data['name'],
+                body_data.get('description', ''),
+                body_data['type'],
+                body_data['unit'],
+                float(body_data['default_price']) if body_data.get('default_price') else None
+            ))
             item_id = cur.fetchone()['id']
             
             conn.commit()
+            reference_cache.invalidate('items')
             result = {'id': item_id, 'message': 'Item created successfully'}
         
         else:
             cur.close()
             conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid action'}),
-                'isBase64Encoded': False
-            }
+            return responses.error(event, 400, 'Invalid action')
         
         cur.close()
         conn.close()
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps(result),
-            'isBase64Encoded': False
-        }
+        return responses.json_response(event, 200, result)
     
     cur.close()
     conn.close()
-    return {
-        'statusCode': 405,
-        'headers': {'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
\ No newline at end of file
+    return responses.error(event, 405, 'Method not allowed')
\ No newline at end of file
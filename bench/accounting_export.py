@@ -0,0 +1,104 @@
+'''
+Accounting export of 1M payments: api-stats action=export (chunked COPY into gzip) vs fetching the same rows
+into Python and serializing them as one JSON body, the way the listings are scraped today.
+Usage: DATABASE_URL=postgresql://... python bench/accounting_export.py [payments] [csv|xlsx]
+Seeds the 1x demo data through bench/seed.py plus the payments (description "load-test") and removes them at the end.
+Peak memory is Python allocations (tracemalloc) per request.
+'''
+import base64
+import json
+import sys
+import time
+import tracemalloc
+
+import seed
+from common import Context, load_function, make_event
+
+DATE_FROM = '2023-01-01'
+DATE_TO = '2025-12-31'
+
+
+def seed_payments(db, payments: int) -> None:
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO payments (project_id, contractor_id, amount, payment_type, description, payment_date, status)
+        SELECT p.ids[1 + g %% array_length(p.ids, 1)], k.ids[1 + g %% array_length(k.ids, 1)], 10000 + (g %% 50) * 5000,
+               (ARRAY['milestone', 'milestone', 'final', 'income'])[1 + g %% 4], %(description)s,
+               DATE '2023-01-01' + g %% 1000,
+               CASE WHEN g %% 7 = 0 THEN 'pending' ELSE 'completed' END
+        FROM generate_series(1, %(payments)s) g,
+             (SELECT array_agg(id) as ids FROM projects WHERE title LIKE %(pattern)s) p,
+             (SELECT array_agg(id) as ids FROM contractors WHERE name LIKE %(pattern)s) k
+    """, {'description': seed.PAYMENT_DESCRIPTION, 'pattern': seed.PREFIX + '%', 'payments': payments})
+    cur.execute('SELECT refresh_cash_flow()')
+    cur.execute('ANALYZE payments')
+    conn.commit()
+    conn.close()
+
+
+def measured(call) -> tuple:
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = call()
+    elapsed = (time.perf_counter() - started) * 1000
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def exported(index, fmt: str) -> None:
+    params = {'action': 'export', 'type': 'payments', 'format': fmt, 'date_from': DATE_FROM, 'date_to': DATE_TO}
+    chunks = rows = size = peak = 0
+    total_ms = 0.0
+    while True:
+        response, ms, chunk_peak = measured(lambda: index.handler(make_event('GET', params, headers={'Accept-Encoding': 'gzip'}), Context()))
+        assert response['statusCode'] == 200, response
+        chunks += 1
+        rows += int(response['headers']['X-Export-Rows'])
+        size += len(base64.b64decode(response['body']))
+        peak = max(peak, chunk_peak)
+        total_ms += ms
+        if 'X-Export-Next' not in response['headers']:
+            break
+        params['after'] = response['headers']['X-Export-Next']
+    print(f'{"export " + fmt:<14} rows={rows:<9} chunks={chunks:<3} total={total_ms:9.1f}ms  '
+          f'bytes={size:<11} peak={peak / 1024:9.0f}KiB/request')
+
+
+def fetched(db, export) -> None:
+    from psycopg2.extras import RealDictCursor
+
+    def call() -> int:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(export.EXPORT_SOURCES['payments'][3].format(
+            where='WHERE p.payment_date >= %(date_from)s AND p.payment_date <= %(date_to)s'),
+            {'date_from': DATE_FROM, 'date_to': DATE_TO})
+        body = json.dumps([dict(row) for row in cur.fetchall()], default=str)
+        cur.close()
+        conn.close()
+        return len(body)
+
+    size, ms, peak = measured(call)
+    print(f'{"fetchall json":<14} {"":<29} total={ms:9.1f}ms  bytes={size:<11} peak={peak / 1024:9.0f}KiB/request')
+
+
+def main() -> None:
+    payments = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    fmt = sys.argv[2] if len(sys.argv) > 2 else 'csv'
+    index, db = load_function('api-stats')
+    import export
+
+    seed.seed(db, 1)
+    try:
+        seed_payments(db, payments)
+        print(f'{payments} payments, chunks of up to {export.EXPORT_CHUNK_ROWS} rows')
+        exported(index, fmt)
+        fetched(db, export)
+    finally:
+        seed.cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+'''
+Throughput of api-stats reconcile: serial psycopg2 queries vs the asyncio fan-out (aio.py), under concurrent load.
+Usage: DATABASE_URL=postgresql://... python bench/async_reads.py [requests] [concurrency,...]
+Needs psycopg[binary] and psycopg-pool for the async side, and STATS_ADMIN_TOKEN set (reconcile is an admin action).
+'''
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import Context, load_function, make_event
+
+
+def load(index, concurrency: int, requests: int) -> tuple:
+    event = make_event('GET', {'action': 'reconcile'}, headers={'X-Admin-Token': os.environ['STATS_ADMIN_TOKEN']})
+
+    def call(_: int) -> float:
+        started = time.perf_counter()
+        response = index.handler(event, Context())
+        assert response['statusCode'] == 200, response
+        return (time.perf_counter() - started) * 1000
+
+    call(0)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = sorted(pool.map(call, range(requests)))
+    wall = time.perf_counter() - started
+    return requests / wall, statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    levels = [int(n) for n in sys.argv[2].split(',')] if len(sys.argv) > 2 else [1, 4, 16]
+    index, db = load_function('api-stats')
+    import aio
+    if aio.AsyncConnectionPool is None:
+        sys.exit('psycopg and psycopg-pool are required for the async side')
+    print(f'{"mode":<6} {"conc":>4} {"req/s":>8} {"p50":>9} {"p95":>9}')
+    for concurrency in levels:
+        for mode in ('sync', 'async'):
+            aio.ENABLED = mode == 'async'
+            qps, p50, p95 = load(index, concurrency, requests)
+            print(f'{mode:<6} {concurrency:>4} {qps:8.1f} {p50:7.2f}ms {p95:7.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+'''
+Budget forecast (api-stats action=forecast) at 100k projects: the bulk load, the vectorized pass and the whole
+request, next to the same burn-rate projection written as a per-project Python loop.
+Usage: DATABASE_URL=postgresql://... python bench/budget_forecast.py [projects] [payments] [iterations]
+Seeds the demo data through bench/seed.py scaled to the project count plus the payments (description "load-test"),
+gives the seeded projects an end_date, and removes everything at the end.
+'''
+import statistics
+import sys
+import time
+from datetime import date
+
+from psycopg2.extras import RealDictCursor
+
+import seed
+from accounting_export import seed_payments
+from common import Context, load_function, make_event
+
+# Just after the last seeded payment date (2023-01-01 + 999 days), so the history window has spend
+FORECAST_DATE = '2025-10-01'
+
+
+def timed(call, iterations: int) -> tuple:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def loop_projection(forecast, columns: dict, today: date) -> list:
+    '''compute() one project at a time, for comparison'''
+    months = forecast.FORECAST_HISTORY_MONTHS
+    history_from, _ = forecast.history_window(today, months)
+    base = history_from.year * 12 + history_from.month - 1
+    month_last_days = []
+    for k in range(1, months + 1):
+        total = base + k
+        month_last_days.append((date(total // 12, total % 12 + 1, 1) - forecast.EPOCH).days - 1)
+    spend = {}
+    for project_id, month, amount in zip(columns['spend_project'].tolist(), columns['spend_month'].tolist(),
+                                         columns['spend_amount'].tolist()):
+        spend.setdefault(project_id, [0.0] * months)[month] += amount
+    today_day = (today - forecast.EPOCH).days
+    projected = []
+    for i, project_id in enumerate(columns['id'].tolist()):
+        start, end = columns['start_day'][i], columns['end_day'][i]
+        series = spend.get(project_id, [0.0] * months)
+        weighted = weight_sum = 0.0
+        for k in range(months):
+            if start != start or start <= month_last_days[k]:
+                weight = forecast.FORECAST_DECAY ** (months - 1 - k)
+                weighted += series[k] * weight
+                weight_sum += weight
+        burn_rate = weighted / weight_sum if weight_sum else 0.0
+        remaining = 0.0 if columns['closed'][i] else max(end - today_day, 0) / forecast.DAYS_PER_MONTH
+        projected.append(columns['actual_cost'][i] + burn_rate * remaining)
+    return projected
+
+
+def main() -> None:
+    projects = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payments = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    stats, db = load_function('api-stats')
+    import forecast
+
+    seed.seed(db, max(1, projects // seed.DEMO_COUNTS['projects']))
+    try:
+        seed_payments(db, payments)
+        conn = db.connect()
+        cur = conn.cursor()
+        cur.execute('UPDATE projects SET end_date = start_date + 300 + id %% 600 WHERE title LIKE %s',
+                    (seed.PREFIX + '%',))
+        conn.commit()
+
+        today = date.fromisoformat(FORECAST_DATE)
+        params = {'date': FORECAST_DATE}
+        _, _, _, conditions, args = forecast.parse_params(params)
+        cur.close()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        load_ms, columns = timed(lambda: forecast.load(cur, today, conditions, args), iterations)
+        compute_ms, result = timed(lambda: forecast.compute(columns, today), iterations)
+        summary_ms, _ = timed(lambda: forecast.summarize(result, today, 50, 'overrun'), iterations)
+        loop_ms, projected = timed(lambda: loop_projection(forecast, columns, today), 1)
+        cur.close()
+        conn.close()
+        request_ms, response = timed(lambda: stats.handler(make_event('GET', {'action': 'forecast', **params}), Context()),
+                                     iterations)
+        assert response['statusCode'] == 200, response
+
+        difference = max((abs(a - b) for a, b in zip(projected, result['projected_cost'].tolist()) if a == a), default=0)
+        print(f'{len(columns["id"])} projects, {len(columns["spend_amount"])} project-months of spend')
+        print(f'load (one query, packed columns) {load_ms:9.1f}ms')
+        print(f'vectorized compute               {compute_ms:9.1f}ms')
+        print(f'summary (top 50)                 {summary_ms:9.1f}ms')
+        print(f'whole request                    {request_ms:9.1f}ms')
+        print(f'per-project Python loop          {loop_ms:9.1f}ms (max difference {difference:.6f})')
+    finally:
+        seed.cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
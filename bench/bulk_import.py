@@ -0,0 +1,83 @@
+'''
+Throughput of per-request create-estimate calls vs one bulk-import request.
+Usage: DATABASE_URL=postgresql://... python bench/bulk_import.py [estimates] [items_per_estimate]
+Imported rows are titled "bench-bulk-*" and removed at the end.
+'''
+import json
+import sys
+import time
+
+from common import Context, load_function
+
+TITLE_PREFIX = 'bench-bulk-'
+
+
+def payloads(db, count: int, items_per_row: int) -> list:
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('SELECT MIN(id) FROM companies')
+    company_id = cur.fetchone()[0]
+    cur.execute('SELECT id FROM items ORDER BY id')
+    item_ids = [row[0] for row in cur.fetchall()]
+    conn.close()
+    return [
+        {
+            'company_id': company_id,
+            'title': f'{TITLE_PREFIX}{n}',
+            'items': [
+                {'item_id': item_ids[i % len(item_ids)], 'quantity': 1 + i % 5, 'unit_price': 1000 + i}
+                for i in range(items_per_row)
+            ]
+        }
+        for n in range(count)
+    ]
+
+
+def cleanup(db) -> None:
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute("""
+        DELETE FROM estimate_items WHERE estimate_id IN (SELECT id FROM estimates WHERE title LIKE %s)
+    """, (TITLE_PREFIX + '%',))
+    cur.execute('DELETE FROM estimates WHERE title LIKE %s', (TITLE_PREFIX + '%',))
+    conn.commit()
+    conn.close()
+
+
+def post(handler, action: str, body: dict) -> dict:
+    response = handler({
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': action},
+        'body': json.dumps(body)
+    }, Context())
+    assert response['statusCode'] == 200, response
+    return json.loads(response['body'])
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    items_per_row = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    index, db = load_function('project-management')
+    rows = payloads(db, count, items_per_row)
+    line_items = count * items_per_row
+    try:
+        started = time.perf_counter()
+        for row in rows:
+            post(index.handler, 'create-estimate', row)
+        single = time.perf_counter() - started
+        cleanup(db)
+
+        started = time.perf_counter()
+        result = post(index.handler, 'bulk-import', {'type': 'estimates', 'rows': rows})
+        bulk = time.perf_counter() - started
+        assert result['failed'] == 0, result['errors'][:5]
+
+        print(f'{count} estimates, {line_items} line items')
+        for label, elapsed in (('per-request', single), ('bulk-import', bulk)):
+            print(f'{label:<12} {elapsed:8.2f}s  {count / elapsed:10.0f} estimates/s  {line_items / elapsed:10.0f} items/s')
+    finally:
+        cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+'''
+Helpers shared by the bench scripts: load backend functions in-process and build handler events.
+'''
+import importlib
+import importlib.util
+import json
+import os
+import sys
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+
+class Context:
+    request_id = 'bench'
+    function_name = 'bench'
+
+
+def function_names() -> List[str]:
+    return sorted(
+        name for name in os.listdir(BACKEND)
+        if os.path.isfile(os.path.join(BACKEND, name, 'index.py'))
+    )
+
+
+def load_function(name: str) -> Tuple[ModuleType, ModuleType]:
+    '''
+    Import backend/<name>/index.py as its own module so several functions can share one process.
+    Helper modules (db, responses, reference_cache) are identical copies in every function,
+    so the first copy on sys.path serves all of them.
+    '''
+    for function in function_names():
+        path = os.path.join(BACKEND, function)
+        if path not in sys.path:
+            sys.path.append(path)
+    module_name = 'function_' + name.replace('-', '_')
+    module = sys.modules.get(module_name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(BACKEND, name, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return module, importlib.import_module('db')
+
+
+def make_event(method: str, params: Optional[Dict[str, str]] = None, body: Any = None,
+               headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    event: Dict[str, Any] = {
+        'httpMethod': method,
+        'queryStringParameters': params or {},
+        'headers': headers or {},
+    }
+    if body is not None:
+        event['body'] = body if isinstance(body, str) else json.dumps(body)
+    return event
@@ -0,0 +1,71 @@
+'''
+companies-with-stats latency at 10k companies / 1M payments.
+Usage: DATABASE_URL=postgresql://... python bench/company_stats.py [companies] [payments] [iterations]
+Seeded rows are marked with the "bench-co-" prefix and removed at the end.
+'''
+import statistics
+import sys
+import time
+
+from common import Context, load_function
+
+PREFIX = 'bench-co-'
+
+
+def seed(db, companies: int, payments: int) -> None:
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO companies (name, inn)
+        SELECT %s || g, lpad(g::text, 10, '0') FROM generate_series(1, %s) g
+    """, (PREFIX, companies))
+    cur.execute("""
+        INSERT INTO projects (title, company_id, budget, actual_cost, status)
+        SELECT %s || g, c.id, 100000 + g % 1000, 50000, (ARRAY['planning', 'in_progress', 'completed'])[1 + g % 3]
+        FROM generate_series(1, 5) g
+        CROSS JOIN (SELECT id FROM companies WHERE name LIKE %s) c
+    """, (PREFIX, PREFIX + '%'))
+    cur.execute("""
+        INSERT INTO payments (project_id, amount, payment_type, description, payment_date, status)
+        SELECT p.ids[1 + g % array_length(p.ids, 1)], 1000, 'milestone', %s, DATE '2024-01-01' + g % 700,
+               CASE WHEN g % 10 = 0 THEN 'pending' ELSE 'completed' END
+        FROM generate_series(1, %s) g,
+             (SELECT array_agg(id) as ids FROM projects WHERE title LIKE %s) p
+    """, (PREFIX, payments, PREFIX + '%'))
+    cur.execute('ANALYZE companies, projects, payments')
+    conn.commit()
+    conn.close()
+
+
+def cleanup(db) -> None:
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('DELETE FROM payments WHERE description = %s', (PREFIX,))
+    cur.execute('DELETE FROM projects WHERE title LIKE %s', (PREFIX + '%',))
+    cur.execute('DELETE FROM companies WHERE name LIKE %s', (PREFIX + '%',))
+    conn.commit()
+    conn.close()
+
+
+def main() -> None:
+    companies = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    payments = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    index, db = load_function('api-reference')
+    seed(db, companies, payments)
+    try:
+        event = {'httpMethod': 'GET', 'queryStringParameters': {'action': 'companies-with-stats'}}
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = index.handler(event, Context())
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response['statusCode'] == 200
+        print(f'companies-with-stats: {companies} companies, {payments} payments')
+        print(f'p50={statistics.median(timings):.1f}ms  max={max(timings):.1f}ms  body={len(response["body"]) / 1024:.0f}KiB')
+    finally:
+        cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
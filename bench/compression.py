@@ -0,0 +1,67 @@
+'''
+Bytes on the wire and compression CPU per GET endpoint: identity vs gzip vs brotli (responses.build).
+Usage: DATABASE_URL=postgresql://... python bench/compression.py [scale] [iterations]
+Seeds scale x the demo data through bench/seed.py and removes it at the end. Endpoints are the GET specs
+from every function's tests.json plus the harness's generated payloads; CPU is process time per response.
+'''
+import base64
+import statistics
+import sys
+import time
+
+import harness
+import seed
+from common import Context, function_names, load_function
+
+
+def body_bytes(response: dict) -> int:
+    body = response.get('body') or ''
+    return len(base64.b64decode(body)) if response.get('isBase64Encoded') else len(body.encode('utf-8'))
+
+
+def cpu_ms(call, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.process_time()
+        call()
+        timings.append((time.process_time() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    handlers = {name: load_function(name)[0].handler for name in function_names()}
+    _, db = load_function('api-stats')
+    import responses
+    seed.seed(db, scale)
+    try:
+        ids = seed.seeded_ids(db)
+        scenarios = [s for name in handlers for s in harness.spec_scenarios(name, ids)] + harness.generated_scenarios(ids)
+        print(f'{"endpoint":<58} {"identity":>10} {"gzip":>10} {"br":>10} {"gzip cpu":>9} {"br cpu":>9}')
+        for scenario in scenarios:
+            if scenario.writes:
+                continue
+            response = handlers[scenario.function](scenario.event, Context())
+            if response['statusCode'] != 200 or response.get('isBase64Encoded'):
+                continue
+            data = response['body'].encode('utf-8')
+            sizes = {'identity': len(data)}
+            cpu = {}
+            for encoding in ('gzip', 'br'):
+                if encoding not in responses.ENCODINGS:
+                    sizes[encoding] = cpu[encoding] = None
+                    continue
+                event = dict(scenario.event, headers={**(scenario.event.get('headers') or {}), 'Accept-Encoding': encoding})
+                sizes[encoding] = body_bytes(handlers[scenario.function](event, Context()))
+                cpu[encoding] = cpu_ms(lambda: responses.compress(data, encoding), iterations)
+            print(f'{scenario.key[:58]:<58} {sizes["identity"]:>10} '
+                  + ' '.join(f'{sizes[e]:>10}' if sizes[e] is not None else f'{"n/a":>10}' for e in ('gzip', 'br')) + ' '
+                  + ' '.join(f'{cpu[e]:7.3f}ms' if cpu[e] is not None else f'{"n/a":>9}' for e in ('gzip', 'br')))
+        print(f'bodies under {responses.COMPRESS_MIN_BYTES} bytes are sent uncompressed')
+    finally:
+        seed.cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+'''
+api-stats dashboard: one JSON-building query vs the previous three sequential queries, under simulated network RTT.
+Usage: DATABASE_URL=postgresql://... python bench/dashboard.py [iterations] [rtt_ms,...]
+RTT is simulated by sleeping before every statement, commit and rollback sent from Python.
+'''
+import json
+import statistics
+import sys
+import time
+
+from common import Context, load_function, make_event
+
+
+def per_query_dashboard(db) -> str:
+    '''The dashboard as it was built before the single-query version: three round trips plus Python-side encoding'''
+    from psycopg2.extras import RealDictCursor
+    conn = db.connect()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute("""
+        SELECT total_projects, active_projects, completed_projects, total_budget, total_spent,
+               (total_budget - total_spent) as total_profit, total_contractors, total_estimates,
+               draft_estimates, approved_estimates, total_estimated, total_payments, payment_count, pending_payments
+        FROM dashboard_totals
+        WHERE id = 1
+    """)
+    totals = cur.fetchone()
+    cur.execute("""
+        SELECT p.title, p.budget, p.actual_cost, (p.budget - p.actual_cost) as profit, p.status
+        FROM projects p
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT 5
+    """)
+    recent_projects = cur.fetchall()
+    cur.execute("""
+        SELECT month::timestamp as month, total
+        FROM monthly_payment_totals
+        WHERE month >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '6 months')
+          AND payment_count > 0
+        ORDER BY month
+    """)
+    monthly_payments = cur.fetchall()
+    cur.close()
+    conn.close()
+    return json.dumps({
+        'projects': {key: totals[key] for key in ('total_projects', 'active_projects', 'completed_projects',
+                                                  'total_budget', 'total_spent', 'total_profit')},
+        'contractors': {'total_contractors': totals['total_contractors']},
+        'estimates': {key: totals[key] for key in ('total_estimates', 'draft_estimates', 'approved_estimates',
+                                                   'total_estimated')},
+        'payments': {key: totals[key] for key in ('total_payments', 'payment_count', 'pending_payments')},
+        'recent_projects': [dict(row) for row in recent_projects],
+        'monthly_payments': [{'month': row['month'].isoformat(), 'total': float(row['total'])} for row in monthly_payments],
+    }, default=str)
+
+
+def simulate_rtt(db, rtt: list) -> None:
+    '''Sleep rtt[0] seconds before anything that goes over the wire'''
+    execute, commit, rollback = db.TracedCursor.execute, db.PooledConnection.commit, db.PooledConnection.rollback
+
+    def delayed(method):
+        def wrapper(self, *args, **kwargs):
+            time.sleep(rtt[0])
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    db.TracedCursor.execute = delayed(execute)
+    db.PooledConnection.commit = delayed(commit)
+    db.PooledConnection.rollback = delayed(rollback)
+
+
+def measure(call, iterations: int) -> float:
+    call()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rtts = [float(ms) for ms in sys.argv[2].split(',')] if len(sys.argv) > 2 else [0, 1, 5, 20]
+    index, db = load_function('api-stats')
+    rtt = [0.0]
+    simulate_rtt(db, rtt)
+    event = make_event('GET')
+
+    single = json.loads(index.handler(event, Context())['body'])
+    legacy = json.loads(per_query_dashboard(db))
+    assert single.keys() == legacy.keys() and single['projects'] == legacy['projects'], 'dashboard shapes differ'
+
+    print(f'{"rtt":>6} {"3 queries":>11} {"1 query":>11}')
+    for ms in rtts:
+        rtt[0] = ms / 1000
+        legacy_ms = measure(lambda: per_query_dashboard(db), iterations)
+        single_ms = measure(lambda: index.handler(event, Context()), iterations)
+        print(f'{ms:5.0f}ms {legacy_ms:9.2f}ms {single_ms:9.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
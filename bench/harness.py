@@ -0,0 +1,226 @@
+'''
+Load harness for every backend function, driven by the tests.json specs plus generated payloads.
+Handlers are imported in-process (no HTTP); data comes from bench/seed.py at the requested scale.
+Usage: DATABASE_URL=postgresql://... python bench/harness.py [--scale 100] [--iterations 200] [--concurrency 4]
+           [--functions api-stats,api-projects] [--read-only] [--save baseline.json] [--baseline baseline.json]
+Reports p50/p95/p99 latency, QPS, DB round trips and peak Python allocations per endpoint.
+With --baseline the run exits non-zero when an endpoint's p95 or round trips regress past the tolerance.
+'''
+import argparse
+import copy
+import json
+import math
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+import seed
+from common import BACKEND, Context, function_names, load_function, make_event
+
+FOREIGN_KEYS = ('company_id', 'contractor_id', 'project_id', 'item_id')
+
+
+class Scenario:
+    def __init__(self, function: str, name: str, event: Dict[str, Any], expected_status: int):
+        self.function = function
+        self.name = name
+        self.event = event
+        self.expected_status = expected_status
+
+    @property
+    def key(self) -> str:
+        return f'{self.function}: {self.name}'
+
+    @property
+    def writes(self) -> bool:
+        return self.event['httpMethod'] != 'GET'
+
+
+class RoundTrips:
+    """Sums the round trips of every traced handler invocation (see db.traced)"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, trace) -> None:
+        with self._lock:
+            self.count += trace.round_trips
+
+
+def event_from_test(test: Dict[str, Any], ids: Dict[str, int]) -> Dict[str, Any]:
+    url = urlsplit(test.get('path', '/'))
+    body = test.get('body')
+    return make_event(test['method'], dict(parse_qsl(url.query)),
+                      tag_body(copy.deepcopy(body), ids) if body is not None else None,
+                      test.get('headers'))
+
+
+def tag_body(value: Any, ids: Dict[str, int]) -> Any:
+    '''Point write payloads at seeded rows and prefix their titles so seed.cleanup() removes them'''
+    if isinstance(value, list):
+        return [tag_body(item, ids) for item in value]
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == 'title':
+                value[key] = seed.PREFIX + str(item)
+            elif key in FOREIGN_KEYS and ids.get(key):
+                value[key] = str(ids[key])
+            else:
+                value[key] = tag_body(item, ids)
+    return value
+
+
+def spec_scenarios(function: str, ids: Dict[str, int]) -> List[Scenario]:
+    path = os.path.join(BACKEND, function, 'tests.json')
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        tests = json.load(f)['tests']
+    return [
+        Scenario(function, test['name'], event_from_test(test, ids), test.get('expectedStatus', 200))
+        for test in tests
+    ]
+
+
+def generated_scenarios(ids: Dict[str, int]) -> List[Scenario]:
+    '''Payloads the specs do not cover: deeper pages, filters, wide ranges and a write with valid foreign keys'''
+    company_id = str(ids['company_id'])
+    return [
+        Scenario('api-projects', 'page of 200 in progress', make_event('GET', {'status': 'in_progress', 'limit': '200'}), 200),
+        Scenario('api-projects', 'company page', make_event('GET', {'company_id': company_id, 'limit': '50'}), 200),
+        Scenario('api-estimates', 'page of 200', make_event('GET', {'limit': '200'}), 200),
+        Scenario('api-contractors', 'page of 200', make_event('GET', {'limit': '200'}), 200),
+        Scenario('api-contractors', 'seeded contractor statement', make_event('GET', {
+            'action': 'contractor-statement', 'id': str(ids['contractor_id']),
+            'date_from': '2023-06-01', 'date_to': '2024-05-31', 'limit': '100',
+        }), 200),
+        Scenario('api-reference', 'seeded company projects',
+                 make_event('GET', {'action': 'company-projects', 'company_id': company_id}), 200),
+        Scenario('api-stats', 'daily cash flow by contractor', make_event('GET', {
+            'action': 'cash-flow', 'granularity': 'day', 'group_by': 'contractor',
+            'date_from': '2024-02-10', 'date_to': '2024-05-20',
+        }), 200),
+        Scenario('api-stats', 'monthly cash flow by project', make_event('GET', {
+            'action': 'cash-flow', 'granularity': 'month', 'group_by': 'project',
+            'date_from': '2023-01-01', 'date_to': '2025-12-31',
+        }), 200),
+        Scenario('project-management', 'create payment', make_event('POST', {'action': 'create-payment'}, {
+            'project_id': ids['project_id'], 'contractor_id': ids['contractor_id'], 'type': 'milestone',
+            'amount': '15000', 'description': seed.PAYMENT_DESCRIPTION, 'payment_date': '2024-06-01',
+            'status': 'completed',
+        }), 200),
+    ]
+
+
+def percentile(timings: List[float], p: float) -> float:
+    return timings[max(0, math.ceil(p * len(timings)) - 1)]
+
+
+def run(scenario: Scenario, handler: Callable, counter: RoundTrips, iterations: int, concurrency: int) -> Dict[str, Any]:
+    failures = []
+
+    def call(_: int) -> float:
+        started = time.perf_counter()
+        response = handler(copy.deepcopy(scenario.event), Context())
+        elapsed = (time.perf_counter() - started) * 1000
+        if response['statusCode'] != scenario.expected_status:
+            failures.append(response['statusCode'])
+        return elapsed
+
+    call(0)
+    tracemalloc.start()
+    call(0)
+    peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    before = counter.count
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = sorted(pool.map(call, range(iterations)))
+    wall = time.perf_counter() - started
+    return {
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'qps': round(iterations / wall, 1),
+        'round_trips': round((counter.count - before) / iterations, 2),
+        'peak_kib': round(peak_kib, 1),
+        'failures': len(failures),
+    }
+
+
+def regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    found = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            found.append(f'{key}: p95 {base["p95_ms"]}ms -> {result["p95_ms"]}ms')
+        if result['round_trips'] > base['round_trips']:
+            found.append(f'{key}: round trips {base["round_trips"]} -> {result["round_trips"]}')
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Load harness for the backend functions')
+    parser.add_argument('--scale', type=int, default=100, help='multiple of the demo data to seed')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--functions', default='', help='comma-separated subset of backend functions')
+    parser.add_argument('--read-only', action='store_true', help='skip POST scenarios')
+    parser.add_argument('--keep-data', action='store_true', help='leave the seeded rows in place')
+    parser.add_argument('--save', help='write results to this JSON file as a new baseline')
+    parser.add_argument('--baseline', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 growth over the baseline')
+    args = parser.parse_args()
+
+    functions = args.functions.split(',') if args.functions else function_names()
+    handlers = {name: load_function(name)[0].handler for name in functions}
+    _, db = load_function(functions[0])
+    counter = RoundTrips()
+    db.trace_listeners.append(counter)
+
+    seed.seed(db, args.scale)
+    try:
+        ids = seed.seeded_ids(db)
+        scenarios = [s for name in functions for s in spec_scenarios(name, ids)]
+        scenarios += [s for s in generated_scenarios(ids) if s.function in handlers]
+        if args.read_only:
+            scenarios = [s for s in scenarios if not s.writes]
+
+        results: Dict[str, Dict[str, Any]] = {}
+        print(f'scale={args.scale} iterations={args.iterations} concurrency={args.concurrency}')
+        print(f'{"endpoint":<64} {"p50":>8} {"p95":>8} {"p99":>8} {"qps":>8} {"trips":>6} {"peak":>9}')
+        for scenario in scenarios:
+            result = run(scenario, handlers[scenario.function], counter, args.iterations, args.concurrency)
+            results[scenario.key] = result
+            flag = f'  {result["failures"]} unexpected statuses' if result['failures'] else ''
+            print(f'{scenario.key[:64]:<64} {result["p50_ms"]:7.2f}ms {result["p95_ms"]:7.2f}ms {result["p99_ms"]:7.2f}ms '
+                  f'{result["qps"]:8.1f} {result["round_trips"]:6.2f} {result["peak_kib"]:7.1f}KiB{flag}')
+        print(f'max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MiB, pool {db.get_pool().stats()}')
+    finally:
+        if not args.keep_data:
+            seed.cleanup(db)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'scale': args.scale, 'concurrency': args.concurrency, 'results': results}, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            found = regressions(results, json.load(f)['results'], args.tolerance)
+        for line in found:
+            print('REGRESSION', line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
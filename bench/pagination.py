@@ -0,0 +1,69 @@
+'''
+Per-page latency and memory of keyset pagination over a large seeded table.
+Usage: DATABASE_URL=postgresql://... python bench/pagination.py [rows] [page_size]
+Seeded rows are titled "bench-page-*" and removed at the end.
+'''
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+from common import Context, load_function
+
+SEED_PREFIX = 'bench-page-'
+
+
+def seed(db, rows: int) -> None:
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO projects (title, company_id, budget, status, created_at)
+        SELECT %s || g, (SELECT MIN(id) FROM companies), 1000 + g % 500,
+               (ARRAY['planning', 'in_progress', 'completed'])[1 + g % 3],
+               TIMESTAMP '2020-01-01' + g * INTERVAL '1 minute'
+        FROM generate_series(1, %s) g
+    """, (SEED_PREFIX, rows))
+    conn.commit()
+    conn.close()
+
+
+def cleanup(db) -> None:
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('DELETE FROM projects WHERE title LIKE %s', (SEED_PREFIX + '%',))
+    conn.commit()
+    conn.close()
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    index, db = load_function('api-projects')
+    seed(db, rows)
+    try:
+        cursor = None
+        timings, peaks = [], []
+        while True:
+            params = {'limit': str(page_size)}
+            if cursor:
+                params['cursor'] = cursor
+            tracemalloc.start()
+            started = time.perf_counter()
+            response = index.handler({'httpMethod': 'GET', 'queryStringParameters': params}, Context())
+            timings.append((time.perf_counter() - started) * 1000)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+            cursor = json.loads(response['body'])['next_cursor']
+            if not cursor:
+                break
+        print(f'{len(timings)} pages of {page_size} over {rows}+ rows')
+        for label, values, unit in (('latency', timings, 'ms'), ('peak mem', peaks, 'KiB')):
+            print(f'{label:<9} first={values[0]:8.2f}{unit}  median={statistics.median(values):8.2f}{unit}  '
+                  f'last={values[-1]:8.2f}{unit}  max={max(values):8.2f}{unit}')
+    finally:
+        cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+'''
+Monthly partitions of payments (V0016/V0017) at 10M payments: the date-bounded reads of api-stats,
+api-contractors and api-projects against the plain table and the partitioned one, with partitions scanned.
+Usage: DATABASE_URL=postgresql://... python bench/partitions.py [payments] [iterations]
+Run it before V0017: it builds payments_partitioned next to payments with prepare_payments_partitioning(),
+copies the rows (timed), compares, and drops the copy again. After V0017 only the partitioned column is shown.
+Seeds the 1x demo data through bench/seed.py plus the payments (description "load-test") and removes them at the end.
+'''
+import re
+import statistics
+import sys
+import time
+
+import seed
+from accounting_export import seed_payments
+from common import load_function
+
+# The last six months of the seeded payment dates (2023-01-01 + 0..999 days)
+WINDOW_FROM = '2025-04-01'
+WINDOW_TO = '2025-09-30'
+
+WINDOW_SQL = """
+    SELECT DATE_TRUNC('month', payment_date) as month, SUM(amount), COUNT(*)
+    FROM payments
+    WHERE payment_date >= %(date_from)s AND payment_date <= %(date_to)s
+    GROUP BY 1
+"""
+
+UNBOUNDED_PROJECT_SQL = """
+    SELECT project_id, id, amount, payment_date, status
+    FROM payments
+    WHERE project_id = ANY(%(project_ids)s)
+    ORDER BY project_id, payment_date DESC, id DESC
+"""
+
+
+def on_table(sql: str, table: str) -> str:
+    return re.sub(r'\b(FROM|JOIN) payments\b', rf'\1 {table}', sql)
+
+
+def queries(contractors, projects) -> list:
+    return [
+        ('six-month window', WINDOW_SQL),
+        ('contractor statement summary', contractors.STATEMENT_SUMMARY_SQL),
+        ('contractor statement page', contractors.STATEMENT_PAYMENTS_SQL.format(after='')),
+        ('project payments, ids only', UNBOUNDED_PROJECT_SQL),
+        ('project payments, date-bounded', projects.CHILD_QUERIES['payments'].replace(
+            'ANY(%s) AND payment_date BETWEEN %s AND %s',
+            'ANY(%(project_ids)s) AND payment_date BETWEEN %(payments_from)s AND %(payments_to)s')),
+    ]
+
+
+def scanned(cur, sql: str, args: dict) -> int:
+    '''Distinct payments relations (table or partitions) in the plan'''
+    cur.execute('EXPLAIN (FORMAT JSON) ' + sql, args)
+    relations = set()
+    stack = [cur.fetchone()[0][0]['Plan']]
+    while stack:
+        node = stack.pop()
+        if node.get('Relation Name', '').startswith('payments'):
+            relations.add(node['Relation Name'])
+        stack.extend(node.get('Plans', []))
+    return len(relations)
+
+
+def timed(cur, sql: str, args: dict, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        cur.execute(sql, args)
+        cur.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    payments = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    contractors, db = load_function('api-contractors')
+    projects, _ = load_function('api-projects')
+    seed.seed(db, 1)
+    conn = db.connect()
+    cur = conn.cursor()
+    built = False
+    try:
+        seed_payments(db, payments)
+        cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = 'payments'::regclass")
+        partitioned = cur.fetchone()[0]
+        tables = ['payments'] if partitioned else ['payments', 'payments_partitioned']
+        if not partitioned:
+            started = time.perf_counter()
+            cur.execute('SELECT prepare_payments_partitioning()')
+            partitions = cur.fetchone()[0]
+            cur.execute('INSERT INTO payments_partitioned SELECT * FROM payments')
+            cur.execute('ANALYZE payments_partitioned')
+            conn.commit()
+            built = True
+            print(f'copied the payments into {partitions} partitions in {time.perf_counter() - started:.1f}s')
+
+        ids = seed.seeded_ids(db)
+        cur.execute("""
+            SELECT array_agg(id), MIN(payments_from), MAX(payments_to)
+            FROM (SELECT id, payments_from, payments_to FROM projects WHERE title LIKE %s ORDER BY id LIMIT 20) p
+        """, (seed.PREFIX + '%',))
+        project_ids, payments_from, payments_to = cur.fetchone()
+        args = {
+            'date_from': WINDOW_FROM, 'date_to': WINDOW_TO, 'contractor_id': ids['contractor_id'], 'limit': 51,
+            'project_ids': project_ids, 'payments_from': payments_from, 'payments_to': payments_to,
+        }
+
+        print(f'{"query":<32}' + ''.join(f'{table:>30}' for table in tables))
+        for name, sql in queries(contractors, projects):
+            cells = []
+            for table in tables:
+                query = on_table(sql, table)
+                cells.append(f'{timed(cur, query, args, iterations):9.2f}ms {scanned(cur, query, args):>4} relations')
+            print(f'{name:<32}' + ''.join(f'{cell:>30}' for cell in cells))
+        conn.rollback()
+    finally:
+        if built:
+            cur.execute('DROP TRIGGER IF EXISTS trg_payments_partition_sync ON payments')
+            cur.execute('DROP TABLE IF EXISTS payments_partitioned')
+            conn.commit()
+        cur.close()
+        conn.close()
+        seed.cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Cold vs warm handler latency with the connection pool.
+Usage: DATABASE_URL=postgresql://... python bench/pool_latency.py [function] [iterations]
+'''
+import statistics
+import sys
+import time
+
+from common import Context, load_function
+
+
+def measure(handler, event, iterations: int, before=None) -> list:
+    timings = []
+    for _ in range(iterations):
+        if before:
+            before()
+        started = time.perf_counter()
+        response = handler(event, Context())
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response['statusCode'] == 200, response
+    return timings
+
+
+def report(label: str, timings: list) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{label:<6} p50={statistics.median(timings):8.2f}ms  p95={p95:8.2f}ms  max={timings[-1]:8.2f}ms')
+
+
+def main() -> None:
+    name = sys.argv[1] if len(sys.argv) > 1 else 'api-stats'
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    index, db = load_function(name)
+    event = {'httpMethod': 'GET', 'queryStringParameters': {}}
+
+    cold = measure(index.handler, event, iterations, before=lambda: db.get_pool().close_all())
+    warm = measure(index.handler, event, iterations)
+
+    print(f'{name}: {iterations} invocations')
+    report('cold', cold)
+    report('warm', warm)
+    print('pool', db.get_pool().stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+'''
+Repeated single-row inserts: parameterized text query (parsed and planned every time) vs prepared statement.
+Usage: DATABASE_URL=postgresql://... python bench/prepared.py [iterations]
+All inserts run in one transaction that is rolled back at the end.
+'''
+import sys
+import time
+
+from common import load_function
+
+SQL = """
+    INSERT INTO project_items (project_id, item_id, quantity, unit_price)
+    VALUES ({}, {}, {}, {})
+"""
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    _, db = load_function('project-management')
+    statement = db.PreparedStatement('bench_insert_project_item', SQL.format('$1', '$2', '$3', '$4'))
+
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('SELECT MIN(id) FROM projects')
+    project_id = cur.fetchone()[0]
+    cur.execute('SELECT MIN(id) FROM items')
+    item_id = cur.fetchone()[0]
+    try:
+        started = time.perf_counter()
+        for n in range(iterations):
+            cur.execute(SQL.format('%s', '%s', '%s', '%s'), (project_id, item_id, 1 + n % 5, 1000.5))
+        plain = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for n in range(iterations):
+            statement.execute(cur, (project_id, item_id, 1 + n % 5, 1000.5))
+        prepared = time.perf_counter() - started
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f'{iterations} inserts')
+    for label, elapsed in (('plain', plain), ('prepared', prepared)):
+        print(f'{label:<9} {elapsed:7.3f}s  {elapsed / iterations * 1e6:8.1f}us/insert')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+'''
+projects-batch (set-based child loading) vs loading each project's children one query at a time.
+Usage: DATABASE_URL=postgresql://... python bench/project_detail.py [scale] [batch] [iterations]
+Seeds scale x the demo data through bench/seed.py and removes it at the end.
+'''
+import statistics
+import sys
+import time
+
+import seed
+from common import Context, load_function, make_event
+
+
+def per_project(db, index, ids: list) -> list:
+    '''The N+1 shape: one query per project per child collection'''
+    from psycopg2.extras import RealDictCursor
+    conn = db.connect()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    projects = index.load_projects(cur, ids, list(index.PROJECT_FIELDS), [])
+    for project in projects:
+        for name, sql in index.CHILD_QUERIES.items():
+            cur.execute(sql, ([project['id']],))
+            project[name] = [dict(row) for row in cur.fetchall()]
+    cur.close()
+    conn.close()
+    return projects
+
+
+def main() -> None:
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    index, db = load_function('api-projects')
+    trips = []
+    db.trace_listeners.append(lambda trace: trips.append(trace.round_trips))
+    seed.seed(db, scale)
+    try:
+        conn = db.connect()
+        cur = conn.cursor()
+        cur.execute('SELECT id FROM projects WHERE title LIKE %s ORDER BY id LIMIT %s', (seed.PREFIX + '%', batch))
+        ids = [row[0] for row in cur.fetchall()]
+        conn.close()
+        event = make_event('GET', {'action': 'projects-batch', 'ids': ','.join(map(str, ids))})
+
+        for label, call in (
+            ('per-project', db.traced(lambda event, context: {'statusCode': 200, 'body': per_project(db, index, ids)})),
+            ('batched', index.handler),
+        ):
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                call(event, Context())
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f'{label:<12} {len(ids)} projects  p50={statistics.median(timings):8.2f}ms  round trips={trips[-1]}')
+    finally:
+        seed.cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
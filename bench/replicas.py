@@ -0,0 +1,87 @@
+'''
+Read replica routing (db.connect_read): round-robin spread, read-your-writes via X-DB-Session and lag fallback.
+Usage: DATABASE_URL=postgresql://...:5432/db DATABASE_READ_URLS=postgresql://...:5433/db python bench/replicas.py [requests]
+
+Two local instances, the second a streaming replica of the first:
+    initdb -D /tmp/pg-primary && pg_ctl -D /tmp/pg-primary -o '-p 5432' start
+    pg_basebackup -D /tmp/pg-replica -R -p 5432 && pg_ctl -D /tmp/pg-replica -o '-p 5433' start
+then apply db_migrations on the primary. The lag check pauses replay on each replica with pg_wal_replay_pause(),
+which needs a superuser in the read URLs; it is skipped for servers that are not in recovery.
+Rows written here use the bench/seed.py prefix and are removed at the end.
+'''
+import collections
+import sys
+import time
+
+import psycopg2
+
+import seed
+from common import Context, load_function, make_event
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    contractors, db = load_function('api-contractors')
+    if not db.READ_URLS:
+        sys.exit('set DATABASE_READ_URLS (or DATABASE_READ_URL) to the replica DSNs')
+    nodes = []
+    db.trace_listeners.append(lambda trace: nodes.append(trace.node))
+    listing = make_event('GET', {'limit': '20'})
+
+    def served_by(event) -> tuple:
+        nodes.clear()
+        response = contractors.handler(event, Context())
+        assert response['statusCode'] == 200, response
+        return nodes[-1], response
+
+    spread = collections.Counter(served_by(listing)[0] for _ in range(requests))
+    print('round-robin:', ', '.join(f'{node}={count}' for node, count in sorted(spread.items())))
+
+    try:
+        name = seed.PREFIX + 'replica-check'
+        created = contractors.handler(make_event('POST', {'action': 'create-contractor'}, {
+            'name': name, 'specialization': 'bench', 'email': 'replica@example.com', 'hourly_rate': 1
+        }), Context())
+        token = created['headers'].get(db.SESSION_HEADER)
+        print(f'write token: {token}')
+        node, response = served_by(make_event('GET', {'specialization': 'bench'}, headers={db.SESSION_HEADER: token}))
+        print(f'read with token:    {node:<9} sees the write: {name in response["body"]}')
+        node, response = served_by(make_event('GET', {'specialization': 'bench'}))
+        print(f'read without token: {node:<9} sees the write: {name in response["body"]}')
+
+        replicas = [psycopg2.connect(dsn) for dsn in db.READ_URLS]
+        for conn in replicas:
+            conn.autocommit = True
+        in_recovery = []
+        for conn in replicas:
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_is_in_recovery()')
+                in_recovery.append(cur.fetchone()[0])
+        if not all(in_recovery):
+            print('lag fallback: skipped, not every read URL is a streaming replica')
+            for conn in replicas:
+                conn.close()
+            return
+        for conn in replicas:
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_wal_replay_pause()')
+        try:
+            time.sleep(db.REPLICA_MAX_LAG_SECONDS + db.REPLICA_CHECK_SECONDS + 1)
+            contractors.handler(make_event('POST', {'action': 'create-contractor'}, {
+                'name': name + '-lag', 'specialization': 'bench', 'email': 'replica@example.com', 'hourly_rate': 1
+            }), Context())
+            time.sleep(0.5)
+            fallback = collections.Counter(served_by(listing)[0] for _ in range(requests))
+            print('replay paused:', ', '.join(f'{node}={count}' for node, count in sorted(fallback.items())))
+            print('replica status:', db.replica_status())
+        finally:
+            for conn in replicas:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT pg_wal_replay_resume()')
+                conn.close()
+    finally:
+        seed.cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''
+Six separate functions vs the unified router (server/app.py): cold starts, memory and DB connections.
+Usage: DATABASE_URL=postgresql://... python bench/router.py [rounds]
+Each layout runs in fresh processes: one per function for the six-function layout, one for the router.
+Every process replays the GET cases of the tests.json files it serves, `rounds` times.
+'''
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from common import BACKEND, Context, function_names, load_function
+
+ROOT = os.path.dirname(BACKEND)
+
+
+def get_cases(function: str) -> list:
+    from harness import spec_scenarios
+    return [scenario for scenario in spec_scenarios(function, {}) if not scenario.writes]
+
+
+def child(layout: str, functions: list, rounds: int) -> None:
+    started = time.perf_counter()
+    if layout == 'router':
+        sys.path.insert(0, ROOT)
+        from server.app import dispatch, load_handlers
+        load_handlers()
+        call = lambda scenario: dispatch(scenario.event, '/' + scenario.function)
+    else:
+        handler = load_function(functions[0])[0].handler
+        call = lambda scenario: handler(scenario.event, Context())
+    import_ms = (time.perf_counter() - started) * 1000
+    cases = [case for function in functions for case in get_cases(function)]
+    first_ms = None
+    for _ in range(rounds):
+        for case in cases:
+            response = call(case)
+            assert response['statusCode'] == case.expected_status, (case.key, response['statusCode'])
+            if first_ms is None:
+                first_ms = (time.perf_counter() - started) * 1000
+    import db
+    print(json.dumps({
+        'import_ms': import_ms,
+        'first_response_ms': first_ms,
+        'total_ms': (time.perf_counter() - started) * 1000,
+        'rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'connections': sum(pool.opened for pool in db._pools.values()),
+        'requests': rounds * len(cases),
+    }))
+
+
+def spawn(layout: str, functions: list, rounds: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), 'child', layout, ','.join(functions), str(rounds)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == 'child':
+        child(sys.argv[2], sys.argv[3].split(','), int(sys.argv[4]))
+        return
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    functions = function_names()
+    layouts = {
+        'six functions': [spawn('function', [function], rounds) for function in functions],
+        'router': [spawn('router', functions, rounds)],
+    }
+    print(f'{"layout":<14} {"cold starts":>11} {"import":>9} {"1st resp":>9} {"total":>9} {"rss":>9} {"conns":>6} {"reqs":>5}')
+    for label, runs in layouts.items():
+        print(f'{label:<14} {len(runs):>11} '
+              f'{sum(r["import_ms"] for r in runs):7.0f}ms '
+              f'{sum(r["first_response_ms"] or 0 for r in runs):7.0f}ms '
+              f'{sum(r["total_ms"] for r in runs):7.0f}ms '
+              f'{sum(r["rss_kib"] for r in runs) / 1024:6.1f}MiB '
+              f'{sum(r["connections"] for r in runs):>6} '
+              f'{sum(r["requests"] for r in runs):>5}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+Search latency and plans at 1M projects (plus 100k companies and contractors).
+Usage: DATABASE_URL=postgresql://... python bench/search.py [projects] [iterations]
+Seeded rows are marked with the "bench-search-" prefix and removed at the end.
+For every query it prints the p50 handler latency and the indexes the plan used.
+'''
+import json
+import statistics
+import sys
+import time
+
+from common import Context, load_function, make_event
+
+PREFIX = 'bench-search-'
+WORDS = [
+    'сайт', 'портал', 'магазин', 'приложение', 'редизайн', 'интеграция', 'платформа', 'склад',
+    'логистика', 'брендинг', 'аналитика', 'поддержка', 'миграция', 'CRM', 'ERP', 'мобильный',
+]
+QUERIES = ['сайт', 'интеграц', 'мобильный магазин', 'CRM', '7701', 'Логист']
+
+
+def seed(db, projects: int) -> None:
+    conn = db.connect()
+    cur = conn.cursor()
+    words = '{' + ','.join(WORDS) + '}'
+    cur.execute("""
+        INSERT INTO companies (name, inn)
+        SELECT %(prefix)s || (%(words)s::text[])[1 + g %% 16] || ' ' || g, lpad((7700000000 + g)::text, 10, '0')
+        FROM generate_series(1, %(others)s) g
+    """, {'prefix': PREFIX, 'words': words, 'others': projects // 10})
+    cur.execute("""
+        INSERT INTO contractors (name, specialization)
+        SELECT %(prefix)s || g, (%(words)s::text[])[1 + g %% 16] || ' разработчик'
+        FROM generate_series(1, %(others)s) g
+    """, {'prefix': PREFIX, 'words': words, 'others': projects // 10})
+    cur.execute("""
+        INSERT INTO projects (title, description, budget, status)
+        SELECT %(prefix)s || (%(words)s::text[])[1 + g %% 16] || ' ' || (%(words)s::text[])[1 + (g / 16) %% 16] || ' ' || g,
+               'Работы по проекту: ' || (%(words)s::text[])[1 + (g / 256) %% 16],
+               1000 + g %% 500, (ARRAY['planning', 'in_progress', 'completed'])[1 + g %% 3]
+        FROM generate_series(1, %(projects)s) g
+    """, {'prefix': PREFIX, 'words': words, 'projects': projects})
+    cur.execute('ANALYZE projects, companies, contractors')
+    conn.commit()
+    conn.close()
+
+
+def cleanup(db) -> None:
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('DELETE FROM projects WHERE title LIKE %s', (PREFIX + '%',))
+    cur.execute('DELETE FROM contractors WHERE name LIKE %s', (PREFIX + '%',))
+    cur.execute('DELETE FROM companies WHERE name LIKE %s', (PREFIX + '%',))
+    conn.commit()
+    conn.close()
+
+
+def indexes_used(plan: dict) -> set:
+    found = set()
+    if plan.get('Index Name'):
+        found.add(plan['Index Name'])
+    for child in plan.get('Plans', []):
+        found |= indexes_used(child)
+    return found
+
+
+def explain(db, index, text: str) -> tuple:
+    '''Plan the same statement the handler runs and return (execution ms, indexes used)'''
+    sql, args = index.search_query({'q': text, 'limit': '20'})
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, args)
+    plan = cur.fetchone()[0]
+    plan = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+    conn.close()
+    return plan['Execution Time'], indexes_used(plan['Plan'])
+
+
+def main() -> None:
+    projects = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    index, db = load_function('api-reference')
+    seed(db, projects)
+    try:
+        print(f'{projects} projects, {projects // 10} companies, {projects // 10} contractors')
+        for text in QUERIES:
+            event = make_event('GET', {'action': 'search', 'q': text, 'limit': '20'})
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                response = index.handler(event, Context())
+                timings.append((time.perf_counter() - started) * 1000)
+                assert response['statusCode'] == 200, response
+            hits = len(json.loads(response['body'])['items'])
+            execution_ms, used = explain(db, index, text)
+            print(f'{text!r:<22} p50={statistics.median(timings):8.2f}ms  hits={hits:<3} '
+                  f'exec={execution_ms:7.2f}ms  indexes={", ".join(sorted(used)) or "none (seq scan)"}')
+    finally:
+        cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
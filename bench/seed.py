@@ -0,0 +1,176 @@
+'''
+Scalable data generator: the V0002/V0003 demo data multiplied 1x..1000x (or more).
+Usage: DATABASE_URL=postgresql://... python bench/seed.py [scale] | cleanup
+Seeded rows are marked with the "load-" prefix (payments: description "load-test") and removed by cleanup.
+'''
+import sys
+from typing import Dict
+
+from common import load_function
+
+PREFIX = 'load-'
+PAYMENT_DESCRIPTION = 'load-test'
+
+# Rows per unit of scale, matching the demo migrations
+DEMO_COUNTS: Dict[str, int] = {
+    'companies': 3,
+    'contractors': 4,
+    'items': 6,
+    'estimates': 3,
+    'estimate_items': 3,
+    'projects': 3,
+    'project_items': 6,
+    'project_contractors': 7,
+    'payments': 7,
+}
+
+SEED_STATEMENTS = [
+    """
+        INSERT INTO companies (name, inn, contact_person, email, phone, created_at)
+        SELECT %(prefix)s || 'company-' || g, lpad(g::text, 10, '0'), 'Контакт ' || g,
+               'company' || g || '@example.com', '+7900' || lpad(g::text, 7, '0'),
+               TIMESTAMP '2023-01-01' + g * INTERVAL '1 minute'
+        FROM generate_series(1, %(companies)s) g
+    """,
+    """
+        INSERT INTO contractors (name, specialization, email, hourly_rate, created_at)
+        SELECT %(prefix)s || 'contractor-' || g,
+               (ARRAY['Frontend разработчик', 'UX/UI дизайнер', 'Backend разработчик', 'Project Manager'])[1 + g %% 4],
+               'contractor' || g || '@example.com', 2000 + (g %% 11) * 100,
+               TIMESTAMP '2023-01-01' + g * INTERVAL '1 minute'
+        FROM generate_series(1, %(contractors)s) g
+    """,
+    """
+        INSERT INTO items (name, description, type, unit, default_price)
+        SELECT %(prefix)s || 'item-' || g, 'Позиция ' || g,
+               CASE WHEN g %% 3 = 0 THEN 'product' ELSE 'service' END,
+               (ARRAY['шт', 'страница', 'час', 'месяц'])[1 + g %% 4], 1000 + (g %% 50) * 1000
+        FROM generate_series(1, %(items)s) g
+    """,
+    """
+        INSERT INTO estimates (title, company_id, description, estimated_cost, estimated_hours, status, created_at)
+        SELECT %(prefix)s || 'estimate-' || g, c.ids[1 + g %% array_length(c.ids, 1)], 'Оценка ' || g,
+               100000 + (g %% 100) * 10000, 40 + g %% 400,
+               (ARRAY['draft', 'in_review', 'approved'])[1 + g %% 3],
+               TIMESTAMP '2023-01-01' + g * INTERVAL '10 minutes'
+        FROM generate_series(1, %(estimates)s) g,
+             (SELECT array_agg(id) as ids FROM companies WHERE name LIKE %(pattern)s) c
+    """,
+    """
+        INSERT INTO estimate_items (estimate_id, item_id, quantity, unit_price)
+        SELECT e.ids[1 + g %% array_length(e.ids, 1)], i.ids[1 + g %% array_length(i.ids, 1)], 1 + g %% 10, 1000 + (g %% 50) * 1000
+        FROM generate_series(1, %(estimate_items)s) g,
+             (SELECT array_agg(id) as ids FROM estimates WHERE title LIKE %(pattern)s) e,
+             (SELECT array_agg(id) as ids FROM items WHERE name LIKE %(pattern)s) i
+    """,
+    """
+        INSERT INTO projects (title, company_id, estimate_id, description, budget, actual_cost, status, start_date, created_at)
+        SELECT %(prefix)s || 'project-' || g, c.ids[1 + g %% array_length(c.ids, 1)],
+               CASE WHEN g %% 3 = 0 THEN e.ids[1 + g %% array_length(e.ids, 1)] END, 'Проект ' || g,
+               200000 + (g %% 100) * 10000, 0,
+               (ARRAY['planning', 'in_progress', 'completed'])[1 + g %% 3],
+               DATE '2023-01-01' + g %% 900,
+               TIMESTAMP '2023-01-01' + g * INTERVAL '10 minutes'
+        FROM generate_series(1, %(projects)s) g,
+             (SELECT array_agg(id) as ids FROM companies WHERE name LIKE %(pattern)s) c,
+             (SELECT array_agg(id) as ids FROM estimates WHERE title LIKE %(pattern)s) e
+    """,
+    """
+        INSERT INTO project_items (project_id, item_id, quantity, unit_price)
+        SELECT p.ids[1 + g %% array_length(p.ids, 1)], i.ids[1 + g %% array_length(i.ids, 1)], 1 + g %% 10, 1000 + (g %% 50) * 1000
+        FROM generate_series(1, %(project_items)s) g,
+             (SELECT array_agg(id) as ids FROM projects WHERE title LIKE %(pattern)s) p,
+             (SELECT array_agg(id) as ids FROM items WHERE name LIKE %(pattern)s) i
+    """,
+    """
+        INSERT INTO project_contractors (project_id, contractor_id, role, hourly_rate)
+        SELECT p.ids[1 + g %% array_length(p.ids, 1)], k.ids[1 + (g / array_length(p.ids, 1)) %% array_length(k.ids, 1)],
+               (ARRAY['Дизайн', 'Верстка', 'Программирование', 'ПО'])[1 + g %% 4], 2500 + (g %% 4) * 500
+        FROM generate_series(1, %(project_contractors)s) g,
+             (SELECT array_agg(id) as ids FROM projects WHERE title LIKE %(pattern)s) p,
+             (SELECT array_agg(id) as ids FROM contractors WHERE name LIKE %(pattern)s) k
+        ON CONFLICT DO NOTHING
+    """,
+    """
+        INSERT INTO payments (project_id, contractor_id, amount, payment_type, description, payment_date, status)
+        SELECT p.ids[1 + g %% array_length(p.ids, 1)], k.ids[1 + g %% array_length(k.ids, 1)], 10000 + (g %% 50) * 5000,
+               (ARRAY['milestone', 'milestone', 'final', 'income'])[1 + g %% 4], %(description)s,
+               DATE '2023-01-01' + g %% 1000,
+               CASE WHEN g %% 7 = 0 THEN 'pending' ELSE 'completed' END
+        FROM generate_series(1, %(payments)s) g,
+             (SELECT array_agg(id) as ids FROM projects WHERE title LIKE %(pattern)s) p,
+             (SELECT array_agg(id) as ids FROM contractors WHERE name LIKE %(pattern)s) k
+    """,
+]
+
+CLEANUP_STATEMENTS = [
+    """DELETE FROM payments WHERE description = %(description)s
+         OR project_id IN (SELECT id FROM projects WHERE title LIKE %(pattern)s)""",
+    'DELETE FROM project_contractors WHERE project_id IN (SELECT id FROM projects WHERE title LIKE %(pattern)s)',
+    'DELETE FROM project_items WHERE project_id IN (SELECT id FROM projects WHERE title LIKE %(pattern)s)',
+    'DELETE FROM projects WHERE title LIKE %(pattern)s',
+    'DELETE FROM estimate_items WHERE estimate_id IN (SELECT id FROM estimates WHERE title LIKE %(pattern)s)',
+    'DELETE FROM estimates WHERE title LIKE %(pattern)s',
+    'DELETE FROM items WHERE name LIKE %(pattern)s',
+    'DELETE FROM contractors WHERE name LIKE %(pattern)s',
+    'DELETE FROM companies WHERE name LIKE %(pattern)s',
+]
+
+
+def counts(scale: int) -> Dict[str, int]:
+    return {table: count * scale for table, count in DEMO_COUNTS.items()}
+
+
+def seed(db, scale: int) -> Dict[str, int]:
+    '''Insert scale x the demo data in one transaction and bring the maintained aggregates up to date'''
+    params = {'prefix': PREFIX, 'pattern': PREFIX + '%', 'description': PAYMENT_DESCRIPTION, **counts(scale)}
+    conn = db.connect()
+    cur = conn.cursor()
+    for sql in SEED_STATEMENTS:
+        cur.execute(sql, params)
+    cur.execute('SELECT refresh_cash_flow()')
+    cur.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    return counts(scale)
+
+
+def cleanup(db) -> None:
+    params = {'pattern': PREFIX + '%', 'description': PAYMENT_DESCRIPTION}
+    conn = db.connect()
+    cur = conn.cursor()
+    for sql in CLEANUP_STATEMENTS:
+        cur.execute(sql, params)
+    cur.execute('SELECT refresh_cash_flow()')
+    conn.commit()
+    conn.close()
+
+
+def seeded_ids(db) -> Dict[str, int]:
+    '''First seeded id per table, for write scenarios that need valid foreign keys'''
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT (SELECT MIN(id) FROM companies WHERE name LIKE %(pattern)s),
+               (SELECT MIN(id) FROM contractors WHERE name LIKE %(pattern)s),
+               (SELECT MIN(id) FROM projects WHERE title LIKE %(pattern)s),
+               (SELECT MIN(id) FROM items WHERE name LIKE %(pattern)s)
+    """, {'pattern': PREFIX + '%'})
+    company_id, contractor_id, project_id, item_id = cur.fetchone()
+    conn.close()
+    return {'company_id': company_id, 'contractor_id': contractor_id, 'project_id': project_id, 'item_id': item_id}
+
+
+def main() -> None:
+    _, db = load_function('project-management')
+    if len(sys.argv) > 1 and sys.argv[1] == 'cleanup':
+        cleanup(db)
+        print('removed seeded rows')
+        return
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    for table, count in seed(db, scale).items():
+        print(f'{table:<20} {count}')
+
+
+if __name__ == '__main__':
+    main()
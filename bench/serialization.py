@@ -0,0 +1,60 @@
+'''
+Peak RSS and serialization time of the list encoding paths at 100k projects.
+Usage: DATABASE_URL=postgresql://... python bench/serialization.py [rows]
+Each mode runs in its own subprocess so ru_maxrss is not shared between them.
+'''
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from pagination import cleanup, seed
+from common import load_function
+
+QUERY = """
+    SELECT id, title, description, budget, actual_cost, status, start_date, end_date, created_at
+    FROM projects
+    ORDER BY created_at DESC, id DESC
+"""
+
+
+def run_mode(mode: str) -> None:
+    _, db = load_function('api-projects')
+    import responses
+    from psycopg2.extras import RealDictCursor
+
+    conn = db.connect()
+    started = time.perf_counter()
+    if mode == 'fetchall':
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(QUERY)
+        body = json.dumps([dict(row) for row in cur.fetchall()], default=str)
+    else:
+        cur = conn.cursor(name='bench_listing')
+        cur.itersize = responses.ITERSIZE
+        cur.execute(QUERY)
+        body, _ = responses.encode_rows(cur)
+    elapsed = (time.perf_counter() - started) * 1000
+    cur.close()
+    conn.close()
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{mode:<10} time={elapsed:9.1f}ms  peak_rss={peak_mib:8.1f}MiB  body={len(body) / 1024 / 1024:6.1f}MiB')
+
+
+def main() -> None:
+    if len(sys.argv) > 2 and sys.argv[1] == '--mode':
+        run_mode(sys.argv[2])
+        return
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    _, db = load_function('api-projects')
+    seed(db, rows)
+    try:
+        for mode in ('fetchall', 'streaming'):
+            subprocess.run([sys.executable, __file__, '--mode', mode], check=True)
+    finally:
+        cleanup(db)
+
+
+if __name__ == '__main__':
+    main()
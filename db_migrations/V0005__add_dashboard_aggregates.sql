@@ -0,0 +1,214 @@
+-- Incrementally maintained dashboard aggregates (read by api-stats)
+
+-- Single-row counters table
+CREATE TABLE IF NOT EXISTS dashboard_totals (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    total_projects BIGINT NOT NULL DEFAULT 0,
+    active_projects BIGINT NOT NULL DEFAULT 0,
+    completed_projects BIGINT NOT NULL DEFAULT 0,
+    total_budget DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    total_spent DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    total_contractors BIGINT NOT NULL DEFAULT 0,
+    total_estimates BIGINT NOT NULL DEFAULT 0,
+    draft_estimates BIGINT NOT NULL DEFAULT 0,
+    approved_estimates BIGINT NOT NULL DEFAULT 0,
+    total_estimated DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    total_payments DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    payment_count BIGINT NOT NULL DEFAULT 0,
+    pending_payments BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Monthly payment buckets
+CREATE TABLE IF NOT EXISTS monthly_payment_totals (
+    month DATE PRIMARY KEY,
+    total DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    payment_count BIGINT NOT NULL DEFAULT 0
+);
+
+-- Full recompute, used by the rebuild and reconcile commands
+CREATE OR REPLACE VIEW dashboard_totals_recomputed AS
+SELECT
+    p.total_projects, p.active_projects, p.completed_projects, p.total_budget, p.total_spent,
+    c.total_contractors,
+    e.total_estimates, e.draft_estimates, e.approved_estimates, e.total_estimated,
+    pay.total_payments, pay.payment_count, pay.pending_payments
+FROM (
+    SELECT
+        COUNT(*) as total_projects,
+        COUNT(*) FILTER (WHERE status = 'in_progress') as active_projects,
+        COUNT(*) FILTER (WHERE status = 'completed') as completed_projects,
+        COALESCE(SUM(budget), 0) as total_budget,
+        COALESCE(SUM(actual_cost), 0) as total_spent
+    FROM projects
+) p, (
+    SELECT COUNT(*) as total_contractors FROM contractors
+) c, (
+    SELECT
+        COUNT(*) as total_estimates,
+        COUNT(*) FILTER (WHERE status = 'draft') as draft_estimates,
+        COUNT(*) FILTER (WHERE status = 'approved') as approved_estimates,
+        COALESCE(SUM(estimated_cost), 0) as total_estimated
+    FROM estimates
+) e, (
+    SELECT
+        COALESCE(SUM(amount), 0) as total_payments,
+        COUNT(*) as payment_count,
+        COUNT(*) FILTER (WHERE status = 'pending') as pending_payments
+    FROM payments
+) pay;
+
+CREATE OR REPLACE VIEW monthly_payment_totals_recomputed AS
+SELECT
+    DATE_TRUNC('month', payment_date)::date as month,
+    SUM(amount) as total,
+    COUNT(*) as payment_count
+FROM payments
+GROUP BY DATE_TRUNC('month', payment_date)::date;
+
+CREATE OR REPLACE FUNCTION rebuild_dashboard_aggregates() RETURNS void AS $$
+BEGIN
+    LOCK TABLE projects, contractors, estimates, payments IN SHARE MODE;
+
+    INSERT INTO dashboard_totals (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+    UPDATE dashboard_totals t SET
+        total_projects = r.total_projects,
+        active_projects = r.active_projects,
+        completed_projects = r.completed_projects,
+        total_budget = r.total_budget,
+        total_spent = r.total_spent,
+        total_contractors = r.total_contractors,
+        total_estimates = r.total_estimates,
+        draft_estimates = r.draft_estimates,
+        approved_estimates = r.approved_estimates,
+        total_estimated = r.total_estimated,
+        total_payments = r.total_payments,
+        payment_count = r.payment_count,
+        pending_payments = r.pending_payments,
+        updated_at = CURRENT_TIMESTAMP
+    FROM dashboard_totals_recomputed r
+    WHERE t.id = 1;
+
+    DELETE FROM monthly_payment_totals;
+    INSERT INTO monthly_payment_totals (month, total, payment_count)
+    SELECT month, total, payment_count FROM monthly_payment_totals_recomputed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Triggers: apply the OLD row with sign -1 and the NEW row with sign +1
+CREATE OR REPLACE FUNCTION dashboard_projects_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE dashboard_totals SET
+            total_projects = total_projects - 1,
+            active_projects = active_projects - (OLD.status = 'in_progress')::int,
+            completed_projects = completed_projects - (OLD.status = 'completed')::int,
+            total_budget = total_budget - OLD.budget,
+            total_spent = total_spent - COALESCE(OLD.actual_cost, 0),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE dashboard_totals SET
+            total_projects = total_projects + 1,
+            active_projects = active_projects + (NEW.status = 'in_progress')::int,
+            completed_projects = completed_projects + (NEW.status = 'completed')::int,
+            total_budget = total_budget + NEW.budget,
+            total_spent = total_spent + COALESCE(NEW.actual_cost, 0),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_contractors_delta() RETURNS trigger AS $$
+BEGIN
+    UPDATE dashboard_totals SET
+        total_contractors = total_contractors + CASE TG_OP WHEN 'INSERT' THEN 1 ELSE -1 END,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_estimates_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE dashboard_totals SET
+            total_estimates = total_estimates - 1,
+            draft_estimates = draft_estimates - (OLD.status = 'draft')::int,
+            approved_estimates = approved_estimates - (OLD.status = 'approved')::int,
+            total_estimated = total_estimated - OLD.estimated_cost,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE dashboard_totals SET
+            total_estimates = total_estimates + 1,
+            draft_estimates = draft_estimates + (NEW.status = 'draft')::int,
+            approved_estimates = approved_estimates + (NEW.status = 'approved')::int,
+            total_estimated = total_estimated + NEW.estimated_cost,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_payments_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE dashboard_totals SET
+            total_payments = total_payments - OLD.amount,
+            payment_count = payment_count - 1,
+            pending_payments = pending_payments - (OLD.status = 'pending')::int,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+        UPDATE monthly_payment_totals SET
+            total = total - OLD.amount,
+            payment_count = payment_count - 1
+        WHERE month = DATE_TRUNC('month', OLD.payment_date)::date;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE dashboard_totals SET
+            total_payments = total_payments + NEW.amount,
+            payment_count = payment_count + 1,
+            pending_payments = pending_payments + (NEW.status = 'pending')::int,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+        INSERT INTO monthly_payment_totals (month, total, payment_count)
+        VALUES (DATE_TRUNC('month', NEW.payment_date)::date, NEW.amount, 1)
+        ON CONFLICT (month) DO UPDATE SET
+            total = monthly_payment_totals.total + EXCLUDED.total,
+            payment_count = monthly_payment_totals.payment_count + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_dashboard_projects ON projects;
+CREATE TRIGGER trg_dashboard_projects
+    AFTER INSERT OR DELETE OR UPDATE OF budget, actual_cost, status ON projects
+    FOR EACH ROW EXECUTE FUNCTION dashboard_projects_delta();
+
+DROP TRIGGER IF EXISTS trg_dashboard_contractors ON contractors;
+CREATE TRIGGER trg_dashboard_contractors
+    AFTER INSERT OR DELETE ON contractors
+    FOR EACH ROW EXECUTE FUNCTION dashboard_contractors_delta();
+
+DROP TRIGGER IF EXISTS trg_dashboard_estimates ON estimates;
+CREATE TRIGGER trg_dashboard_estimates
+    AFTER INSERT OR DELETE OR UPDATE OF estimated_cost, status ON estimates
+    FOR EACH ROW EXECUTE FUNCTION dashboard_estimates_delta();
+
+DROP TRIGGER IF EXISTS trg_dashboard_payments ON payments;
+CREATE TRIGGER trg_dashboard_payments
+    AFTER INSERT OR DELETE OR UPDATE OF amount, status, payment_date ON payments
+    FOR EACH ROW EXECUTE FUNCTION dashboard_payments_delta();
+
+-- Recent projects are read through this index instead of a full sort
+CREATE INDEX IF NOT EXISTS idx_projects_created ON projects(created_at, id);
+
+-- Seed counters from the existing data
+SELECT rebuild_dashboard_aggregates();
@@ -0,0 +1,25 @@
+-- Keyset pagination on (created_at, id) for projects, estimates and contractors
+
+UPDATE projects SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+UPDATE estimates SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+UPDATE contractors SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE projects ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE estimates ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE contractors ALTER COLUMN created_at SET NOT NULL;
+
+-- projects(created_at, id) already exists as idx_projects_created (V0005)
+CREATE INDEX IF NOT EXISTS idx_projects_status_created ON projects(status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_projects_company_created ON projects(company_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_estimates_created ON estimates(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_estimates_status_created ON estimates(status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_estimates_company_created ON estimates(company_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_contractors_created ON contractors(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_contractors_specialization_created ON contractors(specialization, created_at, id);
+
+-- Superseded by the composite indexes above (same leading column)
+DROP INDEX IF EXISTS idx_projects_status;
+DROP INDEX IF EXISTS idx_projects_company;
+DROP INDEX IF EXISTS idx_estimates_status;
+DROP INDEX IF EXISTS idx_estimates_company;
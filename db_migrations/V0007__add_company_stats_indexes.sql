@@ -0,0 +1,7 @@
+-- Indexes behind api-reference companies-with-stats and company-projects
+
+-- Pending payments are a small slice of history; the partial index keeps the per-company count off the full heap
+CREATE INDEX IF NOT EXISTS idx_payments_pending_project ON payments(project_id) WHERE status = 'pending';
+
+-- Company list ordering
+CREATE INDEX IF NOT EXISTS idx_companies_name ON companies(name);
@@ -0,0 +1,109 @@
+-- Per-project financial rollups maintained by triggers (read by api-projects)
+-- actual_cost = items_total (project_items.total_price) + paid_cost (completed, non-income payments)
+
+ALTER TABLE projects
+  ADD COLUMN IF NOT EXISTS payment_count INTEGER NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS total_paid DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS paid_cost DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS items_total DECIMAL(14, 2) NOT NULL DEFAULT 0;
+
+-- Full recompute, used by the rebuild and reconcile commands
+CREATE OR REPLACE VIEW project_rollups_recomputed AS
+SELECT
+    p.id,
+    COALESCE(pay.payment_count, 0) as payment_count,
+    COALESCE(pay.total_paid, 0) as total_paid,
+    COALESCE(pay.paid_cost, 0) as paid_cost,
+    COALESCE(it.items_total, 0) as items_total,
+    COALESCE(it.items_total, 0) + COALESCE(pay.paid_cost, 0) as actual_cost
+FROM projects p
+LEFT JOIN (
+    SELECT
+        project_id,
+        COUNT(*) as payment_count,
+        SUM(amount) as total_paid,
+        SUM(amount) FILTER (WHERE status = 'completed' AND payment_type <> 'income') as paid_cost
+    FROM payments
+    GROUP BY project_id
+) pay ON pay.project_id = p.id
+LEFT JOIN (
+    SELECT project_id, SUM(total_price) as items_total
+    FROM project_items
+    GROUP BY project_id
+) it ON it.project_id = p.id;
+
+CREATE OR REPLACE FUNCTION rebuild_project_rollups() RETURNS integer AS $$
+DECLARE
+    fixed integer;
+BEGIN
+    UPDATE projects p SET
+        payment_count = r.payment_count,
+        total_paid = r.total_paid,
+        paid_cost = r.paid_cost,
+        items_total = r.items_total,
+        actual_cost = r.actual_cost
+    FROM project_rollups_recomputed r
+    WHERE r.id = p.id
+      AND (p.payment_count, p.total_paid, p.paid_cost, p.items_total, COALESCE(p.actual_cost, 0))
+          IS DISTINCT FROM (r.payment_count, r.total_paid, r.paid_cost, r.items_total, r.actual_cost);
+    GET DIAGNOSTICS fixed = ROW_COUNT;
+    RETURN fixed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION project_rollups_payments_delta() RETURNS trigger AS $$
+DECLARE
+    cost_delta DECIMAL(14, 2);
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        cost_delta := CASE WHEN OLD.status = 'completed' AND OLD.payment_type <> 'income' THEN OLD.amount ELSE 0 END;
+        UPDATE projects SET
+            payment_count = payment_count - 1,
+            total_paid = total_paid - OLD.amount,
+            paid_cost = paid_cost - cost_delta,
+            actual_cost = items_total + paid_cost - cost_delta
+        WHERE id = OLD.project_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        cost_delta := CASE WHEN NEW.status = 'completed' AND NEW.payment_type <> 'income' THEN NEW.amount ELSE 0 END;
+        UPDATE projects SET
+            payment_count = payment_count + 1,
+            total_paid = total_paid + NEW.amount,
+            paid_cost = paid_cost + cost_delta,
+            actual_cost = items_total + paid_cost + cost_delta
+        WHERE id = NEW.project_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION project_rollups_items_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE projects SET
+            items_total = items_total - OLD.total_price,
+            actual_cost = items_total - OLD.total_price + paid_cost
+        WHERE id = OLD.project_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE projects SET
+            items_total = items_total + NEW.total_price,
+            actual_cost = items_total + NEW.total_price + paid_cost
+        WHERE id = NEW.project_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_project_rollups_payments ON payments;
+CREATE TRIGGER trg_project_rollups_payments
+    AFTER INSERT OR DELETE OR UPDATE OF project_id, amount, status, payment_type ON payments
+    FOR EACH ROW EXECUTE FUNCTION project_rollups_payments_delta();
+
+DROP TRIGGER IF EXISTS trg_project_rollups_items ON project_items;
+CREATE TRIGGER trg_project_rollups_items
+    AFTER INSERT OR DELETE OR UPDATE OF project_id, quantity, unit_price ON project_items
+    FOR EACH ROW EXECUTE FUNCTION project_rollups_items_delta();
+
+-- Backfill from existing payments and items
+SELECT rebuild_project_rollups();
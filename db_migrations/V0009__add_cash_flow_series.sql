@@ -0,0 +1,131 @@
+-- Cash-flow time series: daily and monthly payment buckets per project / contractor / company
+-- Payment writes append signed deltas (statement-level triggers, one INSERT per statement);
+-- refresh_cash_flow() folds them into the buckets in one grouped upsert.
+-- project_id / contractor_id use 0 for "none" so they can be part of the bucket key.
+
+CREATE TABLE IF NOT EXISTS cash_flow_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    day DATE NOT NULL,
+    project_id INTEGER NOT NULL,
+    contractor_id INTEGER NOT NULL,
+    flow CHAR(1) NOT NULL,
+    total DECIMAL(14, 2) NOT NULL,
+    completed_total DECIMAL(14, 2) NOT NULL,
+    payment_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cash_flow_deltas_day ON cash_flow_deltas(day);
+
+CREATE TABLE IF NOT EXISTS cash_flow_daily (
+    day DATE NOT NULL,
+    project_id INTEGER NOT NULL,
+    contractor_id INTEGER NOT NULL,
+    flow CHAR(1) NOT NULL,
+    company_id INTEGER NOT NULL,
+    total DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    completed_total DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    payment_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, project_id, contractor_id, flow)
+);
+
+CREATE TABLE IF NOT EXISTS cash_flow_monthly (
+    month DATE NOT NULL,
+    project_id INTEGER NOT NULL,
+    contractor_id INTEGER NOT NULL,
+    flow CHAR(1) NOT NULL,
+    company_id INTEGER NOT NULL,
+    total DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    completed_total DECIMAL(16, 2) NOT NULL DEFAULT 0,
+    payment_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, project_id, contractor_id, flow)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cash_flow_daily_project ON cash_flow_daily(project_id, day);
+CREATE INDEX IF NOT EXISTS idx_cash_flow_daily_contractor ON cash_flow_daily(contractor_id, day);
+CREATE INDEX IF NOT EXISTS idx_cash_flow_daily_company ON cash_flow_daily(company_id, day);
+CREATE INDEX IF NOT EXISTS idx_cash_flow_monthly_project ON cash_flow_monthly(project_id, month);
+CREATE INDEX IF NOT EXISTS idx_cash_flow_monthly_contractor ON cash_flow_monthly(contractor_id, month);
+CREATE INDEX IF NOT EXISTS idx_cash_flow_monthly_company ON cash_flow_monthly(company_id, month);
+
+-- Delta capture
+CREATE OR REPLACE FUNCTION cash_flow_capture() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO cash_flow_deltas (day, project_id, contractor_id, flow, total, completed_total, payment_count)
+        SELECT payment_date, COALESCE(project_id, 0), COALESCE(contractor_id, 0),
+               CASE WHEN payment_type = 'income' THEN 'i' ELSE 'o' END,
+               -amount, CASE WHEN status = 'completed' THEN -amount ELSE 0 END, -1
+        FROM old_rows;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO cash_flow_deltas (day, project_id, contractor_id, flow, total, completed_total, payment_count)
+        SELECT payment_date, COALESCE(project_id, 0), COALESCE(contractor_id, 0),
+               CASE WHEN payment_type = 'income' THEN 'i' ELSE 'o' END,
+               amount, CASE WHEN status = 'completed' THEN amount ELSE 0 END, 1
+        FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_cash_flow_insert ON payments;
+CREATE TRIGGER trg_cash_flow_insert
+    AFTER INSERT ON payments REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cash_flow_capture();
+
+DROP TRIGGER IF EXISTS trg_cash_flow_update ON payments;
+CREATE TRIGGER trg_cash_flow_update
+    AFTER UPDATE ON payments REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cash_flow_capture();
+
+DROP TRIGGER IF EXISTS trg_cash_flow_delete ON payments;
+CREATE TRIGGER trg_cash_flow_delete
+    AFTER DELETE ON payments REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cash_flow_capture();
+
+-- Fold pending deltas into the buckets in one statement
+CREATE OR REPLACE FUNCTION refresh_cash_flow() RETURNS void AS $$
+BEGIN
+    WITH drained AS (
+        DELETE FROM cash_flow_deltas RETURNING *
+    ), batch AS (
+        SELECT d.day, d.project_id, d.contractor_id, d.flow, COALESCE(MAX(p.company_id), 0) as company_id,
+               SUM(d.total) as total, SUM(d.completed_total) as completed_total, SUM(d.payment_count) as payment_count
+        FROM drained d
+        LEFT JOIN projects p ON p.id = d.project_id
+        GROUP BY d.day, d.project_id, d.contractor_id, d.flow
+    ), daily AS (
+        INSERT INTO cash_flow_daily AS b (day, project_id, contractor_id, flow, company_id, total, completed_total, payment_count)
+        SELECT day, project_id, contractor_id, flow, company_id, total, completed_total, payment_count FROM batch
+        ON CONFLICT (day, project_id, contractor_id, flow) DO UPDATE SET
+            total = b.total + EXCLUDED.total,
+            completed_total = b.completed_total + EXCLUDED.completed_total,
+            payment_count = b.payment_count + EXCLUDED.payment_count
+    )
+    INSERT INTO cash_flow_monthly AS b (month, project_id, contractor_id, flow, company_id, total, completed_total, payment_count)
+    SELECT DATE_TRUNC('month', day)::date, project_id, contractor_id, flow, MAX(company_id),
+           SUM(total), SUM(completed_total), SUM(payment_count)
+    FROM batch
+    GROUP BY DATE_TRUNC('month', day)::date, project_id, contractor_id, flow
+    ON CONFLICT (month, project_id, contractor_id, flow) DO UPDATE SET
+        total = b.total + EXCLUDED.total,
+        completed_total = b.completed_total + EXCLUDED.completed_total,
+        payment_count = b.payment_count + EXCLUDED.payment_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_cash_flow() RETURNS void AS $$
+BEGIN
+    LOCK TABLE payments IN SHARE MODE;
+    DELETE FROM cash_flow_deltas;
+    DELETE FROM cash_flow_daily;
+    DELETE FROM cash_flow_monthly;
+    INSERT INTO cash_flow_deltas (day, project_id, contractor_id, flow, total, completed_total, payment_count)
+    SELECT payment_date, COALESCE(project_id, 0), COALESCE(contractor_id, 0),
+           CASE WHEN payment_type = 'income' THEN 'i' ELSE 'o' END,
+           amount, CASE WHEN status = 'completed' THEN amount ELSE 0 END, 1
+    FROM payments;
+    PERFORM refresh_cash_flow();
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_cash_flow();
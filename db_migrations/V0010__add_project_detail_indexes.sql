@@ -0,0 +1,4 @@
+-- project-detail / projects-batch load children with project_id = ANY(...)
+-- payments(project_id) and project_contractors(project_id, ...) are already indexed
+
+CREATE INDEX IF NOT EXISTS idx_project_items_project ON project_items(project_id);
@@ -0,0 +1,43 @@
+-- Search across projects, estimates, companies and contractors (api-reference action=search)
+-- search_vector: stemmed Russian words plus unstemmed 'simple' tokens (names, Latin words, INN digits);
+-- A = titles/names/INN, B = descriptions/specializations.
+-- pg_trgm GIN indexes serve substring matches (ILIKE '%...%') on the same columns.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('simple', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+) STORED;
+
+ALTER TABLE estimates ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('simple', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+) STORED;
+
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', COALESCE(name, '')), 'A') ||
+    setweight(to_tsvector('simple', COALESCE(name, '') || ' ' || COALESCE(inn, '')), 'A') ||
+    setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+) STORED;
+
+ALTER TABLE contractors ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', COALESCE(name, '')), 'A') ||
+    setweight(to_tsvector('simple', COALESCE(name, '')), 'A') ||
+    setweight(to_tsvector('russian', COALESCE(specialization, '')), 'B') ||
+    setweight(to_tsvector('simple', COALESCE(specialization, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_projects_search ON projects USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_estimates_search ON estimates USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_companies_search ON companies USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_contractors_search ON contractors USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_projects_title_trgm ON projects USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_estimates_title_trgm ON estimates USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_companies_name_trgm ON companies USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_companies_inn_trgm ON companies USING GIN (inn gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_contractors_name_trgm ON contractors USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_contractors_specialization_trgm ON contractors USING GIN (specialization gin_trgm_ops);
@@ -0,0 +1,2 @@
+-- Accounting export (api-stats action=export) walks payments in (payment_date, id) keyset chunks
+CREATE INDEX IF NOT EXISTS idx_payments_date ON payments(payment_date, id);
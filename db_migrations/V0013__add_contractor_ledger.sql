@@ -0,0 +1,89 @@
+-- Contractor payout ledger: per-contractor balance snapshots maintained by triggers (read by api-contractors)
+-- total_earned = all payments, total_paid = completed, pending_amount/pending_payments = pending
+
+ALTER TABLE contractors
+  ADD COLUMN IF NOT EXISTS payment_count INTEGER NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS total_earned DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS total_paid DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS pending_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS pending_payments INTEGER NOT NULL DEFAULT 0;
+
+-- Full recompute, used by the rebuild and reconcile commands
+CREATE OR REPLACE VIEW contractor_balances_recomputed AS
+SELECT
+    c.id,
+    COALESCE(pay.payment_count, 0) as payment_count,
+    COALESCE(pay.total_earned, 0) as total_earned,
+    COALESCE(pay.total_paid, 0) as total_paid,
+    COALESCE(pay.pending_amount, 0) as pending_amount,
+    COALESCE(pay.pending_payments, 0) as pending_payments
+FROM contractors c
+LEFT JOIN (
+    SELECT
+        contractor_id,
+        COUNT(*) as payment_count,
+        SUM(amount) as total_earned,
+        SUM(amount) FILTER (WHERE status = 'completed') as total_paid,
+        SUM(amount) FILTER (WHERE status = 'pending') as pending_amount,
+        COUNT(*) FILTER (WHERE status = 'pending') as pending_payments
+    FROM payments
+    WHERE contractor_id IS NOT NULL
+    GROUP BY contractor_id
+) pay ON pay.contractor_id = c.id;
+
+CREATE OR REPLACE FUNCTION rebuild_contractor_balances() RETURNS integer AS $$
+DECLARE
+    fixed integer;
+BEGIN
+    UPDATE contractors c SET
+        payment_count = r.payment_count,
+        total_earned = r.total_earned,
+        total_paid = r.total_paid,
+        pending_amount = r.pending_amount,
+        pending_payments = r.pending_payments
+    FROM contractor_balances_recomputed r
+    WHERE r.id = c.id
+      AND (c.payment_count, c.total_earned, c.total_paid, c.pending_amount, c.pending_payments)
+          IS DISTINCT FROM (r.payment_count, r.total_earned, r.total_paid, r.pending_amount, r.pending_payments);
+    GET DIAGNOSTICS fixed = ROW_COUNT;
+    RETURN fixed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION contractor_balances_payments_delta() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.contractor_id IS NOT NULL THEN
+        UPDATE contractors SET
+            payment_count = payment_count - 1,
+            total_earned = total_earned - OLD.amount,
+            total_paid = total_paid - CASE WHEN OLD.status = 'completed' THEN OLD.amount ELSE 0 END,
+            pending_amount = pending_amount - CASE WHEN OLD.status = 'pending' THEN OLD.amount ELSE 0 END,
+            pending_payments = pending_payments - CASE WHEN OLD.status = 'pending' THEN 1 ELSE 0 END
+        WHERE id = OLD.contractor_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.contractor_id IS NOT NULL THEN
+        UPDATE contractors SET
+            payment_count = payment_count + 1,
+            total_earned = total_earned + NEW.amount,
+            total_paid = total_paid + CASE WHEN NEW.status = 'completed' THEN NEW.amount ELSE 0 END,
+            pending_amount = pending_amount + CASE WHEN NEW.status = 'pending' THEN NEW.amount ELSE 0 END,
+            pending_payments = pending_payments + CASE WHEN NEW.status = 'pending' THEN 1 ELSE 0 END
+        WHERE id = NEW.contractor_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_contractor_balances_payments ON payments;
+CREATE TRIGGER trg_contractor_balances_payments
+    AFTER INSERT OR DELETE OR UPDATE OF contractor_id, amount, status ON payments
+    FOR EACH ROW EXECUTE FUNCTION contractor_balances_payments_delta();
+
+-- Listing order (ORDER BY total_earned DESC) and the per-contractor statement's date ranges;
+-- the statement index also serves every lookup idx_payments_contractor did
+CREATE INDEX IF NOT EXISTS idx_contractors_total_earned ON contractors(total_earned DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_payments_contractor_date ON payments(contractor_id, payment_date, id);
+DROP INDEX IF EXISTS idx_payments_contractor;
+
+-- Backfill from existing payments
+SELECT rebuild_contractor_balances();
@@ -0,0 +1,18 @@
+-- Optimistic concurrency for payment status changes (project-management update-payment-status, bulk-approve-payments)
+-- Every UPDATE bumps version and updated_at, so a writer holding a stale version matches no row.
+ALTER TABLE payments
+  ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1,
+  ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+CREATE OR REPLACE FUNCTION payments_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    NEW.updated_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_payments_touch ON payments;
+CREATE TRIGGER trg_payments_touch
+    BEFORE UPDATE ON payments
+    FOR EACH ROW EXECUTE FUNCTION payments_touch();
@@ -0,0 +1,6 @@
+-- Estimate -> project conversion (api-estimates convert-estimate / convert-estimates)
+-- converted_to_project in the estimates listing becomes an index probe instead of a projects scan per row;
+-- the conversion's INSERT ... SELECT reads estimate_items by estimate_id.
+
+CREATE INDEX IF NOT EXISTS idx_projects_estimate ON projects(estimate_id) WHERE estimate_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_estimate_items_estimate ON estimate_items(estimate_id);
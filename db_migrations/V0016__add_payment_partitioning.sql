@@ -0,0 +1,274 @@
+-- Monthly range partitioning of payments by payment_date (the conversion itself is V0017)
+-- Partitions are named payments_YYYY_MM; dates outside the created months land in payments_default
+-- and move into their month when it is created. Requires PostgreSQL 13+ (BEFORE ROW triggers on partitioned tables).
+
+-- Create the monthly partitions of parent for [from_month, to_month] that do not exist yet
+CREATE OR REPLACE FUNCTION ensure_payment_partitions(parent regclass, from_month date, to_month date) RETURNS integer AS $$
+DECLARE
+    month_start date := DATE_TRUNC('month', from_month)::date;
+    next_month date;
+    partition_name text;
+    default_partition regclass;
+    has_rows boolean;
+    created integer := 0;
+BEGIN
+    SELECT c.oid::regclass INTO default_partition
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = parent AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT';
+
+    WHILE month_start <= to_month LOOP
+        next_month := (month_start + INTERVAL '1 month')::date;
+        partition_name := 'payments_' || TO_CHAR(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            has_rows := false;
+            IF default_partition IS NOT NULL THEN
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s WHERE payment_date >= %L AND payment_date < %L)',
+                               default_partition, month_start, next_month) INTO has_rows;
+            END IF;
+            IF has_rows THEN
+                -- Rows of this month already sit in the default partition: move them into a standalone table
+                -- and attach it. The default partition's row triggers are off during the move, so the
+                -- aggregates do not count it as a delete.
+                EXECUTE format('CREATE TABLE %I (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)',
+                               partition_name, parent);
+                EXECUTE format('ALTER TABLE %s DISABLE TRIGGER USER', default_partition);
+                EXECUTE format('WITH moved AS (DELETE FROM %s WHERE payment_date >= %L AND payment_date < %L RETURNING *) '
+                               'INSERT INTO %I SELECT * FROM moved', default_partition, month_start, next_month, partition_name);
+                EXECUTE format('ALTER TABLE %s ENABLE TRIGGER USER', default_partition);
+                EXECUTE format('ALTER TABLE %s ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                               parent, partition_name, month_start, next_month);
+            ELSE
+                EXECUTE format('CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, parent, month_start, next_month);
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := next_month;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keep months_ahead months of partitions ahead of today; called by project-management on its first payment
+-- write of a month (SECURITY DEFINER, so the function's role needs no DDL rights) and by pg_cron when installed
+CREATE OR REPLACE FUNCTION ensure_future_payment_partitions(months_ahead integer DEFAULT 12) RETURNS integer AS $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'payments'::regclass) <> 'p' THEN
+        RETURN 0;
+    END IF;
+    RETURN ensure_payment_partitions('payments'::regclass, CURRENT_DATE,
+                                     (CURRENT_DATE + make_interval(months => months_ahead))::date);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+-- While payments_partitioned is being filled, every write to payments is mirrored into it
+CREATE OR REPLACE FUNCTION payments_partition_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM payments_partitioned WHERE id = OLD.id AND payment_date = OLD.payment_date;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO payments_partitioned VALUES (NEW.*) ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Step 1: an empty partitioned copy of payments with the same columns, foreign keys, indexes and grants,
+-- monthly partitions from the oldest payment (at most months_back ago) to months_ahead ahead, and the sync trigger
+CREATE OR REPLACE FUNCTION prepare_payments_partitioning(months_back integer DEFAULT 120, months_ahead integer DEFAULT 12)
+RETURNS integer AS $$
+DECLARE
+    r record;
+    first_month date;
+BEGIN
+    IF to_regclass('payments_partitioned') IS NOT NULL THEN
+        RAISE EXCEPTION 'payments_partitioned already exists: finish or abort the running conversion first';
+    END IF;
+
+    CREATE TABLE payments_partitioned (
+        LIKE payments INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE,
+        CONSTRAINT payments_pkey_partitioned PRIMARY KEY (id, payment_date)
+    ) PARTITION BY RANGE (payment_date);
+
+    FOR r IN SELECT conname, pg_get_constraintdef(oid) as def FROM pg_constraint
+             WHERE conrelid = 'payments'::regclass AND contype = 'f' LOOP
+        EXECUTE format('ALTER TABLE payments_partitioned ADD CONSTRAINT %I %s', r.conname, r.def);
+    END LOOP;
+    -- Same definitions under <name>_partitioned; swap_payments_partitioned() gives them the original names
+    FOR r IN SELECT ix.relname, pg_get_indexdef(x.indexrelid) as def FROM pg_index x
+             JOIN pg_class ix ON ix.oid = x.indexrelid
+             WHERE x.indrelid = 'payments'::regclass AND NOT x.indisprimary LOOP
+        EXECUTE regexp_replace(r.def, ' INDEX \S+ ON \S+ ',
+                               format(' INDEX %I ON payments_partitioned ', r.relname || '_partitioned'));
+    END LOOP;
+    FOR r IN SELECT CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(a.grantee)) END as grantee,
+                    string_agg(DISTINCT a.privilege_type, ', ') as privileges
+             FROM pg_class c, aclexplode(c.relacl) a
+             WHERE c.oid = 'payments'::regclass AND a.grantee <> c.relowner
+             GROUP BY 1 LOOP
+        EXECUTE format('GRANT %s ON payments_partitioned TO %s', r.privileges, r.grantee);
+    END LOOP;
+
+    CREATE TABLE payments_default PARTITION OF payments_partitioned DEFAULT;
+    first_month := GREATEST(COALESCE((SELECT MIN(payment_date) FROM payments), CURRENT_DATE),
+                            (CURRENT_DATE - make_interval(months => months_back))::date);
+    PERFORM ensure_payment_partitions('payments_partitioned'::regclass, first_month,
+                                      (CURRENT_DATE + make_interval(months => months_ahead))::date);
+
+    CREATE TRIGGER trg_payments_partition_sync
+        AFTER INSERT OR UPDATE OR DELETE ON payments
+        FOR EACH ROW EXECUTE FUNCTION payments_partition_sync();
+    RETURN (SELECT COUNT(*) FROM pg_inherits WHERE inhparent = 'payments_partitioned'::regclass)::integer;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Step 3 (step 2 copies the rows): swap the tables under one ACCESS EXCLUSIVE lock. The old table becomes
+-- payments_unpartitioned; triggers, dependent views, index names and the id sequence move to the new payments.
+CREATE OR REPLACE FUNCTION swap_payments_partitioned(verify boolean DEFAULT true) RETURNS void AS $$
+DECLARE
+    r record;
+    trigger_defs text[];
+    view_names text[];
+    view_defs text[];
+    n integer;
+BEGIN
+    LOCK TABLE payments, payments_partitioned IN ACCESS EXCLUSIVE MODE;
+    IF verify AND (SELECT COUNT(*) FROM payments) <> (SELECT COUNT(*) FROM payments_partitioned) THEN
+        RAISE EXCEPTION 'payments_partitioned is missing rows: run the backfill again before swapping';
+    END IF;
+
+    -- Definitions are captured while they still read "payments", so replaying them binds to the new table
+    SELECT array_agg(pg_get_triggerdef(oid)) INTO trigger_defs FROM pg_trigger
+    WHERE tgrelid = 'payments'::regclass AND NOT tgisinternal AND tgname <> 'trg_payments_partition_sync';
+    SELECT array_agg(c.oid::regclass::text), array_agg(pg_get_viewdef(c.oid)) INTO view_names, view_defs
+    FROM pg_class c
+    WHERE c.relkind = 'v' AND c.oid IN (
+        SELECT rw.ev_class FROM pg_depend d JOIN pg_rewrite rw ON rw.oid = d.objid
+        WHERE d.classid = 'pg_rewrite'::regclass AND d.refobjid = 'payments'::regclass
+    );
+
+    FOR r IN SELECT tgname FROM pg_trigger WHERE tgrelid = 'payments'::regclass AND NOT tgisinternal LOOP
+        EXECUTE format('DROP TRIGGER %I ON payments', r.tgname);
+    END LOOP;
+    ALTER TABLE payments RENAME TO payments_unpartitioned;
+    FOR r IN SELECT ix.relname FROM pg_index x JOIN pg_class ix ON ix.oid = x.indexrelid
+             WHERE x.indrelid = 'payments_unpartitioned'::regclass LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', r.relname, r.relname || '_unpartitioned');
+    END LOOP;
+
+    ALTER TABLE payments_partitioned RENAME TO payments;
+    FOR r IN SELECT ix.relname FROM pg_index x JOIN pg_class ix ON ix.oid = x.indexrelid
+             WHERE x.indrelid = 'payments'::regclass AND ix.relname LIKE '%\_partitioned' LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', r.relname, left(r.relname, length(r.relname) - length('_partitioned')));
+    END LOOP;
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY payments.id', pg_get_serial_sequence('payments_unpartitioned', 'id'));
+
+    FOR n IN 1 .. COALESCE(array_length(trigger_defs, 1), 0) LOOP
+        EXECUTE trigger_defs[n];
+    END LOOP;
+    FOR n IN 1 .. COALESCE(array_length(view_names, 1), 0) LOOP
+        EXECUTE format('CREATE OR REPLACE VIEW %s AS %s', view_names[n], view_defs[n]);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Per-project payment date bounds, so api-projects can restrict a project's payments to the partitions that
+-- can hold them. Writes only widen the bounds (a delete leaves them as they were); rebuild makes them exact.
+ALTER TABLE projects
+  ADD COLUMN IF NOT EXISTS payments_from DATE,
+  ADD COLUMN IF NOT EXISTS payments_to DATE;
+
+CREATE OR REPLACE VIEW project_rollups_recomputed AS
+SELECT
+    p.id,
+    COALESCE(pay.payment_count, 0) as payment_count,
+    COALESCE(pay.total_paid, 0) as total_paid,
+    COALESCE(pay.paid_cost, 0) as paid_cost,
+    COALESCE(it.items_total, 0) as items_total,
+    COALESCE(it.items_total, 0) + COALESCE(pay.paid_cost, 0) as actual_cost,
+    pay.payments_from,
+    pay.payments_to
+FROM projects p
+LEFT JOIN (
+    SELECT
+        project_id,
+        COUNT(*) as payment_count,
+        SUM(amount) as total_paid,
+        SUM(amount) FILTER (WHERE status = 'completed' AND payment_type <> 'income') as paid_cost,
+        MIN(payment_date) as payments_from,
+        MAX(payment_date) as payments_to
+    FROM payments
+    GROUP BY project_id
+) pay ON pay.project_id = p.id
+LEFT JOIN (
+    SELECT project_id, SUM(total_price) as items_total
+    FROM project_items
+    GROUP BY project_id
+) it ON it.project_id = p.id;
+
+CREATE OR REPLACE FUNCTION rebuild_project_rollups() RETURNS integer AS $$
+DECLARE
+    fixed integer;
+BEGIN
+    UPDATE projects p SET
+        payment_count = r.payment_count,
+        total_paid = r.total_paid,
+        paid_cost = r.paid_cost,
+        items_total = r.items_total,
+        actual_cost = r.actual_cost,
+        payments_from = r.payments_from,
+        payments_to = r.payments_to
+    FROM project_rollups_recomputed r
+    WHERE r.id = p.id
+      AND (p.payment_count, p.total_paid, p.paid_cost, p.items_total, COALESCE(p.actual_cost, 0), p.payments_from, p.payments_to)
+          IS DISTINCT FROM (r.payment_count, r.total_paid, r.paid_cost, r.items_total, r.actual_cost, r.payments_from, r.payments_to);
+    GET DIAGNOSTICS fixed = ROW_COUNT;
+    RETURN fixed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION project_rollups_payments_delta() RETURNS trigger AS $$
+DECLARE
+    cost_delta DECIMAL(14, 2);
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        cost_delta := CASE WHEN OLD.status = 'completed' AND OLD.payment_type <> 'income' THEN OLD.amount ELSE 0 END;
+        UPDATE projects SET
+            payment_count = payment_count - 1,
+            total_paid = total_paid - OLD.amount,
+            paid_cost = paid_cost - cost_delta,
+            actual_cost = items_total + paid_cost - cost_delta
+        WHERE id = OLD.project_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        cost_delta := CASE WHEN NEW.status = 'completed' AND NEW.payment_type <> 'income' THEN NEW.amount ELSE 0 END;
+        UPDATE projects SET
+            payment_count = payment_count + 1,
+            total_paid = total_paid + NEW.amount,
+            paid_cost = paid_cost + cost_delta,
+            actual_cost = items_total + paid_cost + cost_delta,
+            payments_from = LEAST(payments_from, NEW.payment_date),
+            payments_to = GREATEST(payments_to, NEW.payment_date)
+        WHERE id = NEW.project_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_project_rollups_payments ON payments;
+CREATE TRIGGER trg_project_rollups_payments
+    AFTER INSERT OR DELETE OR UPDATE OF project_id, amount, status, payment_type, payment_date ON payments
+    FOR EACH ROW EXECUTE FUNCTION project_rollups_payments_delta();
+
+-- Monthly top-up of future partitions where pg_cron is available
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('ensure-payment-partitions', '0 3 1 * *', 'SELECT ensure_future_payment_partitions()');
+    END IF;
+END $$;
+
+-- Backfill the bounds
+SELECT rebuild_project_rollups();
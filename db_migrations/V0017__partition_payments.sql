@@ -0,0 +1,18 @@
+-- Convert payments into the monthly partitioned table (functions in V0016).
+-- This copies every row under an exclusive lock, which suits small tables and fresh databases. Large tables
+-- should run scripts/partition_payments.py first: it does the same conversion online, and this migration
+-- then finds payments already partitioned and skips.
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'payments'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+    LOCK TABLE payments IN ACCESS EXCLUSIVE MODE;
+    PERFORM prepare_payments_partitioning();
+    INSERT INTO payments_partitioned SELECT * FROM payments;
+    PERFORM swap_payments_partitioned(false);
+    DROP TABLE payments_unpartitioned;
+END $$;
+
+-- Autovacuum never analyzes a partitioned parent, and the planner needs its statistics
+ANALYZE payments;
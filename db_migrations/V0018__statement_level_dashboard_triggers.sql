@@ -0,0 +1,186 @@
+-- Dashboard aggregates (V0005) and project rollups (V0008/V0016) maintained per statement instead of per row.
+-- Row triggers updated the single dashboard_totals row once per changed row, so every writer queued on that
+-- row lock and a set-based insert or bulk approve of N rows became N updates of it. The statement triggers
+-- read the transition tables and apply one aggregated delta per statement, as the cash-flow capture (V0009) does.
+-- Transition tables allow neither several events nor UPDATE OF column lists on one trigger, so each table
+-- gets an INSERT, an UPDATE and a DELETE trigger, and statements whose delta nets to zero write nothing.
+
+-- The rows of the firing statement's transition tables with a sign (+1 new_rows, -1 old_rows), as SQL text
+-- for EXECUTE inside a statement trigger; columns is the select list taken from each side
+CREATE OR REPLACE FUNCTION transition_rows(op text, columns text) RETURNS text AS $$
+    SELECT CASE op
+        WHEN 'INSERT' THEN format('SELECT 1 as sign, %s FROM new_rows', columns)
+        WHEN 'DELETE' THEN format('SELECT -1 as sign, %s FROM old_rows', columns)
+        ELSE format('SELECT 1 as sign, %1$s FROM new_rows UNION ALL SELECT -1 as sign, %1$s FROM old_rows', columns)
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION dashboard_projects_delta() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format($sql$
+        UPDATE dashboard_totals t SET
+            total_projects = t.total_projects + d.projects,
+            active_projects = t.active_projects + d.active,
+            completed_projects = t.completed_projects + d.completed,
+            total_budget = t.total_budget + d.budget,
+            total_spent = t.total_spent + d.spent,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT
+                COALESCE(SUM(sign), 0) as projects,
+                COALESCE(SUM(sign) FILTER (WHERE status = 'in_progress'), 0) as active,
+                COALESCE(SUM(sign) FILTER (WHERE status = 'completed'), 0) as completed,
+                COALESCE(SUM(sign * budget), 0) as budget,
+                COALESCE(SUM(sign * actual_cost), 0) as spent
+            FROM (%s) r
+        ) d
+        WHERE t.id = 1 AND (d.projects, d.active, d.completed, d.budget, d.spent) <> (0, 0, 0, 0, 0)
+    $sql$, transition_rows(TG_OP, 'status, budget, COALESCE(actual_cost, 0) as actual_cost'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_contractors_delta() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format($sql$
+        UPDATE dashboard_totals t SET
+            total_contractors = t.total_contractors + d.contractors,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (SELECT COALESCE(SUM(sign), 0) as contractors FROM (%s) r) d
+        WHERE t.id = 1 AND d.contractors <> 0
+    $sql$, transition_rows(TG_OP, 'id'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_estimates_delta() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format($sql$
+        UPDATE dashboard_totals t SET
+            total_estimates = t.total_estimates + d.estimates,
+            draft_estimates = t.draft_estimates + d.draft,
+            approved_estimates = t.approved_estimates + d.approved,
+            total_estimated = t.total_estimated + d.estimated,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT
+                COALESCE(SUM(sign), 0) as estimates,
+                COALESCE(SUM(sign) FILTER (WHERE status = 'draft'), 0) as draft,
+                COALESCE(SUM(sign) FILTER (WHERE status = 'approved'), 0) as approved,
+                COALESCE(SUM(sign * estimated_cost), 0) as estimated
+            FROM (%s) r
+        ) d
+        WHERE t.id = 1 AND (d.estimates, d.draft, d.approved, d.estimated) <> (0, 0, 0, 0)
+    $sql$, transition_rows(TG_OP, 'status, estimated_cost'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_payments_delta() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH r AS (%s), totals AS (
+            UPDATE dashboard_totals t SET
+                total_payments = t.total_payments + d.total,
+                payment_count = t.payment_count + d.payments,
+                pending_payments = t.pending_payments + d.pending,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT
+                    COALESCE(SUM(sign * amount), 0) as total,
+                    COALESCE(SUM(sign), 0) as payments,
+                    COALESCE(SUM(sign) FILTER (WHERE status = 'pending'), 0) as pending
+                FROM r
+            ) d
+            WHERE t.id = 1 AND (d.total, d.payments, d.pending) <> (0, 0, 0)
+        )
+        INSERT INTO monthly_payment_totals AS m (month, total, payment_count)
+        SELECT DATE_TRUNC('month', payment_date)::date, SUM(sign * amount), SUM(sign)
+        FROM r
+        GROUP BY 1
+        HAVING (SUM(sign * amount), SUM(sign)) <> (0, 0)
+        ON CONFLICT (month) DO UPDATE SET
+            total = m.total + EXCLUDED.total,
+            payment_count = m.payment_count + EXCLUDED.payment_count
+    $sql$, transition_rows(TG_OP, 'amount, status, payment_date'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One UPDATE of projects per statement, so the dashboard trigger on projects also fires once
+CREATE OR REPLACE FUNCTION project_rollups_payments_delta() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format($sql$
+        UPDATE projects p SET
+            payment_count = p.payment_count + d.payment_count,
+            total_paid = p.total_paid + d.total_paid,
+            paid_cost = p.paid_cost + d.paid_cost,
+            actual_cost = p.items_total + p.paid_cost + d.paid_cost,
+            payments_from = LEAST(p.payments_from, d.payments_from),
+            payments_to = GREATEST(p.payments_to, d.payments_to)
+        FROM (
+            SELECT
+                project_id,
+                SUM(sign) as payment_count,
+                SUM(sign * amount) as total_paid,
+                COALESCE(SUM(sign * amount) FILTER (WHERE status = 'completed' AND payment_type <> 'income'), 0) as paid_cost,
+                MIN(payment_date) FILTER (WHERE sign = 1) as payments_from,
+                MAX(payment_date) FILTER (WHERE sign = 1) as payments_to
+            FROM (%s) r
+            WHERE project_id IS NOT NULL
+            GROUP BY project_id
+        ) d
+        WHERE p.id = d.project_id
+          AND ((d.payment_count, d.total_paid, d.paid_cost) <> (0, 0, 0)
+               OR (LEAST(p.payments_from, d.payments_from), GREATEST(p.payments_to, d.payments_to))
+                  IS DISTINCT FROM (p.payments_from, p.payments_to))
+    $sql$, transition_rows(TG_OP, 'project_id, amount, status, payment_type, payment_date'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION project_rollups_items_delta() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format($sql$
+        UPDATE projects p SET
+            items_total = p.items_total + d.items_total,
+            actual_cost = p.items_total + d.items_total + p.paid_cost
+        FROM (
+            SELECT project_id, SUM(sign * total_price) as items_total
+            FROM (%s) r
+            WHERE project_id IS NOT NULL
+            GROUP BY project_id
+        ) d
+        WHERE p.id = d.project_id AND d.items_total <> 0
+    $sql$, transition_rows(TG_OP, 'project_id, total_price'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replace the row triggers: (table, trigger name prefix, function)
+DO $$
+DECLARE
+    t record;
+BEGIN
+    FOR t IN SELECT * FROM (VALUES
+        ('projects', 'trg_dashboard_projects', 'dashboard_projects_delta'),
+        ('contractors', 'trg_dashboard_contractors', 'dashboard_contractors_delta'),
+        ('estimates', 'trg_dashboard_estimates', 'dashboard_estimates_delta'),
+        ('payments', 'trg_dashboard_payments', 'dashboard_payments_delta'),
+        ('payments', 'trg_project_rollups_payments', 'project_rollups_payments_delta'),
+        ('project_items', 'trg_project_rollups_items', 'project_rollups_items_delta')
+    ) v(tbl, name, func) LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t.name, t.tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t.name || '_insert', t.tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t.name || '_update', t.tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t.name || '_delete', t.tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION %I()', t.name || '_insert', t.tbl, t.func);
+        IF t.tbl <> 'contractors' THEN
+            EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+                           'FOR EACH STATEMENT EXECUTE FUNCTION %I()', t.name || '_update', t.tbl, t.func);
+        END IF;
+        EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION %I()', t.name || '_delete', t.tbl, t.func);
+    END LOOP;
+END $$;
@@ -0,0 +1,26 @@
+-- Version counters for the cached reference lists (reference_cache.py in api-reference and project-management)
+-- Any statement on companies or items bumps its list's counter, so each function's cache notices writes made
+-- through the other one on the next read instead of after REFERENCE_CACHE_TTL_SECONDS.
+CREATE TABLE IF NOT EXISTS reference_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO reference_versions (name) VALUES ('companies'), ('items') ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION reference_versions_bump() RETURNS trigger AS $$
+BEGIN
+    UPDATE reference_versions SET version = version + 1 WHERE name = TG_ARGV[0];
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_reference_versions_companies ON companies;
+CREATE TRIGGER trg_reference_versions_companies
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON companies
+    FOR EACH STATEMENT EXECUTE FUNCTION reference_versions_bump('companies');
+
+DROP TRIGGER IF EXISTS trg_reference_versions_items ON items;
+CREATE TRIGGER trg_reference_versions_items
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON items
+    FOR EACH STATEMENT EXECUTE FUNCTION reference_versions_bump('items');
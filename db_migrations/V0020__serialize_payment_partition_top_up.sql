@@ -0,0 +1,14 @@
+-- Serialize the monthly partition top-up (V0016). Containers calling it at the same time all saw the month's
+-- partitions missing and raced on CREATE TABLE, so the loser failed with "relation already exists". The
+-- transaction-scoped advisory lock makes the later callers wait for the first one's commit; they then find
+-- the partitions in place and create nothing.
+CREATE OR REPLACE FUNCTION ensure_future_payment_partitions(months_ahead integer DEFAULT 12) RETURNS integer AS $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'payments'::regclass) <> 'p' THEN
+        RETURN 0;
+    END IF;
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_future_payment_partitions'));
+    RETURN ensure_payment_partitions('payments'::regclass, CURRENT_DATE,
+                                     (CURRENT_DATE + make_interval(months => months_ahead))::date);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
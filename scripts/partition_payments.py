@@ -0,0 +1,184 @@
+'''
+Online conversion of payments into the monthly partitioned table (db_migrations V0016/V0017).
+Usage: DATABASE_URL=postgresql://... python scripts/partition_payments.py [--batch N] [--pause S] [--from-id N] [--swap] [--drop-old]
+       DATABASE_URL=postgresql://... python scripts/partition_payments.py --abort
+
+Run it after V0016 and before V0017, which then skips. Steps:
+ 1. prepare_payments_partitioning() creates payments_partitioned and its partitions, plus a trigger that
+    mirrors every write to payments into it from then on.
+ 2. The existing rows are copied in id batches, one short transaction each (FOR SHARE, so a row updated
+    mid-batch is copied in its committed state). A stopped run can be resumed with --from-id.
+ 3. --swap first compares the row counts of both tables per id range, in short transactions, and re-copies any
+    range that differs. Under the ACCESS EXCLUSIVE lock (retried while lock_timeout expires) it then only checks
+    the rows above that verified id, renames the tables and analyzes the new parent. The old table stays as
+    payments_unpartitioned until --drop-old.
+'''
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.errors
+
+SWAP_LOCK_TIMEOUT = '3s'
+SWAP_ATTEMPTS = 10
+
+RANGE_COUNTS_SQL = """
+    SELECT (SELECT COUNT(*) FROM payments WHERE id > %(start)s AND id <= %(end)s),
+           (SELECT COUNT(*) FROM payments_partitioned WHERE id > %(start)s AND id <= %(end)s)
+"""
+
+
+def table_exists(cur, name: str) -> bool:
+    cur.execute('SELECT to_regclass(%s) IS NOT NULL', (name,))
+    return cur.fetchone()[0]
+
+
+def prepare(conn) -> None:
+    cur = conn.cursor()
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = 'payments'::regclass")
+    if cur.fetchone()[0] == 'p':
+        sys.exit('payments is already partitioned')
+    if table_exists(cur, 'payments_partitioned'):
+        print('payments_partitioned exists, resuming')
+        return
+    cur.execute('SELECT prepare_payments_partitioning()')
+    partitions = cur.fetchone()[0]
+    conn.commit()
+    print(f'created payments_partitioned with {partitions} partitions and the sync trigger')
+
+
+def backfill(conn, batch: int, pause: float, from_id: int) -> int:
+    cur = conn.cursor()
+    # Rows above this id were written after the sync trigger existed, so they are already mirrored
+    cur.execute('SELECT COALESCE(MAX(id), 0) FROM payments')
+    last_id = cur.fetchone()[0]
+    conn.commit()
+    started = time.perf_counter()
+    copied = 0
+    for start in range(from_id, last_id, batch):
+        cur.execute("""
+            INSERT INTO payments_partitioned
+            SELECT * FROM payments WHERE id > %s AND id <= %s FOR SHARE
+            ON CONFLICT DO NOTHING
+        """, (start, start + batch))
+        copied += cur.rowcount
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        print(f'\rcopied through id {min(start + batch, last_id)} of {last_id}: {copied} rows, '
+              f'{copied / elapsed if elapsed else 0:,.0f} rows/s', end='', flush=True)
+        if pause:
+            time.sleep(pause)
+    print()
+    return last_id
+
+
+def verify(conn, batch: int) -> int:
+    """Row counts of both tables per id range; ranges that differ are copied again. Returns the verified max id."""
+    cur = conn.cursor()
+    cur.execute('SELECT COALESCE(MAX(id), 0) FROM payments')
+    last_id = cur.fetchone()[0]
+    conn.commit()
+    repaired = 0
+    for start in range(0, last_id, batch):
+        for attempt in range(2):
+            cur.execute(RANGE_COUNTS_SQL, {'start': start, 'end': start + batch})
+            source, copy = cur.fetchone()
+            conn.commit()
+            if source == copy:
+                break
+            if attempt:
+                sys.exit(f'ids {start + 1}..{start + batch}: {source} rows in payments, {copy} in payments_partitioned '
+                         'after re-copying; investigate before swapping')
+            cur.execute("""
+                DELETE FROM payments_partitioned c
+                WHERE c.id > %(start)s AND c.id <= %(end)s AND NOT EXISTS (SELECT 1 FROM payments p WHERE p.id = c.id)
+            """, {'start': start, 'end': start + batch})
+            cur.execute("""
+                INSERT INTO payments_partitioned
+                SELECT * FROM payments WHERE id > %(start)s AND id <= %(end)s FOR SHARE
+                ON CONFLICT DO NOTHING
+            """, {'start': start, 'end': start + batch})
+            conn.commit()
+            repaired += 1
+        print(f'\rverified through id {min(start + batch, last_id)} of {last_id}', end='', flush=True)
+    print(f' ({repaired} ranges re-copied)' if repaired else '')
+    return last_id
+
+
+def swap(conn, verified_id: int) -> None:
+    cur = conn.cursor()
+    for attempt in range(1, SWAP_ATTEMPTS + 1):
+        try:
+            cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+            started = time.perf_counter()
+            cur.execute('LOCK TABLE payments, payments_partitioned IN ACCESS EXCLUSIVE MODE')
+            # Writes since verify() went through the sync trigger; only rows above the verified id are compared
+            cur.execute(RANGE_COUNTS_SQL, {'start': verified_id, 'end': 2 ** 62})
+            source, copy = cur.fetchone()
+            if source != copy:
+                conn.rollback()
+                sys.exit(f'{source} rows above id {verified_id} in payments, {copy} in payments_partitioned; '
+                         'is the sync trigger enabled?')
+            cur.execute('SELECT swap_payments_partitioned(false)')
+            conn.commit()
+            print(f'swapped in {(time.perf_counter() - started) * 1000:.0f}ms (attempt {attempt})')
+            break
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            print(f'lock not granted within {SWAP_LOCK_TIMEOUT}, retrying')
+    else:
+        sys.exit('could not lock payments for the swap; try again when traffic is lower')
+    cur.execute('ANALYZE payments')
+    conn.commit()
+
+
+def drop_old(conn) -> None:
+    cur = conn.cursor()
+    cur.execute('DROP TABLE IF EXISTS payments_unpartitioned')
+    conn.commit()
+    print('dropped payments_unpartitioned')
+
+
+def abort(conn) -> None:
+    '''Remove the sync trigger and the half-built table (its partitions go with it)'''
+    cur = conn.cursor()
+    cur.execute('DROP TRIGGER IF EXISTS trg_payments_partition_sync ON payments')
+    cur.execute('DROP TABLE IF EXISTS payments_partitioned')
+    conn.commit()
+    print('removed payments_partitioned and the sync trigger')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Convert payments into monthly partitions without downtime')
+    parser.add_argument('--batch', type=int, default=50000, help='rows per backfill transaction')
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between batches')
+    parser.add_argument('--from-id', type=int, default=0, help='resume the backfill after this id')
+    parser.add_argument('--swap', action='store_true', help='swap the tables once the backfill is done')
+    parser.add_argument('--drop-old', action='store_true', help='drop payments_unpartitioned')
+    parser.add_argument('--abort', action='store_true', help='undo an unfinished conversion')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        if args.abort:
+            abort(conn)
+            return
+        if args.drop_old and not args.swap:
+            drop_old(conn)
+            return
+        prepare(conn)
+        last_id = backfill(conn, args.batch, args.pause, args.from_id)
+        if args.swap:
+            swap(conn, verify(conn, args.batch))
+            if args.drop_old:
+                drop_old(conn)
+        else:
+            print(f'backfill done; run again with --swap --from-id {last_id} to switch over')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
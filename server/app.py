@@ -0,0 +1,239 @@
+'''
+Optional single-process entrypoint serving every backend function from one warm runtime.
+The cloud functions stay the deployment unit on poehali.dev; this is for self-hosting and local runs.
+All handlers share one db pool, one reference cache and one set of imports.
+
+Routing: /<function>[/...] (e.g. /api-stats?action=cash-flow) goes to that function's handler;
+any other path is routed by ?action= through ACTION_ROUTES.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m server.app [--host 127.0.0.1] [--port 8000] [--workers 4]
+    gunicorn -w 4 server.app:application            (WSGI)
+    uvicorn --workers 4 server.app:asgi              (ASGI)
+'''
+import argparse
+import asyncio
+import base64
+import importlib.util
+import os
+import signal
+import sys
+import uuid
+from socketserver import ThreadingMixIn
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+BACKEND = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+# action -> function for requests that do not name a function in the path.
+# companies/items are served by both api-reference and project-management from the same cache.
+ACTION_ROUTES: Dict[str, str] = {
+    'companies': 'api-reference',
+    'items': 'api-reference',
+    'companies-with-stats': 'api-reference',
+    'company-projects': 'api-reference',
+    'create-company': 'api-reference',
+    'search': 'api-reference',
+    'convert-estimate': 'api-estimates',
+    'convert-estimates': 'api-estimates',
+    'create-contractor': 'api-contractors',
+    'contractor-statement': 'api-contractors',
+    'project-detail': 'api-projects',
+    'projects-batch': 'api-projects',
+    'cash-flow': 'api-stats',
+    'reconcile': 'api-stats',
+    'rebuild': 'api-stats',
+    'export': 'api-stats',
+    'forecast': 'api-stats',
+    'create-project': 'project-management',
+    'create-estimate': 'project-management',
+    'bulk-import': 'project-management',
+    'create-payment': 'project-management',
+    'update-payment-status': 'project-management',
+    'bulk-approve-payments': 'project-management',
+    'create-item': 'project-management',
+    'debug': 'project-management',
+}
+
+HTTP_STATUS = {
+    200: 'OK', 201: 'Created', 204: 'No Content', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error',
+}
+
+_handlers: Dict[str, Callable[[Dict[str, Any], Any], Dict[str, Any]]] = {}
+
+
+class Context:
+    def __init__(self, function_name: str):
+        self.request_id = uuid.uuid4().hex
+        self.function_name = function_name
+
+
+def function_names() -> List[str]:
+    return sorted(
+        name for name in os.listdir(BACKEND)
+        if os.path.isfile(os.path.join(BACKEND, name, 'index.py'))
+    )
+
+
+def load_handlers() -> Dict[str, Callable[[Dict[str, Any], Any], Dict[str, Any]]]:
+    '''
+    Import every backend/<function>/index.py once, under its own module name.
+    The shared helpers (db, responses, reference_cache) are identical copies, so the first one
+    on sys.path serves every function and there is one pool and one cache per process.
+    '''
+    if _handlers:
+        return _handlers
+    names = function_names()
+    for name in names:
+        path = os.path.join(BACKEND, name)
+        if path not in sys.path:
+            sys.path.append(path)
+    for name in names:
+        module_name = 'function_' + name.replace('-', '_')
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(BACKEND, name, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        _handlers[name] = module.handler
+    return _handlers
+
+
+def resolve(path: str, params: Dict[str, str]) -> Optional[str]:
+    handlers = load_handlers()
+    segment = path.strip('/').split('/', 1)[0]
+    if segment in handlers:
+        return segment
+    return ACTION_ROUTES.get(params.get('action', ''))
+
+
+def dispatch(event: Dict[str, Any], path: str = '/') -> Dict[str, Any]:
+    '''Route a cloud-function event to the matching handler'''
+    function = resolve(path, event.get('queryStringParameters') or {})
+    if function is None:
+        return {'statusCode': 404, 'headers': {'Access-Control-Allow-Origin': '*'}, 'body': '', 'isBase64Encoded': False}
+    return load_handlers()[function](event, Context(function))
+
+
+def _event(method: str, query: str, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+    event: Dict[str, Any] = {
+        'httpMethod': method,
+        'queryStringParameters': dict(parse_qsl(query)),
+        'headers': headers,
+        'isBase64Encoded': False,
+    }
+    if body:
+        try:
+            event['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            event['body'] = base64.b64encode(body).decode()
+            event['isBase64Encoded'] = True
+    return event
+
+
+def _response_parts(response: Dict[str, Any]) -> Tuple[int, List[Tuple[str, str]], bytes]:
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        payload = base64.b64decode(body)
+    else:
+        payload = body.encode('utf-8') if isinstance(body, str) else body
+    headers = [(key, str(value)) for key, value in (response.get('headers') or {}).items()]
+    headers.append(('Content-Length', str(len(payload))))
+    return int(response.get('statusCode', 200)), headers, payload
+
+
+def application(environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+    '''WSGI entrypoint'''
+    headers = {
+        key[5:].replace('_', '-').title(): value
+        for key, value in environ.items() if key.startswith('HTTP_')
+    }
+    if environ.get('CONTENT_TYPE'):
+        headers['Content-Type'] = environ['CONTENT_TYPE']
+    length = int(environ.get('CONTENT_LENGTH') or 0)
+    body = environ['wsgi.input'].read(length) if length else b''
+    event = _event(environ['REQUEST_METHOD'], environ.get('QUERY_STRING', ''), headers, body)
+    status, response_headers, payload = _response_parts(dispatch(event, environ.get('PATH_INFO', '/')))
+    start_response(f'{status} {HTTP_STATUS.get(status, "")}'.strip(), response_headers)
+    return [payload]
+
+
+async def asgi(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    '''ASGI entrypoint; handlers are synchronous and run in the default thread pool'''
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                load_handlers()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    headers = {key.decode('latin-1').title(): value.decode('latin-1') for key, value in scope['headers']}
+    event = _event(scope['method'], scope.get('query_string', b'').decode('latin-1'), headers, body)
+    response = await asyncio.get_running_loop().run_in_executor(None, dispatch, event, scope['path'])
+    status, response_headers, payload = _response_parts(response)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in response_headers],
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve(host: str, port: int, workers: int) -> None:
+    '''
+    Stdlib pre-fork server: bind once, import every handler, then fork workers that share the socket.
+    Connections are opened lazily, so no database socket crosses the fork.
+    '''
+    load_handlers()
+    server = make_server(host, port, application, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = []
+            break
+        children.append(pid)
+    print(f'pid {os.getpid()} serving http://{host}:{port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve every backend function from one process')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { Textarea } from '@/components/ui/textarea';
 import Icon from '@/components/ui/icon';
+import { apiFetch } from '@/lib/api';
 
 const API_BASE = 'https://functions.poehali.dev/3dbe8ad4-c10b-4750-bf0f-aa6da4085348';
 
@@ -37,7 +38,7 @@ const CompanyForm = ({ open, onOpenChange, onSuccess }: CompanyFormProps) => {
     setLoading(true);
 
     try {
-      const response = await fetch(`${API_BASE}?action=create-company`, {
+      const response = await apiFetch(`${API_BASE}?action=create-company`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(formData),
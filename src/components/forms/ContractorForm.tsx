@@ -4,6 +4,7 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import Icon from '@/components/ui/icon';
+import { apiFetch } from '@/lib/api';
 
 const API_BASE = 'https://functions.poehali.dev/850a0fed-8a2e-453d-88a4-6a527ec30caa';
 
@@ -28,7 +29,7 @@ const ContractorForm = ({ open, onOpenChange, onSuccess }: ContractorFormProps)
     setLoading(true);
 
     try {
-      const response = await fetch(`${API_BASE}?action=create-contractor`, {
+      const response = await apiFetch(`${API_BASE}?action=create-contractor`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(formData),
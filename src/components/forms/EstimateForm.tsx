@@ -7,6 +7,7 @@ import { Textarea } from '@/components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import Icon from '@/components/ui/icon';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
+import { apiFetch } from '@/lib/api';
 
 const API_BASE = 'https://functions.poehali.dev/3dbe8ad4-c10b-4750-bf0f-aa6da4085348';
 const ESTIMATE_API = 'https://functions.poehali.dev/cdf95276-0ee2-4819-8a40-d619b8b8fb62';
@@ -60,8 +61,8 @@ const EstimateForm = ({ open, onOpenChange, onSuccess }: EstimateFormProps) => {
   const loadData = async () => {
     try {
       const [companiesRes, itemsRes] = await Promise.all([
-        fetch(`${API_BASE}?action=companies`),
-        fetch(`${API_BASE}?action=items`),
+        apiFetch(`${API_BASE}?action=companies`),
+        apiFetch(`${API_BASE}?action=items`),
       ]);
 
       const companiesData = await companiesRes.json();
@@ -100,7 +101,7 @@ const EstimateForm = ({ open, onOpenChange, onSuccess }: EstimateFormProps) => {
     setLoading(true);
 
     try {
-      const response = await fetch(`${ESTIMATE_API}?action=create-estimate`, {
+      const response = await apiFetch(`${ESTIMATE_API}?action=create-estimate`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
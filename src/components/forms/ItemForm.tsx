@@ -5,6 +5,7 @@ import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { Textarea } from '@/components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
+import { apiFetch } from '@/lib/api';
 
 const API_BASE = 'https://functions.poehali.dev/cdf95276-0ee2-4819-8a40-d619b8b8fb62';
 
@@ -29,7 +30,7 @@ const ItemForm = ({ open, onOpenChange, onSuccess }: ItemFormProps) => {
     setLoading(true);
 
     try {
-      const response = await fetch(`${API_BASE}?action=create-item`, {
+      const response = await apiFetch(`${API_BASE}?action=create-item`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(formData),
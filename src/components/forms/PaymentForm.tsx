@@ -6,6 +6,7 @@ import { Label } from '@/components/ui/label';
 import { Textarea } from '@/components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import Icon from '@/components/ui/icon';
+import { apiFetch } from '@/lib/api';
 
 const API_BASE = 'https://functions.poehali.dev/cdf95276-0ee2-4819-8a40-d619b8b8fb62';
 const PROJECTS_API = 'https://functions.poehali.dev/631d6a6d-9657-43fe-bef1-0a38e1e85d68';
@@ -61,8 +62,8 @@ const PaymentForm = ({ open, onOpenChange, onSuccess, projectId }: PaymentFormPr
   const loadData = async () => {
     try {
       const [projectsRes, contractorsRes] = await Promise.all([
-        fetch(PROJECTS_API),
-        fetch(CONTRACTORS_API),
+        apiFetch(PROJECTS_API),
+        apiFetch(CONTRACTORS_API),
       ]);
 
       const projectsData = await projectsRes.json();
@@ -82,7 +83,7 @@ const PaymentForm = ({ open, onOpenChange, onSuccess, projectId }: PaymentFormPr
     setLoading(true);
 
     try {
-      const response = await fetch(`${API_BASE}?action=create-payment`, {
+      const response = await apiFetch(`${API_BASE}?action=create-payment`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
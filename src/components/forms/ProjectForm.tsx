@@ -7,6 +7,7 @@ import { Textarea } from '@/components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import Icon from '@/components/ui/icon';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
+import { apiFetch } from '@/lib/api';
 
 const API_BASE = 'https://functions.poehali.dev/3dbe8ad4-c10b-4750-bf0f-aa6da4085348';
 const PROJECT_API = 'https://functions.poehali.dev/cdf95276-0ee2-4819-8a40-d619b8b8fb62';
@@ -78,9 +79,9 @@ const ProjectForm = ({ open, onOpenChange, onSuccess }: ProjectFormProps) => {
   const loadData = async () => {
     try {
       const [companiesRes, itemsRes, contractorsRes] = await Promise.all([
-        fetch(`${API_BASE}?action=companies`),
-        fetch(`${API_BASE}?action=items`),
-        fetch(CONTRACTORS_API),
+        apiFetch(`${API_BASE}?action=companies`),
+        apiFetch(`${API_BASE}?action=items`),
+        apiFetch(CONTRACTORS_API),
       ]);
 
       const companiesData = await companiesRes.json();
@@ -148,7 +149,7 @@ const ProjectForm = ({ open, onOpenChange, onSuccess }: ProjectFormProps) => {
     setLoading(true);
 
     try {
-      const response = await fetch(`${PROJECT_API}?action=create-project`, {
+      const response = await apiFetch(`${PROJECT_API}?action=create-project`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
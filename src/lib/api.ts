@@ -0,0 +1,29 @@
+// With read replicas configured, write responses carry an X-DB-Session token: the primary's WAL position
+// after the commit. Sending the newest token back keeps later reads off replicas that have not replayed
+// the write yet, so a list refreshed right after a save shows it. Kept in sessionStorage to survive reloads.
+const SESSION_HEADER = 'X-DB-Session';
+const STORAGE_KEY = 'db-session';
+
+// '16/B374D848' -> [0x16, 0xB374D848]; null when malformed
+const parseLsn = (lsn: string): [number, number] | null => {
+  const match = /^([0-9A-Fa-f]{1,8})\/([0-9A-Fa-f]{1,8})$/.exec(lsn.trim());
+  return match ? [parseInt(match[1], 16), parseInt(match[2], 16)] : null;
+};
+
+const rememberSession = (token: string | null) => {
+  const next = token ? parseLsn(token) : null;
+  if (!token || !next) return;
+  const current = parseLsn(sessionStorage.getItem(STORAGE_KEY) ?? '');
+  if (!current || next[0] > current[0] || (next[0] === current[0] && next[1] > current[1])) {
+    sessionStorage.setItem(STORAGE_KEY, token);
+  }
+};
+
+export const apiFetch = async (input: string, init: RequestInit = {}): Promise<Response> => {
+  const headers = new Headers(init.headers);
+  const token = sessionStorage.getItem(STORAGE_KEY);
+  if (token) headers.set(SESSION_HEADER, token);
+  const response = await fetch(input, { ...init, headers });
+  rememberSession(response.headers.get(SESSION_HEADER));
+  return response;
+};
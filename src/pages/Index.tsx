@@ -24,6 +24,7 @@ import PaymentForm from '@/components/forms/PaymentForm';
 import ItemForm from '@/components/forms/ItemForm';
 import ContractorForm from '@/components/forms/ContractorForm';
 import CompanyForm from '@/components/forms/CompanyForm';
+import { apiFetch } from '@/lib/api';
 
 const FUNCTIONS = {
   stats: 'https://functions.poehali.dev/b27021b6-5f87-44ed-9fde-234aaf974da4',
@@ -116,11 +117,11 @@ const Index = () => {
     const fetchData = async () => {
       try {
         const [statsRes, projectsRes, estimatesRes, contractorsRes, companiesRes] = await Promise.all([
-          fetch(FUNCTIONS.stats),
-          fetch(FUNCTIONS.projects),
-          fetch(FUNCTIONS.estimates),
-          fetch(FUNCTIONS.contractors),
-          fetch(`${FUNCTIONS.companies}?action=companies-with-stats`),
+          apiFetch(FUNCTIONS.stats),
+          apiFetch(FUNCTIONS.projects),
+          apiFetch(FUNCTIONS.estimates),
+          apiFetch(FUNCTIONS.contractors),
+          apiFetch(`${FUNCTIONS.companies}?action=companies-with-stats`),
         ]);
 
         const statsData = await statsRes.json();
@@ -148,11 +149,11 @@ const Index = () => {
     const fetchData = async () => {
       try {
         const [statsRes, projectsRes, estimatesRes, contractorsRes, companiesRes] = await Promise.all([
-          fetch(FUNCTIONS.stats),
-          fetch(FUNCTIONS.projects),
-          fetch(FUNCTIONS.estimates),
-          fetch(FUNCTIONS.contractors),
-          fetch(`${FUNCTIONS.companies}?action=companies-with-stats`),
+          apiFetch(FUNCTIONS.stats),
+          apiFetch(FUNCTIONS.projects),
+          apiFetch(FUNCTIONS.estimates),
+          apiFetch(FUNCTIONS.contractors),
+          apiFetch(`${FUNCTIONS.companies}?action=companies-with-stats`),
         ]);
 
         const statsData = await statsRes.json();
@@ -177,7 +178,7 @@ const Index = () => {
     setSelectedCompany(company);
     setShowCompanyDetails(true);
     try {
-      const response = await fetch(`${FUNCTIONS.companies}?action=company-projects&company_id=${company.id}`);
+      const response = await apiFetch(`${FUNCTIONS.companies}?action=company-projects&company_id=${company.id}`);
       const projectsData = await response.json();
       setCompanyProjects(Array.isArray(projectsData) ? projectsData : []);
     } catch (error) {